@@ -2,22 +2,27 @@
 import asyncio
 import os
 from dotenv import load_dotenv
-from sqlalchemy.ext.asyncio import create_async_engine
-
-from models import *             # 👈 ensures models get registered
-from database.base import Base  # 👈 gets the actual Base
+from sqlalchemy import text
 
 load_dotenv()
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
+if not os.getenv("DATABASE_URL"):
     raise ValueError("DATABASE_URL is missing from .env")
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+from models import *             # 👈 ensures models get registered
+from database.base import Base  # 👈 gets the actual Base
+from database.config import engine  # 👈 same pool settings as the app
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_projects_user_id_id ON projects (user_id, id)",
+]
 
 async def create_tables():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        # create_all skips tables that already exist, add the indexes introduced since
+        for statement in INDEXES:
+            await conn.execute(text(statement))
     print("✅ Tables created.")
 
 if __name__ == "__main__":
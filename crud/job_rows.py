@@ -0,0 +1,29 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert
+from typing import List
+from models.job_rows import JobRow
+from uuid import UUID
+
+# Rows per INSERT statement, keeps the bind parameters well under the Postgres limit
+SAVE_BATCH_ROWS = 1000
+
+
+# Insert or overwrite the checkpoints of some rows of a job
+async def save_job_rows(session: AsyncSession, job_id: UUID, rows: List[dict]) -> None:
+    for start in range(0, len(rows), SAVE_BATCH_ROWS):
+        stmt = insert(JobRow).values([{"job_id": job_id, **row} for row in rows[start:start + SAVE_BATCH_ROWS]])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[JobRow.job_id, JobRow.row_index],
+            set_={"email": stmt.excluded.email, "outputs": stmt.excluded.outputs},
+        )
+        await session.execute(stmt)
+    await session.commit()
+
+
+# Get the checkpoints of the rows first_row <= row_index < end_row of a job
+async def get_job_rows(session: AsyncSession, job_id: UUID, first_row: int, end_row: int) -> List[JobRow]:
+    result = await session.execute(
+        select(JobRow).where(JobRow.job_id == job_id, JobRow.row_index >= first_row, JobRow.row_index < end_row)
+    )
+    return list(result.scalars().all())
@@ -0,0 +1,41 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import update, func
+from typing import Optional
+from models.jobs import Job, JOB_QUEUED, JOB_RUNNING, JOB_FAILED
+from uuid import UUID
+from schema.jobs import JobCreate
+
+
+# Create a queued job
+async def create_job(session: AsyncSession, job_data: JobCreate) -> Job:
+    new_job = Job(**job_data.dict())
+    session.add(new_job)
+    await session.commit()
+    await session.refresh(new_job)
+    return new_job
+
+
+# Get a job by job_id
+async def get_job_by_id(session: AsyncSession, job_id: UUID) -> Optional[Job]:
+    result = await session.execute(
+        select(Job).where(Job.id == job_id)
+    )
+    return result.scalars().first()
+
+
+# Update some fields of a job
+async def update_job(session: AsyncSession, job_id: UUID, **values) -> None:
+    await session.execute(
+        update(Job).where(Job.id == job_id).values(**values)
+    )
+    await session.commit()
+
+
+# Mark the jobs a previous process left unfinished as failed, returns how many there were
+async def fail_interrupted_jobs(session: AsyncSession, error: str) -> int:
+    result = await session.execute(
+        update(Job).where(Job.state.in_([JOB_QUEUED, JOB_RUNNING])).values(state=JOB_FAILED, error=error, finished_at=func.now())
+    )
+    await session.commit()
+    return result.rowcount
@@ -0,0 +1,74 @@
+import json
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import func
+from typing import List, Optional
+from models.leads import Lead
+from uuid import UUID
+
+# Staging table the rows are copied into, dropped with the transaction
+STAGING_TABLE = "leads_staging"
+STAGING_COLUMNS = ["seq", "email", "company", "status", "input_hash", "inputs", "outputs"]
+
+# Last copy of an email wins; outputs are kept when a row without outputs has the same inputs
+UPSERT_FROM_STAGING = f"""
+INSERT INTO leads (project_id, email, company, status, input_hash, inputs, outputs, job_id, created_at, updated_at)
+SELECT DISTINCT ON (email) $1, email, company, status, input_hash, inputs, outputs, $2, now(), now()
+FROM {STAGING_TABLE}
+ORDER BY email, seq DESC
+ON CONFLICT (project_id, email) DO UPDATE SET
+    company = EXCLUDED.company,
+    inputs = EXCLUDED.inputs,
+    outputs = CASE WHEN EXCLUDED.outputs IS NOT NULL OR leads.input_hash IS DISTINCT FROM EXCLUDED.input_hash
+                   THEN EXCLUDED.outputs ELSE leads.outputs END,
+    status = CASE WHEN EXCLUDED.outputs IS NOT NULL OR leads.input_hash IS DISTINCT FROM EXCLUDED.input_hash
+                  THEN EXCLUDED.status ELSE leads.status END,
+    input_hash = EXCLUDED.input_hash,
+    job_id = COALESCE(EXCLUDED.job_id, leads.job_id),
+    updated_at = now()
+"""
+
+
+# Insert or update many leads of a project with COPY into a staging table and one INSERT ... ON CONFLICT
+async def copy_leads(session: AsyncSession, project_id: UUID, leads: List[dict], job_id: Optional[UUID] = None) -> int:
+    if not leads:
+        return 0
+    records = [
+        (seq, lead["email"], lead.get("company"), lead.get("status"), lead.get("input_hash"),
+         json.dumps(lead["inputs"]), None if lead.get("outputs") is None else json.dumps(lead["outputs"]))
+        for seq, lead in enumerate(leads)
+    ]
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    driver = raw_connection.driver_connection
+    async with driver.transaction():
+        await driver.execute(
+            f"""CREATE TEMP TABLE {STAGING_TABLE} (
+                seq integer, email text, company text, status text, input_hash text, inputs jsonb, outputs jsonb
+            ) ON COMMIT DROP"""
+        )
+        await driver.copy_records_to_table(STAGING_TABLE, records=records, columns=STAGING_COLUMNS)
+        result = await driver.execute(UPSERT_FROM_STAGING, project_id, job_id)
+    await session.commit()
+    # The status string is "INSERT 0 <rows>"
+    return int(result.rsplit(" ", 1)[-1])
+
+
+# Get a project's leads, optionally only those of one status and/or company, oldest first
+async def get_leads(session: AsyncSession, project_id: UUID, status: Optional[str] = None,
+                    company: Optional[str] = None) -> List[Lead]:
+    query = select(Lead).where(Lead.project_id == project_id).order_by(Lead.created_at, Lead.email)
+    if status is not None:
+        query = query.where(Lead.status == status)
+    if company is not None:
+        query = query.where(Lead.company == company)
+    result = await session.execute(query)
+    return list(result.scalars().all())
+
+
+# Count a project's leads per status
+async def count_leads_by_status(session: AsyncSession, project_id: UUID) -> dict:
+    result = await session.execute(
+        select(Lead.status, func.count()).where(Lead.project_id == project_id).group_by(Lead.status)
+    )
+    return {status: count for status, count in result.all()}
@@ -1,5 +1,6 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy import insert
 from typing import List, Optional
 from models.projects import Project
 from uuid import UUID
@@ -21,6 +22,17 @@ async def get_project_by_id(session: AsyncSession, project_id: UUID) -> Optional
     )
     return result.scalars().first()
 
+# Get one page of a user's projects, ordered by id, starting after the `after` id
+async def list_projects(session: AsyncSession, user_id: UUID, limit: int, after: Optional[UUID] = None,
+                        columns: Optional[List[str]] = None) -> List[dict]:
+    # The id is always returned, it is the cursor of the next page
+    names = ["id"] + [name for name in (columns or Project.__table__.columns.keys()) if name != "id"]
+    query = select(*(Project.__table__.columns[name] for name in names)).where(Project.user_id == user_id)
+    if after is not None:
+        query = query.where(Project.id > after)
+    result = await session.execute(query.order_by(Project.id).limit(limit))
+    return [dict(row._mapping) for row in result.all()]
+
 # Create a new project
 async def create_project(session: AsyncSession, project_data: ProjectCreate) -> Project:
     new_project = Project(**project_data.dict())
@@ -28,3 +40,15 @@ async def create_project(session: AsyncSession, project_data: ProjectCreate) ->
     await session.commit()
     await session.refresh(new_project)
     return new_project
+
+# Create many projects in one INSERT ... RETURNING round-trip, returned in the order given
+async def create_projects(session: AsyncSession, projects_data: List[ProjectCreate]) -> List[Project]:
+    if not projects_data:
+        return []
+    result = await session.scalars(
+        insert(Project).returning(Project, sort_by_parameter_order=True),
+        [project.dict() for project in projects_data]
+    )
+    projects = list(result.all())
+    await session.commit()
+    return projects
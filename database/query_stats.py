@@ -0,0 +1,57 @@
+import os
+import time
+from bisect import bisect_left
+from dotenv import load_dotenv
+from sqlalchemy import event
+
+load_dotenv()
+
+# Statements slower than this are printed
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 200))
+
+# Upper bounds (ms) of the timing histogram buckets, the last bucket is everything slower
+HISTOGRAM_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+_counts = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+_totals = {"queries": 0, "slow": 0, "failed": 0, "total_ms": 0.0}
+
+
+def install_query_timer(engine):
+    """Time every statement run on an engine, recording a histogram and printing the slow ones"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append((id(context), time.perf_counter()))
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()[1]) * 1000
+        _counts[bisect_left(HISTOGRAM_BUCKETS_MS, elapsed_ms)] += 1
+        _totals["queries"] += 1
+        _totals["total_ms"] += elapsed_ms
+        if elapsed_ms >= DB_SLOW_QUERY_MS:
+            _totals["slow"] += 1
+            print(f"Slow query ({elapsed_ms:.0f} ms): {' '.join(statement.split())[:500]}")
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _failed(exception_context):
+        # A statement that raised never reaches after_cursor_execute, drop its start time
+        conn = exception_context.connection
+        starts = conn.info.get("query_start") if conn is not None else None
+        if starts and starts[-1][0] == id(exception_context.execution_context):
+            starts.pop()
+            _totals["failed"] += 1
+
+
+def query_stats() -> dict:
+    """Query counts and the timing histogram since the process started"""
+    labels = [f"<={bound}ms" for bound in HISTOGRAM_BUCKETS_MS] + [f">{HISTOGRAM_BUCKETS_MS[-1]}ms"]
+    return {
+        "queries": _totals["queries"],
+        "slow_queries": _totals["slow"],
+        "failed_queries": _totals["failed"],
+        "slow_query_ms": DB_SLOW_QUERY_MS,
+        "total_ms": round(_totals["total_ms"], 1),
+        "histogram": dict(zip(labels, _counts)),
+    }
@@ -1,22 +1,36 @@
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, HTTPException, Depends, Request, Query
 from fastapi.security import HTTPBearer,HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from jose import JWTError, jwt
 from pydantic import BaseModel,Field
-import httpx
 import os
-from datetime import datetime, timedelta
+import asyncio
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 from sqlalchemy.ext.asyncio import AsyncSession
-from crud.projects import get_projects_id, get_project_by_id, create_project
-from database.config import get_db
+from crud.jobs import create_job, get_job_by_id, fail_interrupted_jobs
+from crud.leads import count_leads_by_status
+from crud.projects import get_projects_id, get_project_by_id, create_project, list_projects, create_projects
+from database.config import get_db, AsyncSessionLocal
+from database.query_stats import query_stats
 from uuid import UUID
-
-from personalized import generate_personalized_sheet
-from schema.projects import ProjectResponse, ProjectCreate
-from upload_file_superbase import upload_df_to_supabase_async
+from typing import Optional, Literal, List
+from contextlib import asynccontextmanager
+
+from models.jobs import JOB_RUNNING
+from personalized import run_personalized_sheet_job, GENERATED_COLUMNS
+from schema.jobs import JobCreate, JobResponse, JobSubmitResponse
+from schema.projects import ProjectResponse, ProjectCreate, ProjectPage
+from models.projects import Project
+from upload_file_superbase import XLSX
 from utility.column_names import get_column_names
-from utility.google_sheet_handeling import get_google_sheet_as_dataframe
+from utility.google_sheet_handeling import iter_google_sheet_chunks, ChainedChunks
+from utility.http_client import close_http_clients, get_http_client
+from utility.checkpoints import JobCheckpoint, RESUME
+from utility.job_queue import job_queue
+from utility.lead_store import load_leads
+from utility.circuit_breaker import circuit_breaker_states
+from utility.token_cache import verified_tokens
 
 load_dotenv()
 
@@ -26,12 +40,36 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 JWT_SECRET = os.getenv("JWT_SECRET")
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_MINUTES = 1440
+# Per-request timeout (seconds) of the Supabase auth calls
+SUPABASE_AUTH_TIMEOUT = float(os.getenv("SUPABASE_AUTH_TIMEOUT", 10))
+# Comma-separated emails of the users allowed on the /admin endpoints
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Jobs left queued or running by the previous process cannot be picked up again
+    try:
+        async with AsyncSessionLocal() as session:
+            interrupted = await fail_interrupted_jobs(session, error="Interrupted by a server restart, resubmit the sheet with resume_job_id to continue")
+        print(f"Marked {interrupted} interrupted jobs as failed")
+    except Exception as e:
+        print(f"Error checking for interrupted jobs: {e}")
+    job_queue.start()
+    # Open the shared Supabase client up front, auth and storage calls reuse its connections
+    if SUPABASE_URL:
+        get_http_client(SUPABASE_URL)
+    yield
+    await job_queue.stop()
+    print(f"DB query stats: {query_stats()}")
+    # Close the pooled vendor HTTP clients
+    await close_http_clients()
 
 app = FastAPI(
     title="Personalized AI",
     description="Personalized AI",
     version="0.1.0",
-    docs_url="/")
+    docs_url="/",
+    lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -60,8 +98,12 @@ def create_jwt_token(data: dict, expires_delta: timedelta = timedelta(minutes=JW
 
 
 async def verify_token(token: HTTPAuthorizationCredentials = Depends(auth_scheme)):
+    jwt_token = token.credentials
+    # Tokens verified before skip the signature check until they expire
+    claims = verified_tokens.get(jwt_token)
+    if claims is not None:
+        return claims
     try:
-        jwt_token = token.credentials
         payload = jwt.decode(jwt_token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
 
         email = payload.get("sub")
@@ -70,19 +112,29 @@ async def verify_token(token: HTTPAuthorizationCredentials = Depends(auth_scheme
         if not email or not uuid:
             raise HTTPException(status_code=401, detail="Invalid token")
 
-        return {"email": email, "uuid": uuid}
+        claims = {"email": email, "uuid": uuid}
+        if payload.get("exp"):
+            verified_tokens.set(jwt_token, claims, expires_at=payload["exp"])
+        return claims
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+
+async def verify_admin(user=Depends(verify_token)):
+    if user["email"].lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
 # ------------------- Auth Endpoints -------------------
 @app.post("/signup")
 async def signup(user: SignupRequest):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{SUPABASE_URL}/auth/v1/signup",
-            headers={"apikey": SUPABASE_KEY, "Content-Type": "application/json"},
-            json={"email": user.email, "password": user.password}
-        )
+    client = get_http_client(SUPABASE_URL)
+    response = await client.post(
+        "/auth/v1/signup",
+        headers={"apikey": SUPABASE_KEY, "Content-Type": "application/json"},
+        json={"email": user.email, "password": user.password},
+        timeout=SUPABASE_AUTH_TIMEOUT
+    )
 
     if response.status_code == 200:
         return {"message": "Signup successful. Check your email for confirmation."}
@@ -100,44 +152,35 @@ async def signup(user: SignupRequest):
 
 @app.post("/login", response_model=TokenResponse)
 async def login(user: SignupRequest):
-    async with httpx.AsyncClient() as client:
-        # Step 1: Login to Supabase
-        response = await client.post(
-            f"{SUPABASE_URL}/auth/v1/token?grant_type=password",
-            headers={"apikey": SUPABASE_KEY, "Content-Type": "application/json"},
-            json={"email": user.email, "password": user.password}
-        )
-
-        if response.status_code != 200:
-            error_data = response.json()
-            error_msg = error_data.get("error_description", "").lower()
+    client = get_http_client(SUPABASE_URL)
+    # Step 1: Login to Supabase
+    response = await client.post(
+        "/auth/v1/token?grant_type=password",
+        headers={"apikey": SUPABASE_KEY, "Content-Type": "application/json"},
+        json={"email": user.email, "password": user.password},
+        timeout=SUPABASE_AUTH_TIMEOUT
+    )
 
-            if "invalid login credentials" in error_msg:
-                raise HTTPException(status_code=401, detail="Incorrect email or password.")
-            elif "email not confirmed" in error_msg:
-                raise HTTPException(status_code=401, detail="Email not confirmed. Please verify your email.")
-            raise HTTPException(status_code=response.status_code, detail=error_data.get("error_description", "Login failed."))
+    if response.status_code != 200:
+        error_data = response.json()
+        error_msg = error_data.get("error_description", "").lower()
 
-        access_token = response.json()["access_token"]
+        if "invalid login credentials" in error_msg:
+            raise HTTPException(status_code=401, detail="Incorrect email or password.")
+        elif "email not confirmed" in error_msg:
+            raise HTTPException(status_code=401, detail="Email not confirmed. Please verify your email.")
+        raise HTTPException(status_code=response.status_code, detail=error_data.get("error_description", "Login failed."))
 
-        # Step 2: Get the user's UUID using the access token
-        user_response = await client.get(
-            f"{SUPABASE_URL}/auth/v1/user",
-            headers={"Authorization": f"Bearer {access_token}", "apikey": SUPABASE_KEY}
-        )
+    # Step 2: The password grant response already holds the user, with its UUID
+    user_data = response.json().get("user") or {}
+    user_id = user_data.get("id")  # UUID
 
-        if user_response.status_code != 200:
-            raise HTTPException(status_code=500, detail="Failed to fetch user details from Supabase.")
+    if not user_id:
+        raise HTTPException(status_code=500, detail="User ID not found in Supabase response.")
 
-        user_data = user_response.json()
-        user_id = user_data.get("id")  # UUID
-
-        if not user_id:
-            raise HTTPException(status_code=500, detail="User ID not found in Supabase response.")
-
-        # Step 3: Create and return custom JWT with UUID
-        jwt_token = create_jwt_token({"sub": user.email, "uuid": user_id})
-        return TokenResponse(access_token=jwt_token, uuid=user_id)
+    # Step 3: Create and return custom JWT with UUID
+    jwt_token = create_jwt_token({"sub": user.email, "uuid": user_id})
+    return TokenResponse(access_token=jwt_token, uuid=user_id)
 
 
 @app.post("/logout")
@@ -152,46 +195,124 @@ class googleSheetRequest(BaseModel):
     openai_key:str=Field(description="OpenAI API key")
     ss_masters_key: str = Field(description="SSMASTERS API key")
     exa_api_key:str=Field(description="Exa AI API key")
-
-class googleSheetResponse(BaseModel):
-    sheet_link: str=Field(description="Google sheet link")
-
-@app.post("/personalized-sheet",response_model=googleSheetResponse)
-async def google_sheet(request:googleSheetRequest,user=Depends(verify_token)):
-    # Getting the google-sheet data
-    try:
-        data= await get_google_sheet_as_dataframe(request.original_sheet_url)
-        if data is None or data.empty:
+    resume_job_id: Optional[UUID] = Field(None, description="Earlier job on the same sheet whose finished rows are reused")
+    resume_mode: Literal["resume", "repair"] = Field(RESUME, description="resume reuses every finished row, repair re-runs the rows with an error")
+    export_format: Literal["xlsx", "csv.gz", "parquet"] = Field(XLSX, description="Format of the personalized sheet")
+    reuse_stored_leads: bool = Field(False, description="Re-run the project's stored leads instead of downloading the sheet, when it has any")
+
+@app.post("/personalized-sheet",response_model=JobSubmitResponse)
+async def google_sheet(request:googleSheetRequest, db: AsyncSession = Depends(get_db),user=Depends(verify_token)):
+    # The project's stored leads, with their outputs so unchanged rows are not enriched again
+    stored_leads = await load_leads(request.project_id) if request.reuse_stored_leads else None
+    sheet_rows = chunks = None
+    if stored_leads is not None and not stored_leads.empty:
+        first_chunk = stored_leads
+        print(f"Re-running the {len(stored_leads)} stored leads of project {request.project_id}")
+    else:
+        # Getting the google-sheet data, streamed in chunks; the first one is read up front to check the sheet
+        sheet_rows = asyncio.get_running_loop().create_future()
+        try:
+            chunks = iter_google_sheet_chunks(request.original_sheet_url, on_downloaded=sheet_rows.set_result)
+            first_chunk = await anext(chunks, None)
+            if first_chunk is None or first_chunk.empty:
+                raise HTTPException(
+                    status_code=400,
+                    detail="No data retrieved from Google Sheet or sheet is empty"
+                )
+        except Exception as e:
+            if chunks is not None:
+                await chunks.aclose()
             raise HTTPException(
                 status_code=400,
-                detail="No data retrieved from Google Sheet or sheet is empty"
+                detail=f"Failed to access Google Sheet: {str(e)}"
             )
-    except Exception as e:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Failed to access Google Sheet: {str(e)}"
-        )
-    # Extracting column names
-    column_names = await get_column_names(user_column_names=data.columns.tolist(),
-                                              openai_api_key=request.openai_key)
-    # Check for missing mappings
-    missing_keys = [key for key, value in column_names.items() if value is None]
-    # Raise exception if any required mapping is missing
-    if missing_keys:
-        raise HTTPException(
-            status_code=400,
-            detail=f"The following required columns were not found in the uploaded table: {', '.join(missing_keys)}"
-            )
-    personalized_sheet= await generate_personalized_sheet(data=data.head(100),request=request,column_names=column_names)
-    public_url= await upload_df_to_supabase_async(df=personalized_sheet,file_prefix=f'{user["uuid"]}_sheet')
-    return {
-        "sheet_link": public_url
-    }
+    try:
+        # Extracting column names, leaving out the ones a previous run added
+        input_columns = [column for column in first_chunk.columns if column not in GENERATED_COLUMNS]
+        column_names = await get_column_names(user_column_names=input_columns,
+                                                  openai_api_key=request.openai_key)
+        # Check for missing mappings
+        missing_keys = [key for key, value in column_names.items() if value is None]
+        # Raise exception if any required mapping is missing
+        if missing_keys:
+            raise HTTPException(
+                status_code=400,
+                detail=f"The following required columns were not found in the uploaded table: {', '.join(missing_keys)}"
+                )
+        if request.resume_job_id is not None:
+            previous_job = await get_job_by_id(db, request.resume_job_id)
+            if not previous_job or str(previous_job.user_id) != user["uuid"]:
+                raise HTTPException(status_code=404, detail="Job to resume not found")
+
+        # The enrichment runs in the background, the client polls /jobs/{job_id}
+        job = await create_job(db, JobCreate(user_id=user["uuid"],
+                                             project_id=request.project_id,
+                                             original_sheet_url=request.original_sheet_url,
+                                             proceed_on_invalid_email=request.proceed_on_invalid_email,
+                                             resumed_from_job_id=request.resume_job_id,
+                                             resume_mode=request.resume_mode if request.resume_job_id else None))
+        checkpoint = JobCheckpoint(job_id=job.id, previous_job_id=request.resume_job_id, mode=request.resume_mode)
+    except BaseException:
+        # Stop downloading a sheet that is not going to be enriched
+        if chunks is not None:
+            await chunks.aclose()
+        raise
+    job_queue.submit(lambda: run_personalized_sheet_job(job_id=job.id,
+                                                        data=first_chunk if chunks is None else ChainedChunks(first_chunk, chunks),
+                                                        request=request,
+                                                        column_names=column_names,
+                                                        file_prefix=f'{user["uuid"]}_sheet',
+                                                        sheet_rows=sheet_rows,
+                                                        checkpoint=checkpoint,
+                                                        file_format=request.export_format))
+    return JobSubmitResponse(job_id=job.id, state=job.state)
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: UUID, db: AsyncSession = Depends(get_db),user=Depends(verify_token)):
+    job = await get_job_by_id(db, job_id)
+    if not job or str(job.user_id) != user["uuid"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    # ETA from the pace so far, once the sheet size is known
+    eta_seconds = None
+    if job.state == JOB_RUNNING and job.started_at and job.rows_done and job.rows_total:
+        elapsed = (datetime.now(timezone.utc) - job.started_at).total_seconds()
+        eta_seconds = round(elapsed / job.rows_done * (job.rows_total - job.rows_done), 1)
+
+    return JobResponse(id=job.id,
+                       project_id=job.project_id,
+                       resumed_from_job_id=job.resumed_from_job_id,
+                       resume_mode=job.resume_mode,
+                       state=job.state,
+                       rows_total=job.rows_total,
+                       rows_done=job.rows_done,
+                       eta_seconds=eta_seconds,
+                       sheet_link=job.sheet_link,
+                       error=job.error,
+                       created_at=job.created_at,
+                       started_at=job.started_at,
+                       finished_at=job.finished_at)
 
 @app.get("/projects/{user_id}")
 async def list_project_ids(user_id: UUID, db: AsyncSession = Depends(get_db),user=Depends(verify_token)):
     return await get_projects_id(db, user_id)
 
+@app.get("/projects/{user_id}/details", response_model=ProjectPage)
+async def list_project_details(user_id: UUID,
+                               limit: int = Query(50, ge=1, le=200),
+                               after: Optional[UUID] = Query(None, description="next_cursor of the previous page"),
+                               fields: Optional[str] = Query(None, description="Comma-separated columns to return, all by default"),
+                               db: AsyncSession = Depends(get_db),user=Depends(verify_token)):
+    columns = None
+    if fields:
+        columns = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [column for column in columns if column not in Project.__table__.columns]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown project fields: {', '.join(unknown)}")
+    items = await list_projects(db, user_id, limit=limit, after=after, columns=columns)
+    next_cursor = items[-1]["id"] if len(items) == limit else None
+    return ProjectPage(items=items, next_cursor=next_cursor)
+
 @app.get("/project/{project_id}")
 async def get_project(project_id: UUID, db: AsyncSession = Depends(get_db),user=Depends(verify_token)):
     project = await get_project_by_id(db, project_id)
@@ -199,6 +320,11 @@ async def get_project(project_id: UUID, db: AsyncSession = Depends(get_db),user=
         raise HTTPException(status_code=404, detail="Project not found")
     return project
 
+@app.get("/project/{project_id}/leads/summary")
+async def get_project_leads_summary(project_id: UUID, db: AsyncSession = Depends(get_db),user=Depends(verify_token)):
+    # Number of stored leads of the project per batch status
+    return await count_leads_by_status(db, project_id)
+
 @app.post("/project", response_model=ProjectResponse)
 async def create_project_endpoint(
     project: ProjectCreate,
@@ -207,3 +333,21 @@ async def create_project_endpoint(
 ):
     return await create_project(db, project)
 
+@app.post("/projects/bulk", response_model=List[ProjectResponse])
+async def create_projects_endpoint(
+    projects: List[ProjectCreate],
+    db: AsyncSession = Depends(get_db),
+    user=Depends(verify_token)
+):
+    return await create_projects(db, projects)
+
+# ------------------- Admin Endpoints -------------------
+@app.get("/admin/circuit-breakers")
+async def get_circuit_breakers(user=Depends(verify_admin)):
+    # State of every circuit breaker in this process, by vendor and API key hash
+    return circuit_breaker_states()
+
+@app.get("/admin/query-stats")
+async def get_query_stats(user=Depends(verify_admin)):
+    # Query counts and timing histogram of this process since it started
+    return query_stats()
@@ -1 +1,4 @@
-from .projects import Project
\ No newline at end of file
+from .projects import Project
+from .jobs import Job
+from .job_rows import JobRow
+from .leads import Lead
\ No newline at end of file
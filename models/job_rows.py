@@ -0,0 +1,12 @@
+from sqlalchemy import Column, String, Integer, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from database.base import Base
+
+class JobRow(Base):
+    """Enrichment outputs of one finished row of a job, kept so an interrupted run can be resumed"""
+    __tablename__ = "job_rows"
+
+    job_id = Column(UUID(as_uuid=True), ForeignKey("jobs.id", ondelete="CASCADE"), primary_key=True)
+    row_index = Column(Integer, primary_key=True)
+    email = Column(String)
+    outputs = Column(JSONB, nullable=False)
@@ -0,0 +1,31 @@
+from sqlalchemy import Column, String, Integer, Text, Boolean, DateTime, func
+from sqlalchemy.dialects.postgresql import UUID
+from uuid import uuid4
+from database.base import Base
+
+# Job states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    user_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    project_id = Column(UUID(as_uuid=True), nullable=False)
+    original_sheet_url = Column(String, nullable=False)
+    proceed_on_invalid_email = Column(Boolean, default=False)
+    resumed_from_job_id = Column(UUID(as_uuid=True))
+    resume_mode = Column(String)
+
+    state = Column(String, nullable=False, default=JOB_QUEUED)
+    rows_total = Column(Integer)
+    rows_done = Column(Integer, nullable=False, default=0)
+    sheet_link = Column(String)
+    error = Column(Text)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, Index, func
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from database.base import Base
+
+class Lead(Base):
+    """One lead of a project, with the sheet's inputs and the outputs of its last enrichment"""
+    __tablename__ = "leads"
+    __table_args__ = (
+        # Re-batching reads a project's leads per company, reporting counts them per status
+        Index("ix_leads_project_id_company", "project_id", "company"),
+        Index("ix_leads_project_id_status", "project_id", "status"),
+    )
+
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    email = Column(String, primary_key=True)
+    company = Column(String)
+    # Batch status of the last run ("ready", "future", ...), empty until the lead is enriched
+    status = Column(String)
+    input_hash = Column(String)
+    inputs = Column(JSONB, nullable=False)
+    outputs = Column(JSONB)
+    job_id = Column(UUID(as_uuid=True))
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
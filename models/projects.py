@@ -1,10 +1,14 @@
-from sqlalchemy import Column, String, Integer, Text
+from sqlalchemy import Column, String, Integer, Text, Index
 from sqlalchemy.dialects.postgresql import UUID, ARRAY
 from uuid import uuid4
 from database.base import Base
 
 class Project(Base):
     __tablename__ = "projects"
+    __table_args__ = (
+        # Backs the per-user lookups and the keyset pagination on (user_id, id)
+        Index("ix_projects_user_id_id", "user_id", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     name = Column(String, nullable=False)
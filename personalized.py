@@ -1,18 +1,52 @@
-import random
-from datetime import date
-from http.client import HTTPException
+from datetime import date, datetime, timezone
 
 import numpy as np
+import pandas as pd
 import asyncio
+import os
+from collections import Counter
+from uuid import UUID
 
+from crud.jobs import update_job
 from crud.projects import get_project_by_id
-from upload_file_superbase import upload_df_to_supabase_async
+from database.config import AsyncSessionLocal
+from models.jobs import JOB_RUNNING, JOB_COMPLETED, JOB_FAILED
+from upload_file_superbase import upload_df_to_supabase_async, XLSX
 from utility.ai_generated_ice_breakers import generate_ice_breakers_chain
-from utility.batching import cold_email_batcher_advanced
+from utility.batching import cold_email_batcher_advanced, get_project_rule_tables, BATCH_COLUMNS
+from utility.cache import enrichment_cache, normalize_url, EXA_SUMMARY, LINKEDIN_COMPANY
 from utility.company_linkedIn_data import get_company_linkedin_data
-from utility.email_verifier import lead_email_verifier
-from utility.exa_webite_summary import get_website_summary
-from utility.priority_score import get_priority_score
+from utility.email_verifier import verify_email_cached
+from utility.exa_webite_summary import WebsiteSummaryBatcher
+from utility.incremental import input_hashes, email_keys, previous_outputs, INPUT_HASH
+from utility.lead_store import store_leads
+from utility.priority_score import get_priority_scores_cached, PROFILE_FIELDS
+from utility.rule_scoring import pre_score_leads, SOURCE_RULES, SOURCE_LLM
+
+# Number of rows enriched at the same time; vendor quotas are enforced by the token buckets
+ENRICHMENT_CONCURRENCY = int(os.getenv("ENRICHMENT_CONCURRENCY", 10))
+
+# Rows enriched and checkpointed together within a chunk, a crash loses at most the sub-batches in progress
+CHECKPOINT_ROWS = int(os.getenv("CHECKPOINT_ROWS", 50))
+
+# Columns added to every row by the enrichment, in sheet order
+ERROR_LOG = 'Error Log'
+OUTPUT_COLUMNS = [
+    'Email Valid',
+    'Email Providers',
+    'Exa Website Summary',
+    'Company LinkedIn data ',
+    'Number of employees (LinkedIn)',
+    'Ice Breakers Options',
+    'Ice Breaker Selected',
+    'Ice Breaker Selection Reason',
+    'Priority Score',
+    'Priority Score Reason',
+    'Priority Score Source',
+    ERROR_LOG,
+]
+# Every column a personalized sheet has on top of the input, a sheet sent back is read without them
+GENERATED_COLUMNS = OUTPUT_COLUMNS + [INPUT_HASH] + BATCH_COLUMNS
 
 
 # class googleSheetRequestModel(BaseModel):
@@ -26,12 +60,29 @@ from utility.priority_score import get_priority_score
 #                                 description="SSMASTERS API key")
 #     exa_api_key: str = Field(default="0d8c86b4-8bee-44ff-b77b-d4befdb1f9e2", description="Exa AI API key")
 
-async def generate_personalized_sheet(data, request, column_names):
+def get_input_columns(column_names):
     '''
+    Columns the enrichment of a row reads, hashed into the row's input hash
 
-    :param data:pandas dataframe
+    :param column_names: the names of the columns
+    :return: list of column names
+    '''
+    return [column_names['email'], column_names['company_website'], column_names['company_linkedin'],
+            column_names['job_title'], column_names['seniority'] or 'Seniority', column_names['department'] or 'Department',
+            column_names['industry'], column_names['employee_count']]
+
+
+async def generate_personalized_sheet(data, request, column_names, on_progress=None, checkpoint=None, on_batched=None):
+    '''
+
+    :param data:pandas dataframe, or an async iterator of dataframe chunks sharing its columns
     :param request: googleSheetRequestModel
     :param column_names: the names of the columns
+    :param on_progress: optional coroutine function, awaited with the number of rows enriched so far after each
+        checkpointed sub-batch (and after the reused rows of each chunk)
+    :param checkpoint: optional utility.checkpoints.JobCheckpoint, saving the rows as they finish and reusing a previous run's
+    :param on_batched: optional coroutine function, awaited with the enriched sheet as read (before the batching
+        normalizes its titles, departments and employee counts) and the batched sheet, row for row
     :return: pandas dataframe
     '''
 
@@ -41,164 +92,276 @@ async def generate_personalized_sheet(data, request, column_names):
     COMPANY_NAME = column_names['company_name']
     EMAIL = column_names['email']
     JOB_TITLE = column_names['job_title']
-    SENIORITY=column_names['seniority']
-    if SENIORITY is None:
-        data['Seniority'] = ''
-        SENIORITY ='Seniority'
+    SENIORITY=column_names['seniority'] or 'Seniority'
     INDUSTRY = column_names['industry']
-    DEPARTMENT = column_names['department']
-    if DEPARTMENT is None:
-        data['Department'] = ''
-        DEPARTMENT = 'Department'
+    DEPARTMENT = column_names['department'] or 'Department'
     COMPANY_WEBSITE = column_names['company_website']
     COMPANY_LINKEDIN = column_names['company_linkedin']
     EMPLOYEE_COUNT = column_names['employee_count']
 
     EMPLOYEE_COUNT_LINKEDIN = 'Number of employees (LinkedIn)'
 
+    # Inputs the enrichment of a row depends on, a change to any of them re-runs the row
+    INPUT_COLUMNS = get_input_columns(column_names)
+
     #Getting the project details
     from fastapi import HTTPException
 
     print("Getting project details")
     try:
-        project_details = await get_project_by_id(request.project_id)
+        async with AsyncSessionLocal() as session:
+            project_details = await get_project_by_id(session, request.project_id)
     except Exception as e:
         print(f"Error fetching project details: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve project details")
+    if project_details is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    # Targeting rules of the project, shared by the rule-based priority scores and the batching
+    rule_tables = get_project_rule_tables(project_details)
 
-    num_emails = len(data[EMAIL])
-    num_website = len(data[COMPANY_WEBSITE])
-    num_linkedin_companies = len(data[COMPANY_LINKEDIN])
-
-    # Additional columns
-    error_log = np.empty(num_emails, dtype=object)
-    priority_reason = np.empty(num_emails, dtype=object)
-    priority_score = np.empty(num_emails, dtype=object)
-    number_of_employees_from_linkedin = np.empty(num_linkedin_companies, dtype=object)
-    linkedin_company_data = np.empty(num_linkedin_companies, dtype=object)
-    ice_breaker_selection_reason = np.empty(num_website, dtype=object)
-    ice_breaker_selected = np.empty(num_website, dtype=object)
-    ice_breaker_options = np.empty(num_website, dtype=object)
-    exa_website_summary = np.empty(num_website, dtype=object)
-    email_providers = np.empty(num_emails, dtype=object)
-    is_email_valid = np.empty(num_emails, dtype=object)
-
-    # Retain api call data
+    # Retain api call data (in-flight tasks, so companies sharing a website or LinkedIn page share one call)
     company_website_search_history = {}
     company_linkedin_search_history = {}
-    company_number_of_employees_search_history = {}
-    company_common_name = {}
-
-    request_limit_per_minute = 5
-    wait_time = 20  # seconds
-
-    for i, (index, row) in enumerate(data.iterrows()):
-        print(f'----ROW:{i + 1}----')
-
-        # Error Log configuration
-        if error_log[i] is None:
-            error_log[i] = ""
-
-        # Email Verification and Email Providers
-        verification_status, email_provider, verification_error = await lead_email_verifier(
-            email=row[EMAIL],
-            api_key=request.ss_masters_key
-        )
-        is_email_valid[i] = verification_status
-        email_providers[i] = email_provider
-        if len(verification_error):
-            error_log[i] += f"*{verification_error} \n"
-
-        if (request.proceed_on_invalid_email and is_email_valid[i] != 'valid') or is_email_valid[i] == 'valid':
-
-            # Creating a loop for parallel api calls
-            loop = asyncio.get_event_loop()
-            f1 = f2 = None
-
-            # Exa Website Summary
-            if row[COMPANY_WEBSITE] in company_website_search_history.keys():
-                exa_website_summary[i] = company_website_search_history[row[COMPANY_WEBSITE]]
-            else:
-                f1 = loop.run_in_executor(None, get_website_summary, row[COMPANY_WEBSITE], request.exa_api_key)
-
-            # Company LinkedIn data
-            if row[COMPANY_LINKEDIN] in company_linkedin_search_history.keys():
-                linkedin_company_data[i] = company_linkedin_search_history[row[COMPANY_LINKEDIN]]
-                number_of_employees_from_linkedin[i] = company_number_of_employees_search_history[row[COMPANY_LINKEDIN]]
-            else:
-                f2 = loop.run_in_executor(None, get_company_linkedin_data, row[COMPANY_LINKEDIN],
-                                          request.ss_masters_key)
-
-            # Getting the api results
-            futures = []
-            labels = []
-            if f1:
-                futures.append(f1)
-                labels.append("website")
-            if f2:
-                futures.append(f2)
-                labels.append("linkedin")
-
-            if futures:
-                results = await asyncio.gather(*futures)
-
-                for label, result in zip(labels, results):
-                    # Company Website Data
-                    if label == "website":
-                        error = ''
-                        exa_website_summary[i], error = result
-                        company_website_search_history[row[COMPANY_WEBSITE]] = exa_website_summary[i]
-                        if len(error):
-                            error_log[i] += f"* {error} \n"
-
-                    # Company LinkedIn data
-                    if label == "linkedin":
-                        error = ''
-                        linkedin_company_data[i], number_of_employees_from_linkedin[i], error = result
-                        company_linkedin_search_history[row[COMPANY_LINKEDIN]] = linkedin_company_data[i]
-                        company_number_of_employees_search_history[row[COMPANY_LINKEDIN]] = \
-                        number_of_employees_from_linkedin[i]
-                        if len(error):
-                            error_log[i] += f"* {error} \n"
+
+    semaphore = asyncio.Semaphore(ENRICHMENT_CONCURRENCY)
+    # Websites of the companies enriched concurrently are summarized together, in one Exa call per batch
+    website_summaries = WebsiteSummaryBatcher(request.exa_api_key)
+
+    async def fetch_website_summary(website):
+        cache_key = normalize_url(website)
+        cached = enrichment_cache.get(EXA_SUMMARY, cache_key)
+        if cached is not None:
+            return cached, ""
+        summary, error = await website_summaries.summarize(website)
+        if not error:
+            enrichment_cache.set(EXA_SUMMARY, cache_key, summary)
+        return summary, error
+
+    async def fetch_linkedin_data(linkedin_url):
+        cache_key = normalize_url(linkedin_url)
+        cached = enrichment_cache.get(LINKEDIN_COMPANY, cache_key)
+        if cached is not None:
+            return cached[0], cached[1], ""
+        description, employees, error = await get_company_linkedin_data(linkedin_url, request.ss_masters_key)
+        if not error:
+            enrichment_cache.set(LINKEDIN_COMPANY, cache_key, [description, employees])
+        return description, employees, error
+
+    async def search_once(history, key, fetch):
+        """Await the shared call for `key`"""
+        if key not in history:
+            history[key] = asyncio.ensure_future(fetch(key))
+        return await history[key]
+
+    # ---- Company-level stage: website summary, LinkedIn data and ice breakers, once per company ----
+    company_history = {}
+
+    # Outputs already in the sheet from an earlier run, by (email, input hash)
+    sheet_outputs = {}
+
+    # Priority score memo stats, added up over the sub-batches of the run
+    priority_stats = Counter()
+    # Rows enriched (or reused) so far, over all the chunks
+    progress = Counter()
+
+    async def report_progress(rows):
+        progress['rows_done'] += rows
+        if on_progress is not None and rows:
+            await on_progress(progress['rows_done'])
+
+    async def enrich_company(website, linkedin_url):
+        async with semaphore:
+            print(f'----COMPANY:{website}----')
+            # Exa Website Summary and Company LinkedIn data in parallel
+            (summary, website_error), (linkedin_data, employees, linkedin_error) = await asyncio.gather(
+                search_once(company_website_search_history, website, fetch_website_summary),
+                search_once(company_linkedin_search_history, linkedin_url, fetch_linkedin_data)
+            )
 
             # Ice breakers
-            error = ''
-            ice_breaker_options[i], ice_breaker_selected[i], ice_breaker_selection_reason[
-                i], error = await generate_ice_breakers_chain(website_summary=exa_website_summary[i],
-                                                              linkedin_summary=linkedin_company_data[i],
-                                                              openai_api_key=request.openai_key)
-            # Priority score
-            error = ''
-            priority_level, error = await get_priority_score(job_title=row[JOB_TITLE],
-                                                             seniority=row[SENIORITY],
-                                                             industry=row[INDUSTRY],
-                                                             desc=project_details['description'],
-                                                             department=row[DEPARTMENT],
-                                                             company_size=row[EMPLOYEE_COUNT],
-                                                             openai_api_key=request.openai_key)
+            options, selected, selection_reason, _ = await generate_ice_breakers_chain(
+                website_summary=summary,
+                linkedin_summary=linkedin_data,
+                openai_api_key=request.openai_key)
+
+            return {
+                COMPANY_WEBSITE: website,
+                COMPANY_LINKEDIN: linkedin_url,
+                'summary': summary,
+                'linkedin_data': linkedin_data,
+                'employees': employees,
+                'options': options,
+                'selected': selected,
+                'selection_reason': selection_reason,
+                'error': "".join(f"* {error} \n" for error in (website_error, linkedin_error) if len(error)),
+            }
+
+    async def enrich_chunk(data, first_row):
+        """Enrich one chunk of rows, returning it with the new columns"""
+        num_emails = len(data[EMAIL])
+        num_website = len(data[COMPANY_WEBSITE])
+        num_linkedin_companies = len(data[COMPANY_LINKEDIN])
+
+        # Additional columns
+        error_log = np.full(num_emails, "", dtype=object)
+        priority_reason = np.empty(num_emails, dtype=object)
+        priority_score = np.empty(num_emails, dtype=object)
+        priority_source = np.empty(num_emails, dtype=object)
+        number_of_employees_from_linkedin = np.empty(num_linkedin_companies, dtype=object)
+        linkedin_company_data = np.empty(num_linkedin_companies, dtype=object)
+        ice_breaker_selection_reason = np.empty(num_website, dtype=object)
+        ice_breaker_selected = np.empty(num_website, dtype=object)
+        ice_breaker_options = np.empty(num_website, dtype=object)
+        exa_website_summary = np.empty(num_website, dtype=object)
+        email_providers = np.empty(num_emails, dtype=object)
+        is_email_valid = np.empty(num_emails, dtype=object)
+
+        # ---- Lead-level stage: email verification and email providers ----
+        async def verify_row(i, email):
+            async with semaphore:
+                print(f'----ROW:{first_row + i + 1}----')
+                verification_status, email_provider, verification_error = await verify_email_cached(
+                    email=email,
+                    api_key=request.ss_masters_key
+                )
+                is_email_valid[i] = verification_status
+                email_providers[i] = email_provider
+                if len(verification_error):
+                    error_log[i] += f"*{verification_error} \n"
+
+        # Rows run concurrently; each one writes only its own slot, so the output order is kept
+        await asyncio.gather(*(verify_row(i, email) for i, email in enumerate(data[EMAIL])))
+
+        needs_enrichment = request.proceed_on_invalid_email | (is_email_valid == 'valid')
+        rows_to_enrich = np.flatnonzero(needs_enrichment)
+
+        # ---- Company-level stage, companies already seen in an earlier chunk are reused ----
+        company_keys = [COMPANY_WEBSITE, COMPANY_LINKEDIN]
+        companies = data.iloc[rows_to_enrich][company_keys].drop_duplicates()
+
+        company_results = await asyncio.gather(*(search_once(company_history, company, lambda key: enrich_company(*key))
+                                                 for company in companies.itertuples(index=False, name=None)))
+        print(f"Enriched {len(companies)} companies for {len(rows_to_enrich)} leads")
+
+        # Broadcast the company results back to their rows (a left join keeps the row order)
+        if company_results:
+            enriched = data.iloc[rows_to_enrich][company_keys].merge(pd.DataFrame(company_results),
+                                                                     on=company_keys, how='left')
+            exa_website_summary[rows_to_enrich] = enriched['summary'].tolist()
+            linkedin_company_data[rows_to_enrich] = enriched['linkedin_data'].tolist()
+            number_of_employees_from_linkedin[rows_to_enrich] = enriched['employees'].tolist()
+            ice_breaker_options[rows_to_enrich] = enriched['options'].tolist()
+            ice_breaker_selected[rows_to_enrich] = enriched['selected'].tolist()
+            ice_breaker_selection_reason[rows_to_enrich] = enriched['selection_reason'].tolist()
+            error_log[rows_to_enrich] += enriched['error'].to_numpy(dtype=object)
+
+        # ---- Lead-level stage: priority score ----
+        # Clear-cut leads straight from the targeting rules
+        rows_to_score = rows_to_enrich
+        rule_scores = pre_score_leads(data.iloc[rows_to_score], job_title_col=JOB_TITLE, department_col=DEPARTMENT,
+                                      employee_count_col=EMPLOYEE_COUNT, seniority_col=SENIORITY,
+                                      rule_tables=rule_tables)
+        ambiguous = rule_scores['ambiguous'].to_numpy()
+        rule_rows = rows_to_score[~ambiguous]
+        priority_score[rule_rows] = rule_scores['score'][~ambiguous].astype(int).tolist()
+        priority_reason[rule_rows] = rule_scores['reason'][~ambiguous].tolist()
+        priority_source[rule_rows] = SOURCE_RULES
+        print(f"Priority scored by rules: {len(rule_rows)}, by LLM: {int(ambiguous.sum())}")
+
+        # The ambiguous ones with the LLM, once per distinct profile and many profiles per call
+        rows_to_score = rows_to_score[ambiguous]
+        leads = data.iloc[rows_to_score][[JOB_TITLE, SENIORITY, DEPARTMENT, INDUSTRY, EMPLOYEE_COUNT]]
+        leads.columns = PROFILE_FIELDS
+        leads = leads.to_dict('records')
+
+        results, memo_stats = await get_priority_scores_cached(leads=leads,
+                                                               desc=project_details.description,
+                                                               openai_api_key=request.openai_key,
+                                                               rule_tables=rule_tables)
+        priority_stats.update(memo_stats)
+        for i, (priority_level, error) in zip(rows_to_score, results):
             priority_score[i] = priority_level['priority_score']
             priority_reason[i] = priority_level['reason']
+            priority_source[i] = SOURCE_LLM
             if len(error):
                 error_log[i] += f"* {error} \n"
 
-        # Rate limiting: wait after processing each batch of 2 emails,
-        # but skip waiting after the last batch
-        if (i + 1) % request_limit_per_minute == 0 and (i + 1) != num_emails:
-            await asyncio.sleep(wait_time)
-
-    # Creating new columns
-    data['Email Valid'] = is_email_valid.tolist()
-    data['Email Providers'] = email_providers.tolist()
-    data['Exa Website Summary'] = exa_website_summary.tolist()
-    data['Company LinkedIn data '] = linkedin_company_data.tolist()
-    data['Number of employees (LinkedIn)'] = number_of_employees_from_linkedin.tolist()
-    data['Ice Breakers Options'] = ice_breaker_options.tolist()
-    data['Ice Breaker Selected'] = ice_breaker_selected.tolist()
-    data['Ice Breaker Selection Reason'] = ice_breaker_selection_reason.tolist()
-    data['Priority Score'] = priority_score.tolist()
-    data['Priority Score Reason'] = priority_reason.tolist()
-    data['Error Log'] = error_log.tolist()
-    data.fillna('-', inplace=True)
+        # Creating new columns
+        data['Email Valid'] = is_email_valid.tolist()
+        data['Email Providers'] = email_providers.tolist()
+        data['Exa Website Summary'] = exa_website_summary.tolist()
+        data['Company LinkedIn data '] = linkedin_company_data.tolist()
+        data['Number of employees (LinkedIn)'] = number_of_employees_from_linkedin.tolist()
+        data['Ice Breakers Options'] = ice_breaker_options.tolist()
+        data['Ice Breaker Selected'] = ice_breaker_selected.tolist()
+        data['Ice Breaker Selection Reason'] = ice_breaker_selection_reason.tolist()
+        data['Priority Score'] = priority_score.tolist()
+        data['Priority Score Reason'] = priority_reason.tolist()
+        data['Priority Score Source'] = priority_source.tolist()
+        data[ERROR_LOG] = error_log.tolist()
+        data.fillna('-', inplace=True)
+        return data
+
+    async def enrich_rows(data, rows, first_row):
+        """Enrich some rows of a chunk and checkpoint them, returning their outputs indexed by position in the chunk"""
+        enriched = await enrich_chunk(data.iloc[rows].reset_index(drop=True), first_row + int(rows[0]))
+        outputs = enriched[OUTPUT_COLUMNS].set_axis(rows)
+        if checkpoint is not None:
+            await checkpoint.save(data[[EMAIL]].join(outputs, how='inner'), first_row, email_col=EMAIL,
+                                  output_columns=OUTPUT_COLUMNS)
+        await report_progress(len(rows))
+        return outputs
+
+    async def process_chunk(data, first_row):
+        """Enrich the rows of a chunk that have no reusable checkpoint or earlier outputs, checkpointing them as they finish"""
+        data = data.reset_index(drop=True)
+        if column_names['seniority'] is None:
+            data['Seniority'] = ''
+        if column_names['department'] is None:
+            data['Department'] = ''
+
+        hashes = input_hashes(data, INPUT_COLUMNS)
+        sheet_outputs.update(previous_outputs(data, email_col=EMAIL, hashes=hashes, output_columns=OUTPUT_COLUMNS,
+                                              proceed_on_invalid_email=request.proceed_on_invalid_email))
+        data = data.drop(columns=[column for column in GENERATED_COLUMNS if column in data.columns])
+
+        reused = {}
+        if checkpoint is not None:
+            reused = await checkpoint.load(data, first_row, email_col=EMAIL, error_col=ERROR_LOG)
+            if reused:
+                print(f"Reusing {len(reused)} checkpointed rows from row {first_row + 1}")
+        if sheet_outputs:
+            carried = {position: sheet_outputs[key] for position, key in enumerate(zip(email_keys(data[EMAIL]), hashes))
+                       if position not in reused and key in sheet_outputs}
+            print(f"Carrying forward {len(carried)} already enriched rows from row {first_row + 1}")
+            reused.update(carried)
+        outputs = [pd.DataFrame.from_dict(reused, orient='index', columns=OUTPUT_COLUMNS)] if reused else []
+        if reused and checkpoint is not None:
+            # Checkpointed again under this job, so a resume of it finds them too
+            await checkpoint.save(data[[EMAIL]].join(outputs[0], how='inner'), first_row, email_col=EMAIL,
+                                  output_columns=OUTPUT_COLUMNS)
+        await report_progress(len(reused))
+
+        # The rest in sub-batches, each checkpointed as soon as it is done
+        rows_left = np.setdiff1d(np.arange(len(data)), np.fromiter(reused, dtype=int))
+        sub_batches = [rows_left[start:start + CHECKPOINT_ROWS] for start in range(0, len(rows_left), CHECKPOINT_ROWS)]
+        outputs += await asyncio.gather(*(enrich_rows(data, rows, first_row) for rows in sub_batches))
+        data = data.join(pd.concat(outputs)).fillna('-')
+        data[INPUT_HASH] = hashes.to_numpy()
+        return data
+
+    # Enrich the sheet chunk by chunk as it streams in, then batch all the leads together
+    if isinstance(data, pd.DataFrame):
+        enriched_chunks = [await process_chunk(data, first_row=0)]
+    else:
+        enriched_chunks, rows_done = [], 0
+        async for chunk in data:
+            enriched_chunks.append(await process_chunk(chunk, first_row=rows_done))
+            rows_done += len(chunk)
+            print(f"Enriched {rows_done} rows")
+    data = pd.concat(enriched_chunks, ignore_index=True)
+    print(f"Priority score memo stats: {dict(priority_stats)}")
+    print(f"Enrichment cache stats: {enrichment_cache.stats()}")
 
     # await upload_df_to_supabase_async(df=data, file_prefix='big_sheet')
 
@@ -211,11 +374,88 @@ async def generate_personalized_sheet(data, request, column_names):
         job_title_col=JOB_TITLE,
         department_col=DEPARTMENT,
         employee_count_col=EMPLOYEE_COUNT,
-        mailboxes=project_details['no_of_mailbox'],
-        emails_per_mailbox=project_details['emails_per_mailbox'],
-        batch_duration_days=project_details['batch_duration_days'],
+        mailboxes=project_details.no_of_mailbox,
+        emails_per_mailbox=project_details.emails_per_mailbox,
+        batch_duration_days=project_details.batch_duration_days,
         start_date=date.today().strftime("%Y-%m-%d"),
+        rule_tables=rule_tables,
+        seniority_col=SENIORITY,
     )
+    if on_batched is not None:
+        await on_batched(data, result_df)
 
     return result_df
 
+
+async def save_leads(project_id, enriched_sheet, batched_sheet, column_names, job_id=None):
+    '''
+    Store the leads of a personalized sheet and their outputs in the leads table
+
+    The inputs are stored as the sheet had them, not as the batching rewrote them, so the stored
+    leads can be enriched again in place of the sheet. A failure is only logged, the sheet itself
+    is still uploaded.
+
+    :param project_id: id of the project the leads belong to
+    :param enriched_sheet: pandas dataframe of the enriched leads, before the batching
+    :param batched_sheet: the same leads after the batching, giving their batch columns
+    :param column_names: the names of the columns
+    :param job_id: id of the job that enriched the leads
+    '''
+    leads = enriched_sheet.reset_index(drop=True).join(batched_sheet[BATCH_COLUMNS].reset_index(drop=True))
+    output_columns = [column for column in OUTPUT_COLUMNS + BATCH_COLUMNS if column in leads]
+    input_columns = [column for column in leads.columns if column not in GENERATED_COLUMNS]
+    try:
+        stored = await store_leads(UUID(str(project_id)), leads, job_id=job_id,
+                                   email_col=column_names['email'], company_col=column_names['company_name'],
+                                   input_columns=input_columns, output_columns=output_columns,
+                                   hash_columns=get_input_columns(column_names))
+        print(f"Stored {stored} leads of project {project_id}")
+    except Exception as e:
+        print(f"Error storing the leads of project {project_id}: {e}")
+
+
+async def run_personalized_sheet_job(job_id, data, request, column_names, file_prefix, sheet_rows=None, checkpoint=None,
+                                     file_format=XLSX):
+    '''
+    Run generate_personalized_sheet and the upload as a background job, recording its state in the jobs table
+
+    :param job_id: id of the queued job
+    :param data: pandas dataframe, or an async iterator of dataframe chunks
+    :param request: googleSheetRequestModel
+    :param column_names: the names of the columns
+    :param file_prefix: prefix of the uploaded file name
+    :param sheet_rows: optional future resolving to the number of rows in the sheet once it is downloaded
+    :param checkpoint: optional utility.checkpoints.JobCheckpoint of the job
+    :param file_format: export format, "xlsx", "csv.gz" or "parquet"
+    '''
+    async def record(**values):
+        async with AsyncSessionLocal() as session:
+            await update_job(session, job_id, **values)
+
+    async def on_progress(rows_done):
+        values = {'rows_done': rows_done}
+        if sheet_rows is not None and sheet_rows.done():
+            values['rows_total'] = sheet_rows.result()
+        await record(**values)
+
+    async def on_batched(enriched_sheet, batched_sheet):
+        await save_leads(request.project_id, enriched_sheet, batched_sheet, column_names, job_id)
+
+    await record(state=JOB_RUNNING, started_at=datetime.now(timezone.utc))
+    try:
+        personalized_sheet = await generate_personalized_sheet(data=data, request=request, column_names=column_names,
+                                                               on_progress=on_progress, checkpoint=checkpoint,
+                                                               on_batched=on_batched)
+        public_url = await upload_df_to_supabase_async(df=personalized_sheet, file_prefix=file_prefix,
+                                                       file_format=file_format)
+    except Exception as e:
+        print(f"Job {job_id} failed: {e}")
+        await record(state=JOB_FAILED, error=str(getattr(e, 'detail', e)), finished_at=datetime.now(timezone.utc))
+        return
+    finally:
+        # A job that failed part way stops the download of the rest of its sheet
+        if hasattr(data, 'aclose'):
+            await data.aclose()
+
+    await record(state=JOB_COMPLETED, rows_done=len(personalized_sheet), rows_total=len(personalized_sheet),
+                 sheet_link=public_url, finished_at=datetime.now(timezone.utc))
@@ -0,0 +1,30 @@
+from pydantic import BaseModel, UUID4, Field
+from typing import Optional
+from datetime import datetime
+
+class JobCreate(BaseModel):
+    user_id: UUID4
+    project_id: UUID4
+    original_sheet_url: str
+    proceed_on_invalid_email: bool = False
+    resumed_from_job_id: Optional[UUID4] = None
+    resume_mode: Optional[str] = None
+
+class JobSubmitResponse(BaseModel):
+    job_id: UUID4 = Field(description="ID to poll on /jobs/{job_id}")
+    state: str
+
+class JobResponse(BaseModel):
+    id: UUID4
+    project_id: UUID4
+    resumed_from_job_id: Optional[UUID4] = None
+    resume_mode: Optional[str] = None
+    state: str = Field(description="queued, running, completed or failed")
+    rows_total: Optional[int] = Field(None, description="Rows in the sheet, known once it is downloaded")
+    rows_done: int = 0
+    eta_seconds: Optional[float] = Field(None, description="Estimated seconds left while running")
+    sheet_link: Optional[str] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, UUID4
-from typing import Optional, List
+from typing import Optional, List, Any, Dict
 
 class ProjectCreate(BaseModel):
     name: str
@@ -40,3 +40,7 @@ class ProjectCreate(BaseModel):
 
 class ProjectResponse(ProjectCreate):
     id: UUID4
+
+class ProjectPage(BaseModel):
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[UUID4] = None
@@ -0,0 +1,86 @@
+import types
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from utility.batching import BATCH_COLUMNS, SIZE_RULES, cold_email_batcher_advanced, get_project_rule_tables
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Arguments batched_output.csv was produced with, from the example at the bottom of utility/batching.py
+BATCHER_ARGS = dict(
+    company_col="Company",
+    priority_col="Priority Score",
+    email_provider_col="Email Providers",
+    job_title_col="Title",
+    department_col="Departments",
+    employee_count_col="Employees",
+    mailboxes=5,
+    emails_per_mailbox=30,
+    batch_duration_days=10,
+)
+
+
+@pytest.fixture(scope="module")
+def sheet():
+    return pd.read_csv(ROOT / "sheet.csv", encoding="ISO-8859-1")
+
+
+def test_matches_the_original_batcher_output(sheet, tmp_path):
+    expected = pd.read_csv(ROOT / "utility" / "batched_output.csv", encoding="utf-8")
+    result = cold_email_batcher_advanced(df=sheet, start_date=expected["Send Date"].dropna().min(), **BATCHER_ARGS)
+
+    # Through a CSV like the original, so both sides have the same dtypes
+    result.to_csv(tmp_path / "batched.csv", index=False)
+    result = pd.read_csv(tmp_path / "batched.csv", encoding="utf-8")
+
+    assert list(result.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_keeps_the_rows_and_leaves_the_input_alone(sheet):
+    original = sheet.copy()
+    result = cold_email_batcher_advanced(df=sheet, start_date="2025-01-01", **BATCHER_ARGS)
+
+    assert len(result) == len(sheet)
+    assert (result["Email"].to_numpy() == sheet["Email"].to_numpy()).all()
+    pd.testing.assert_frame_equal(sheet, original)
+    assert set(BATCH_COLUMNS) <= set(result.columns)
+
+
+def test_company_limit_and_daily_capacity(sheet):
+    result = cold_email_batcher_advanced(df=sheet, start_date="2025-01-01", **BATCHER_ARGS)
+    batched = result[result["Batch number"].notna()]
+
+    employees = result.groupby("Company")["Employees"].transform("max")
+    limits = {rule["name"]: rule["limit"] for rule in SIZE_RULES}
+    for company, leads in batched.groupby("Company"):
+        segment = next(rule for rule in SIZE_RULES
+                       if rule["min"] <= employees[leads.index[0]] <= rule["max"])
+        assert len(leads) <= limits[segment["name"]], company
+
+    per_batch = batched.groupby("Batch Name").size()
+    assert per_batch.max() <= BATCHER_ARGS["mailboxes"] * BATCHER_ARGS["emails_per_mailbox"]
+
+
+def test_project_seniority_tiers_match_the_seniority_column():
+    leads = pd.DataFrame({
+        "Company": ["Acme", "Acme", "Acme"],
+        "Title": ["head of growth", "account executive", "account executive"],
+        "Seniority": ["vp", "director", "entry"],
+        "Departments": ["sales", "sales", "sales"],
+        "Employees": [20, 20, 20],
+        "Priority Score": [50, 50, 50],
+        "Email Providers": ["google workspace"] * 3,
+    })
+    project = types.SimpleNamespace(id="project", seniority_tier_1=["director"], seniority_tier_2=[],
+                                    seniority_tier_3=[], seniority_excluded=["entry"])
+    args = dict(BATCHER_ARGS, mailboxes=1, emails_per_mailbox=10, batch_duration_days=1)
+    result = cold_email_batcher_advanced(df=leads, start_date="2025-01-01", seniority_col="Seniority",
+                                         rule_tables=get_project_rule_tables(project), **args)
+
+    # "head of" is still a secondary title role, the tier only adds the director by seniority
+    assert result["Status"].tolist() == ["ready", "ready", "unbatchable"]
+    assert "Seniority 'entry' is in excluded seniorities" in result["Reason"][2]
+    assert pd.isna(result["Batch number"][2])
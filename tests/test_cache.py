@@ -0,0 +1,85 @@
+import pytest
+
+import utility.cache as cache_module
+from utility.cache import PersistentCache
+
+NAMESPACE = "test"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time() of the cache module"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PersistentCache(str(tmp_path / "cache.sqlite3"), ttls={NAMESPACE: 60, "other": 60}, max_entries=3)
+
+
+def rows(cache, namespace=NAMESPACE):
+    return cache._conn.execute("SELECT key FROM cache WHERE namespace = ? ORDER BY key", (namespace,)).fetchall()
+
+
+def test_round_trip_and_stats(cache, clock):
+    cache.set(NAMESPACE, "a", {"summary": "text", "score": 5})
+
+    assert cache.get(NAMESPACE, "a") == {"summary": "text", "score": 5}
+    assert cache.get(NAMESPACE, "missing") is None
+    assert cache.stats() == {NAMESPACE: {"hits": 1, "misses": 1}}
+
+
+def test_entries_expire_after_the_namespace_ttl(cache, clock):
+    cache.set(NAMESPACE, "a", 1)
+    clock[0] += 59
+    assert cache.get(NAMESPACE, "a") == 1
+    clock[0] += 1
+    assert cache.get(NAMESPACE, "a") is None
+
+
+def test_ttl_argument_overrides_the_default(cache, clock):
+    cache.set(NAMESPACE, "short", 1, ttl=5)
+    cache.set(NAMESPACE, "long", 2, ttl=600)
+    clock[0] += 100
+
+    assert cache.get(NAMESPACE, "short") is None
+    assert cache.get(NAMESPACE, "long") == 2
+
+
+def test_prune_drops_expired_and_least_recently_used_entries(cache, clock, monkeypatch):
+    monkeypatch.setattr(cache, "PRUNE_EVERY", 1)
+    cache.set(NAMESPACE, "expiring", 0, ttl=1)
+    clock[0] += 2
+    for key in ("a", "b", "c"):
+        clock[0] += 1
+        cache.set(NAMESPACE, key, key)
+    assert rows(cache) == [("a",), ("b",), ("c",)]
+
+    # Reading "a" makes "b" the least recently used once a fourth entry comes in
+    clock[0] += 1
+    cache.get(NAMESPACE, "a")
+    clock[0] += 1
+    cache.set(NAMESPACE, "d", "d")
+    assert rows(cache) == [("a",), ("c",), ("d",)]
+
+
+def test_prune_keeps_each_namespace_to_its_own_limit(cache, clock, monkeypatch):
+    monkeypatch.setattr(cache, "PRUNE_EVERY", 1)
+    for key in ("a", "b", "c"):
+        clock[0] += 1
+        cache.set("other", key, key)
+    for key in ("a", "b", "c", "d"):
+        clock[0] += 1
+        cache.set(NAMESPACE, key, key)
+
+    assert len(rows(cache, "other")) == 3
+    assert rows(cache) == [("b",), ("c",), ("d",)]
+
+
+def test_entries_survive_reopening(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite3")
+    PersistentCache(path, ttls={NAMESPACE: 60}, max_entries=10).set(NAMESPACE, "a", [1, 2])
+
+    assert PersistentCache(path, ttls={NAMESPACE: 60}, max_entries=10).get(NAMESPACE, "a") == [1, 2]
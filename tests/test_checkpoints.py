@@ -0,0 +1,185 @@
+import asyncio
+import contextlib
+import types
+
+import pandas as pd
+import pytest
+
+import personalized
+import utility.checkpoints as checkpoints
+from utility.checkpoints import REPAIR, RESUME, JobCheckpoint
+
+OUTPUT_COLUMNS = ["Email Valid", "Error Log"]
+
+
+@contextlib.asynccontextmanager
+async def no_session():
+    yield None
+
+
+@pytest.fixture
+def job_rows(monkeypatch):
+    """In-memory job_rows table behind JobCheckpoint"""
+    table = {}
+
+    async def save_job_rows(session, job_id, rows):
+        for row in rows:
+            table[(job_id, row["row_index"])] = types.SimpleNamespace(**row)
+
+    async def get_job_rows(session, job_id, first_row, end_row):
+        return [row for (job, index), row in table.items() if job == job_id and first_row <= index < end_row]
+
+    monkeypatch.setattr(checkpoints, "AsyncSessionLocal", no_session)
+    monkeypatch.setattr(checkpoints, "save_job_rows", save_job_rows)
+    monkeypatch.setattr(checkpoints, "get_job_rows", get_job_rows)
+    return table
+
+
+def rows(emails, errors=None, index=None):
+    return pd.DataFrame({"Email": emails, "Email Valid": ["valid"] * len(emails),
+                         "Error Log": errors or [""] * len(emails)}, index=index)
+
+
+def test_nothing_to_reuse_without_a_previous_job(job_rows):
+    checkpoint = JobCheckpoint("new")
+    assert asyncio.run(checkpoint.load(rows(["a@x.com"]), 0, "Email", "Error Log")) == {}
+
+
+def test_partial_saves_are_resumed_row_by_row(job_rows):
+    previous = JobCheckpoint("previous")
+    # Two sub-batches of the chunk starting at row 100 finished, out of order and not contiguous
+    asyncio.run(previous.save(rows(["c@x.com"], index=[2]), 100, "Email", OUTPUT_COLUMNS))
+    asyncio.run(previous.save(rows(["a@x.com"], index=[0]), 100, "Email", OUTPUT_COLUMNS))
+    assert sorted(index for _, index in job_rows) == [100, 102]
+
+    chunk = rows(["a@x.com", "b@x.com", "c@x.com"])
+    reused = asyncio.run(JobCheckpoint("next", "previous", RESUME).load(chunk, 100, "Email", "Error Log"))
+
+    assert sorted(reused) == [0, 2]
+    assert reused[0] == {"Email Valid": "valid", "Error Log": ""}
+
+
+def test_rows_whose_email_changed_are_not_reused(job_rows):
+    asyncio.run(JobCheckpoint("previous").save(rows(["a@x.com", "b@x.com"]), 0, "Email", OUTPUT_COLUMNS))
+
+    chunk = rows(["a@x.com", "other@x.com"])
+    reused = asyncio.run(JobCheckpoint("next", "previous").load(chunk, 0, "Email", "Error Log"))
+
+    assert list(reused) == [0]
+
+
+def test_repair_re_runs_the_rows_with_an_error(job_rows):
+    saved = rows(["a@x.com", "b@x.com"], errors=["", "*timeout \n"])
+    asyncio.run(JobCheckpoint("previous").save(saved, 0, "Email", OUTPUT_COLUMNS))
+
+    chunk = rows(["a@x.com", "b@x.com"])
+    assert sorted(asyncio.run(JobCheckpoint("resume", "previous", RESUME).load(chunk, 0, "Email", "Error Log"))) == [0, 1]
+    assert sorted(asyncio.run(JobCheckpoint("repair", "previous", REPAIR).load(chunk, 0, "Email", "Error Log"))) == [0]
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """generate_personalized_sheet with every vendor faked, counting the emails verified"""
+    verified, crashing = [], set()
+
+    async def verify_email_cached(email, api_key):
+        verified.append(email)
+        if email in crashing:
+            # Give the other sub-batches time to finish first
+            await asyncio.sleep(0.05)
+            raise RuntimeError("worker died")
+        return "valid", "google workspace", ""
+
+    class WebsiteSummaryBatcher:
+        def __init__(self, api_key):
+            pass
+
+        async def summarize(self, website):
+            return f"summary of {website}", ""
+
+    async def get_company_linkedin_data(url, api_key):
+        return f"about {url}", 20, ""
+
+    async def generate_ice_breakers_chain(**kwargs):
+        return "options", "selected", "reason", ""
+
+    async def get_priority_scores_cached(leads, **kwargs):
+        return [({"priority_score": 50, "reason": "fits"}, "") for _ in leads], {}
+
+    async def get_project_by_id(session, project_id):
+        return types.SimpleNamespace(id=project_id, description="campaign", no_of_mailbox=1,
+                                     emails_per_mailbox=10, batch_duration_days=1)
+
+    no_cache = types.SimpleNamespace(get=lambda *args: None, set=lambda *args: None, stats=lambda: {})
+    for name, fake in [("verify_email_cached", verify_email_cached), ("WebsiteSummaryBatcher", WebsiteSummaryBatcher),
+                       ("get_company_linkedin_data", get_company_linkedin_data),
+                       ("generate_ice_breakers_chain", generate_ice_breakers_chain),
+                       ("get_priority_scores_cached", get_priority_scores_cached),
+                       ("get_project_by_id", get_project_by_id), ("AsyncSessionLocal", no_session),
+                       ("enrichment_cache", no_cache)]:
+        monkeypatch.setattr(personalized, name, fake)
+    monkeypatch.setattr(personalized, "CHECKPOINT_ROWS", 4)
+    return types.SimpleNamespace(verified=verified, crashing=crashing)
+
+
+COLUMN_NAMES = dict(first_name="First Name", last_name="Last Name", company_name="Company", email="Email",
+                    job_title="Title", seniority=None, industry="Industry", department=None,
+                    company_website="Website", company_linkedin="Company Linkedin Url", employee_count="Employees")
+REQUEST = types.SimpleNamespace(project_id="project", proceed_on_invalid_email=False, openai_key="key",
+                                ss_masters_key="key", exa_api_key="key")
+
+
+def leads(count):
+    return pd.DataFrame({
+        "First Name": ["Ann"] * count, "Last Name": ["Lee"] * count,
+        "Company": [f"Company {n // 2}" for n in range(count)],
+        "Email": [f"lead{n}@x.com" for n in range(count)],
+        "Title": ["Sales Director"] * count, "Industry": ["Software"] * count,
+        "Website": [f"https://company{n // 2}.com" for n in range(count)],
+        "Company Linkedin Url": [f"https://linkedin.com/company/{n // 2}" for n in range(count)],
+        "Employees": [20] * count,
+    })
+
+
+def test_a_crashed_job_resumes_from_its_finished_sub_batches(job_rows, pipeline):
+    sheet = leads(10)
+    pipeline.crashing.add("lead9@x.com")
+    with pytest.raises(RuntimeError):
+        asyncio.run(personalized.generate_personalized_sheet(sheet, REQUEST, COLUMN_NAMES,
+                                                             checkpoint=JobCheckpoint("first")))
+    # The chunk never finished, but its sub-batches of CHECKPOINT_ROWS rows were saved as they did
+    assert sorted(index for job, index in job_rows if job == "first") == list(range(8))
+
+    pipeline.crashing.clear()
+    pipeline.verified.clear()
+    result = asyncio.run(personalized.generate_personalized_sheet(sheet, REQUEST, COLUMN_NAMES,
+                                                                  checkpoint=JobCheckpoint("second", "first")))
+
+    assert sorted(pipeline.verified) == ["lead8@x.com", "lead9@x.com"]
+    assert result["Email"].tolist() == sheet["Email"].tolist()
+    assert result["Email Valid"].tolist() == ["valid"] * 10
+    assert result["Exa Website Summary"].tolist() == [f"summary of https://company{n // 2}.com" for n in range(10)]
+    # The resumed job checkpoints every row, reused ones included
+    assert sorted(index for job, index in job_rows if job == "second") == list(range(10))
+
+
+def test_progress_is_reported_after_every_sub_batch(job_rows, pipeline):
+    sheet = leads(10)
+    reported = []
+
+    async def on_progress(rows_done):
+        reported.append(rows_done)
+
+    pipeline.crashing.add("lead9@x.com")
+    with pytest.raises(RuntimeError):
+        asyncio.run(personalized.generate_personalized_sheet(sheet, REQUEST, COLUMN_NAMES, on_progress=on_progress,
+                                                             checkpoint=JobCheckpoint("first")))
+    # Both finished sub-batches of CHECKPOINT_ROWS rows were reported before the chunk failed
+    assert reported == [4, 8]
+
+    pipeline.crashing.clear()
+    reported.clear()
+    asyncio.run(personalized.generate_personalized_sheet(sheet, REQUEST, COLUMN_NAMES, on_progress=on_progress,
+                                                         checkpoint=JobCheckpoint("second", "first")))
+    # The reused rows first, then the sub-batch left
+    assert reported == [8, 10]
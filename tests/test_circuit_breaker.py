@@ -0,0 +1,124 @@
+import httpx
+import pytest
+
+import utility.circuit_breaker as circuit_breaker_module
+from utility.circuit_breaker import (CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError,
+                                     circuit_breaker_states, get_circuit_breaker, is_vendor_failure)
+from utility.rate_limiter import EXA, api_key_id
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic() of the breaker module"""
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(EXA, failure_rate=0.5, min_calls=4, window=10, open_seconds=30)
+
+
+def trip(breaker):
+    for _ in range(breaker.min_calls):
+        breaker.check()
+        breaker.record(failed=True)
+
+
+def test_vendor_failures():
+    assert is_vendor_failure(httpx.ConnectError("refused"))
+    assert is_vendor_failure(Exception(), 429)
+    assert is_vendor_failure(Exception(), 503)
+    assert not is_vendor_failure(Exception(), 401)
+    assert not is_vendor_failure(Exception(), 403)
+    assert not is_vendor_failure(Exception(), 400)
+    assert not is_vendor_failure(ValueError("unparsable reply"))
+
+
+def test_stays_closed_below_the_minimum_calls(breaker):
+    for _ in range(3):
+        breaker.record(failed=True)
+    assert breaker.state == CLOSED
+
+
+def test_opens_once_the_failure_rate_is_reached(breaker):
+    for failed in (False, False, False, True, True):
+        breaker.record(failed=failed)
+    assert breaker.state == CLOSED
+
+    breaker.record(failed=True)
+    assert breaker.state == OPEN
+
+
+def test_opens_at_the_failure_rate_and_fails_fast(breaker):
+    trip(breaker)
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    with pytest.raises(CircuitOpenError):
+        breaker.raise_if_open()
+    assert breaker.snapshot()["rejected_calls"] == 2
+    assert breaker.snapshot()["times_opened"] == 1
+
+
+def test_half_open_probe_success_closes(breaker, clock):
+    trip(breaker)
+    clock[0] += 30
+
+    breaker.check()
+    assert breaker.state == HALF_OPEN
+    # Only one probe at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+    breaker.record(failed=False)
+    assert breaker.state == CLOSED
+    breaker.check()
+
+
+def test_half_open_probe_failure_reopens(breaker, clock):
+    trip(breaker)
+    clock[0] += 30
+    breaker.check()
+
+    breaker.record(failed=True)
+    assert breaker.state == OPEN
+    assert breaker.snapshot()["times_opened"] == 2
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+
+def test_lost_probe_is_replaced(breaker, clock):
+    trip(breaker)
+    clock[0] += 30
+    breaker.check()
+
+    # The probe never reports back
+    clock[0] += 30
+    breaker.check()
+    assert breaker.state == HALF_OPEN
+
+
+def test_raise_if_open_does_not_take_a_probe(breaker, clock):
+    trip(breaker)
+    clock[0] += 30
+
+    breaker.raise_if_open()
+    breaker.check()
+    assert breaker.state == HALF_OPEN
+
+
+def test_one_breaker_per_vendor_and_key():
+    bad, good = "test-bad-key", "test-good-key"
+    assert get_circuit_breaker(EXA, bad) is get_circuit_breaker(EXA, bad)
+    assert get_circuit_breaker(EXA, bad) is not get_circuit_breaker(EXA, good)
+
+    trip(get_circuit_breaker(EXA, bad))
+    get_circuit_breaker(EXA, good).check()
+
+    states = circuit_breaker_states()[EXA]
+    assert states[api_key_id(bad)]["state"] == OPEN
+    assert states[api_key_id(good)]["state"] == CLOSED
+    assert bad not in str(states)
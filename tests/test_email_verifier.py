@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+import utility.email_verifier as email_verifier
+from utility.cache import DEFAULT_TTLS, PersistentCache
+
+
+@pytest.fixture
+def verifier(monkeypatch, tmp_path):
+    """Stubbed lead_email_verifier behind a fresh cache, recording the (email, key) of every call"""
+    calls, failing = [], set()
+
+    async def lead_email_verifier(email, api_key):
+        calls.append((email, api_key))
+        if api_key in failing:
+            return "-", "-", "Unable to verify email: 403 Forbidden"
+        return "valid", "google workspace", ""
+
+    monkeypatch.setattr(email_verifier, "lead_email_verifier", lead_email_verifier)
+    monkeypatch.setattr(email_verifier, "enrichment_cache",
+                        PersistentCache(str(tmp_path / "cache.sqlite3"), ttls=DEFAULT_TTLS, max_entries=100))
+    return calls, failing
+
+
+def verify(email, api_key):
+    return asyncio.run(email_verifier.verify_email_cached(email, api_key))
+
+
+def test_results_are_shared_across_keys(verifier):
+    calls, _ = verifier
+
+    assert verify("Ann@X.com ", "key-a") == ("valid", "google workspace", "")
+    assert verify("ann@x.com", "key-b") == ("valid", "google workspace", "")
+    assert calls == [("ann@x.com", "key-a")]
+
+
+def test_errors_are_kept_for_the_failing_key_only(verifier):
+    calls, failing = verifier
+    failing.add("key-a")
+
+    assert verify("ann@x.com", "key-a")[2].startswith("Unable to verify email")
+    assert verify("ann@x.com", "key-a")[2].startswith("Unable to verify email")
+    assert calls == [("ann@x.com", "key-a")]
+
+    # Another tenant's key is not blamed for it
+    assert verify("ann@x.com", "key-b") == ("valid", "google workspace", "")
+    assert calls == [("ann@x.com", "key-a"), ("ann@x.com", "key-b")]
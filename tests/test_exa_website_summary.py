@@ -0,0 +1,82 @@
+import asyncio
+import itertools
+import types
+
+import pytest
+
+import utility.exa_webite_summary as exa_webite_summary
+from utility.exa_webite_summary import WebsiteSummaryBatcher
+
+# Every test uses its own key, so none shares another's rate limiter or circuit breaker
+_keys = (f"exa-key-{n}" for n in itertools.count())
+
+
+class RejectedRequest(Exception):
+    status_code = 400
+
+
+@pytest.fixture
+def exa(monkeypatch):
+    """Stubbed Exa client recording the URLs of every get_contents call"""
+    calls = []
+
+    class Exa:
+        def get_contents(self, urls, summary):
+            calls.append(urls)
+            if any("bad url" in url for url in urls):
+                raise RejectedRequest("400 Bad Request: invalid URL")
+            # Replies come back in any order, redirected to their final URL
+            results = [types.SimpleNamespace(id=url, url=f"https://www.{url.split('://')[-1]}/",
+                                             summary=f"COMPANY: {url}")
+                       for url in reversed(urls) if "unreadable" not in url]
+            statuses = [types.SimpleNamespace(id=url, status="error" if "unreadable" in url else "success")
+                        for url in urls]
+            return types.SimpleNamespace(results=results, statuses=statuses)
+
+    monkeypatch.setattr(exa_webite_summary, "get_exa_client", lambda exa_api_key: Exa())
+    return calls
+
+
+def summarize(websites, batch_size=10):
+    async def run():
+        batcher = WebsiteSummaryBatcher(next(_keys), batch_size=batch_size, wait=0.01)
+        return await asyncio.gather(*(batcher.summarize(website) for website in websites))
+    return asyncio.run(run())
+
+
+def test_concurrent_websites_are_sent_in_batches(exa):
+    websites = [f"https://company{n}.com" for n in range(25)]
+
+    results = summarize(websites)
+
+    assert sorted(len(call) for call in exa) == [5, 10, 10]
+    assert sorted(url for call in exa for url in call) == sorted(websites)
+    assert results == [(f"COMPANY: {website}", "") for website in websites]
+
+
+def test_a_website_requested_twice_in_a_batch_is_sent_once(exa):
+    websites = ["https://company1.com", "https://company2.com"]
+
+    results = summarize(websites * 2)
+
+    assert exa == [websites]
+    assert results == [(f"COMPANY: {website}", "") for website in websites * 2]
+
+
+def test_replies_map_back_to_the_requested_websites(exa):
+    results = summarize(["company1.com", "https://Company2.com/", "http://unreadable.com"])
+
+    assert results == [("COMPANY: company1.com", ""), ("COMPANY: https://Company2.com/", ""),
+                       ("", "Exa could not read the website")]
+    assert len(exa) == 1
+
+
+def test_a_rejected_batch_is_split_to_find_the_bad_website(exa):
+    websites = ["https://company1.com", "https://bad url.com", "https://company2.com"]
+
+    results = summarize(websites)
+
+    assert exa == [websites] + [[website] for website in websites]
+    assert results[0] == ("COMPANY: https://company1.com", "")
+    assert results[2] == ("COMPANY: https://company2.com", "")
+    assert results[1][0] == "" and "400" in results[1][1]
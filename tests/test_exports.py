@@ -0,0 +1,83 @@
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.styles import Alignment, Font, PatternFill
+
+from upload_file_superbase import dataframe_to_csv_gz, dataframe_to_parquet, dataframe_to_xlsx
+
+
+def sheet():
+    return pd.DataFrame({
+        "Email": ["ann@x.com", "bob@y.com", "cy@z.com"],
+        "Priority Score": [90, "70", 5.5],
+        "Employees": [20, "-", 5000],
+        "Summary": ["multi\nline, \"quoted\"", "é ü 中文", None],
+    })
+
+
+def test_csv_gz_round_trip():
+    data = dataframe_to_csv_gz(sheet())
+    result = pd.read_csv(BytesIO(data), compression="gzip", keep_default_na=False)
+
+    assert result.columns.tolist() == sheet().columns.tolist()
+    assert result["Email"].tolist() == ["ann@x.com", "bob@y.com", "cy@z.com"]
+    assert result["Summary"].tolist() == ["multi\nline, \"quoted\"", "é ü 中文", ""]
+    # Identical data gives identical files
+    assert dataframe_to_csv_gz(sheet()) == data
+
+
+def test_parquet_round_trip():
+    result = pd.read_parquet(BytesIO(dataframe_to_parquet(sheet())))
+
+    assert result.columns.tolist() == sheet().columns.tolist()
+    assert result["Email"].tolist() == ["ann@x.com", "bob@y.com", "cy@z.com"]
+    # Columns whose values all convert are numbers, the others text
+    assert result["Priority Score"].tolist() == [90, 70, 5.5]
+    assert result["Employees"].tolist() == ["20", "-", "5000"]
+    assert result["Summary"].tolist()[:2] == ["multi\nline, \"quoted\"", "é ü 中文"]
+    assert pd.isna(result["Summary"][2])
+
+
+def previous_xlsx(df):
+    """The XLSX export before the write-only rewrite: pandas' writer, then a restyling pass"""
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        df.to_excel(writer, index=False, sheet_name="Sheet1")
+    output.seek(0)
+    wb = load_workbook(output)
+    ws = wb.active
+    for cell in ws[1]:
+        cell.fill = PatternFill(start_color="1E90FF", end_color="1E90FF", fill_type="solid")
+        cell.font = Font(color="FFFFFF", bold=True)
+        cell.alignment = Alignment(horizontal="center", vertical="center")
+    for column_cells in ws.columns:
+        max_length = max(len(str(cell.value or "")) for cell in column_cells)
+        ws.column_dimensions[column_cells[0].column_letter].width = max_length + 5
+    result = BytesIO()
+    wb.save(result)
+    return result.getvalue()
+
+
+def test_xlsx_matches_the_previous_export():
+    df = pd.DataFrame({
+        "Email": ["ann@x.com", "bob@y.com", None],
+        "Priority Score": [90, np.nan, 5.5],
+        "Employees": [20, "-", 5000],
+        "Summary": ["a rather long company summary", "é ü 中文", np.nan],
+    })
+
+    new, old = (load_workbook(BytesIO(data)).active for data in (dataframe_to_xlsx(df), previous_xlsx(df)))
+
+    assert new.title == old.title == "Sheet1"
+    assert list(new.values) == list(old.values)
+    assert list(new.values)[0] == ("Email", "Priority Score", "Employees", "Summary")
+    # Missing values are empty cells
+    assert list(new.values)[2][1] is None and list(new.values)[3][0] is None
+    for new_cell, old_cell in zip(new[1], old[1]):
+        assert new_cell.fill.fgColor.rgb == old_cell.fill.fgColor.rgb
+        assert (new_cell.font.bold, new_cell.font.color.rgb) == (old_cell.font.bold, old_cell.font.color.rgb)
+        assert new_cell.alignment.horizontal == old_cell.alignment.horizontal == "center"
+    for letter in "ABCD":
+        assert new.column_dimensions[letter].width == old.column_dimensions[letter].width
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+import utility.google_sheet_handeling as google_sheet_handeling
+from utility.google_sheet_handeling import ChainedChunks, _iter_csv_records, iter_google_sheet_chunks
+
+SHEET_URL = "https://docs.google.com/spreadsheets/d/abc123/edit#gid=0"
+
+
+async def lines_of(*lines):
+    for line in lines:
+        yield line
+
+
+def records(*lines):
+    async def collect():
+        return [record async for record in _iter_csv_records(lines_of(*lines))]
+    return asyncio.run(collect())
+
+
+@pytest.fixture
+def sheet(monkeypatch):
+    """Stubbed shared client streaming the lines of a CSV export, failing after `fail_after` lines when set"""
+    state = {"lines": [], "fail_after": None, "read": 0, "closed": False}
+
+    class Response:
+        def raise_for_status(self):
+            pass
+
+        async def aiter_lines(self):
+            for number, line in enumerate(state["lines"]):
+                if number == state["fail_after"]:
+                    raise ConnectionError("connection reset")
+                state["read"] += 1
+                yield line + "\r\n"
+                await asyncio.sleep(0)
+
+    class Stream:
+        async def __aenter__(self):
+            return Response()
+
+        async def __aexit__(self, *exc_info):
+            state["closed"] = True
+
+    class Client:
+        def stream(self, method, url, **kwargs):
+            assert url.endswith("/spreadsheets/d/abc123/export?format=csv")
+            return Stream()
+
+    monkeypatch.setattr(google_sheet_handeling, "get_http_client", lambda base_url: Client())
+    return state
+
+
+def read_all(chunk_rows, on_downloaded=None):
+    async def collect():
+        return [chunk async for chunk in iter_google_sheet_chunks(SHEET_URL, chunk_rows, on_downloaded)]
+    return asyncio.run(collect())
+
+
+def test_quoted_fields_spanning_lines_are_one_record():
+    assert records('name,notes', 'Ann,"first line', 'second, line', 'last"', 'Bob,plain') == [
+        'name,notes', 'Ann,"first line\nsecond, line\nlast"', 'Bob,plain']
+
+
+def test_escaped_quotes_do_not_open_a_field():
+    assert records('Ann,"says ""hi"""', 'Bob,"""quoted"" start', 'and end"', 'Cy,x') == [
+        'Ann,"says ""hi"""', 'Bob,"""quoted"" start\nand end"', 'Cy,x']
+
+
+def test_chunks_split_on_records_not_lines(sheet):
+    sheet["lines"] = ["name,notes"] + [line for n in range(5) for line in (f'lead{n},"line one', f'line two of {n}"')]
+    downloaded = []
+
+    chunks = read_all(chunk_rows=2, on_downloaded=downloaded.append)
+
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert all(chunk.columns.tolist() == ["name", "notes"] for chunk in chunks)
+    assert chunks[2]["name"].tolist() == ["lead4"]
+    assert chunks[1]["notes"].tolist() == ["line one\nline two of 2", "line one\nline two of 3"]
+    assert downloaded == [5]
+
+
+def test_a_failed_download_reaches_the_consumer(sheet):
+    sheet["lines"] = ["name"] + [f"lead{n}" for n in range(10)]
+    sheet["fail_after"] = 6
+    received = []
+
+    async def consume():
+        async for chunk in iter_google_sheet_chunks(SHEET_URL, 2):
+            received.append(len(chunk))
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(consume())
+    # The chunks completed before the failure were delivered first
+    assert received == [2, 2]
+
+
+def test_closing_the_chained_chunks_stops_the_download(sheet):
+    sheet["lines"] = ["name"] + [f"lead{n}" for n in range(1000)]
+
+    async def first_then_close():
+        chunks = iter_google_sheet_chunks(SHEET_URL, 10)
+        chained = ChainedChunks(await anext(chunks), chunks)
+        first = await anext(chained)
+        await asyncio.sleep(0.05)
+        await chained.aclose()
+        await asyncio.sleep(0.05)
+        return first
+
+    assert asyncio.run(first_then_close())["name"].tolist() == [f"lead{n}" for n in range(10)]
+    # Only a few chunks ahead were read, and the response was closed
+    assert sheet["read"] < 100
+    assert sheet["closed"]
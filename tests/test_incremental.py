@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+from utility.incremental import INPUT_HASH, email_keys, input_hashes, previous_outputs
+
+INPUTS = ["Email", "Title", "Employees"]
+OUTPUTS = ["Email Valid", "Priority Score", "Error Log"]
+
+
+def sheet(**columns):
+    rows = {"Email": ["a@x.com", "b@x.com"], "Title": ["CEO", "Director"], "Employees": [20, 300]}
+    rows.update(columns)
+    return pd.DataFrame(rows)
+
+
+def test_hash_ignores_case_whitespace_dtype_and_blank_markers():
+    original = sheet()
+    rewritten = pd.DataFrame({"Email": [" A@x.com", "b@x.com"], "Title": ["ceo ", "director"],
+                              "Employees": [20.0, 300.0]})
+
+    assert input_hashes(original, INPUTS).tolist() == input_hashes(rewritten, INPUTS).tolist()
+    blank = pd.DataFrame({"Email": ["a@x.com"], "Title": [np.nan], "Employees": ["-"]})
+    empty = pd.DataFrame({"Email": ["a@x.com"], "Title": [""], "Employees": [""]})
+    assert input_hashes(blank, INPUTS).tolist() == input_hashes(empty, INPUTS).tolist()
+
+
+def test_hash_changes_when_an_input_is_edited():
+    before = input_hashes(sheet(), INPUTS)
+    after = input_hashes(sheet(Title=["CEO", "VP Sales"]), INPUTS)
+
+    assert before[0] == after[0]
+    assert before[1] != after[1]
+
+
+def test_no_previous_outputs_in_a_raw_sheet():
+    df = sheet()
+    assert previous_outputs(df, "Email", input_hashes(df, INPUTS), OUTPUTS, proceed_on_invalid_email=False) == {}
+
+
+def test_previous_outputs_keyed_on_email_and_input_hash():
+    df = sheet(**{"Email Valid": ["valid", "valid"], "Priority Score": [90.0, np.nan], "Error Log": [np.nan, ""]})
+    hashes = input_hashes(df, INPUTS)
+
+    outputs = previous_outputs(df, "Email", hashes, OUTPUTS, proceed_on_invalid_email=False)
+
+    # The second row was verified but never scored, so it is not finished
+    assert list(outputs) == [("a@x.com", hashes[0])]
+    assert outputs[("a@x.com", hashes[0])] == {"Email Valid": "valid", "Priority Score": 90, "Error Log": ""}
+
+
+def test_invalid_emails_count_as_finished_unless_they_are_now_enriched():
+    df = sheet(**{"Email Valid": ["invalid", "valid"], "Priority Score": ["-", 50]})
+    hashes = input_hashes(df, INPUTS)
+
+    assert len(previous_outputs(df, "Email", hashes, OUTPUTS, proceed_on_invalid_email=False)) == 2
+    assert len(previous_outputs(df, "Email", hashes, OUTPUTS, proceed_on_invalid_email=True)) == 1
+
+
+def test_stored_input_hash_wins_over_the_current_inputs():
+    df = sheet(**{"Email Valid": ["valid", "valid"], "Priority Score": [90, 50],
+                  INPUT_HASH: ["0123456789abcdef", ""]})
+    hashes = input_hashes(df, INPUTS)
+
+    outputs = previous_outputs(df, "Email", hashes, OUTPUTS, proceed_on_invalid_email=False)
+
+    # An edited row keeps the hash it was enriched from, so it no longer matches its new inputs
+    assert set(outputs) == {("a@x.com", "0123456789abcdef"), ("b@x.com", hashes[1])}
+    assert ("a@x.com", hashes[0]) not in outputs
+
+
+def test_email_keys():
+    assert email_keys(pd.Series([" A@X.com", None])).tolist() == ["a@x.com", ""]
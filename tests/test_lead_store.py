@@ -0,0 +1,97 @@
+import asyncio
+import contextlib
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+from crud.leads import STAGING_COLUMNS, copy_leads
+from utility.incremental import INPUT_HASH
+from utility.lead_store import dataframe_to_leads, leads_to_dataframe
+
+INPUTS = ["Email", "Company", "Employees", "Title"]
+OUTPUTS = ["Priority Score", "Email Valid"]
+
+
+def sheet():
+    return pd.DataFrame({
+        "Email": [" Ann@X.com", np.nan, "bob@y.com"],
+        "Company": ["Acme", "Nobody", np.nan],
+        "Employees": [np.int64(120), np.int64(5), np.nan],
+        "Title": ["CEO", "VP", None],
+        "Priority Score": [90, 50, np.nan],
+        "Email Valid": ["valid", "valid", "-"],
+        "Status": ["batched", "batched", "unbatchable"],
+    })
+
+
+def test_rows_become_json_ready_leads():
+    leads = dataframe_to_leads(sheet(), email_col="Email", company_col="Company", input_columns=INPUTS,
+                               output_columns=OUTPUTS)
+
+    # The row without an email is left out, the others keep their order
+    assert [lead["email"] for lead in leads] == ["ann@x.com", "bob@y.com"]
+    assert leads[0]["company"] == "Acme" and leads[1]["company"] is None
+    assert [lead["status"] for lead in leads] == ["batched", "unbatchable"]
+    # numpy values come out as plain JSON types and NaN as null
+    assert leads[0]["inputs"] == {"Email": " Ann@X.com", "Company": "Acme", "Employees": 120.0, "Title": "CEO"}
+    assert leads[1]["inputs"] == {"Email": "bob@y.com", "Company": None, "Employees": None, "Title": None}
+    assert leads[1]["outputs"] == {"Priority Score": None, "Email Valid": "-"}
+    assert json.loads(json.dumps(leads)) == leads
+    assert all(len(lead["input_hash"]) > 0 for lead in leads)
+
+
+def test_a_sheet_that_was_not_enriched_has_no_outputs():
+    leads = dataframe_to_leads(sheet(), email_col="Email", company_col="Company", input_columns=INPUTS)
+
+    assert [(lead["status"], lead["outputs"]) for lead in leads] == [(None, None), (None, None)]
+
+
+def test_stored_input_hashes_are_kept():
+    df = sheet().assign(**{INPUT_HASH: ["h0", "h1", "h2"]})
+    leads = dataframe_to_leads(df, email_col="Email", company_col="Company", input_columns=INPUTS)
+
+    assert [lead["input_hash"] for lead in leads] == ["h0", "h2"]
+
+
+def test_leads_round_trip_through_the_staging_columns():
+    leads = dataframe_to_leads(sheet(), email_col="Email", company_col="Company", input_columns=INPUTS,
+                               output_columns=OUTPUTS)
+    copied = {}
+
+    class Driver:
+        @contextlib.asynccontextmanager
+        async def transaction(self):
+            yield
+
+        async def execute(self, query, *args):
+            if query.lstrip().startswith("CREATE TEMP TABLE"):
+                copied["table"] = re.findall(r"(\w+) (?:integer|text|jsonb)", query)
+            return f"INSERT 0 {len(copied.get('records', []))}"
+
+        async def copy_records_to_table(self, table, records, columns):
+            copied.update(records=records, columns=columns)
+
+    class Connection:
+        async def get_raw_connection(self):
+            return type("RawConnection", (), {"driver_connection": Driver()})()
+
+    class Session:
+        async def connection(self):
+            return Connection()
+
+        async def commit(self):
+            pass
+
+    assert asyncio.run(copy_leads(Session(), "project", leads)) == 2
+    assert copied["columns"] == copied["table"] == STAGING_COLUMNS
+    rows = [dict(zip(STAGING_COLUMNS, record)) for record in copied["records"]]
+    assert [row["seq"] for row in rows] == [0, 1]
+    assert [row["email"] for row in rows] == ["ann@x.com", "bob@y.com"]
+    assert rows[1]["company"] is None and rows[1]["status"] == "unbatchable"
+    assert json.loads(rows[1]["inputs"])["Employees"] is None
+
+    stored = [type("Lead", (), {"inputs": json.loads(row["inputs"]), "outputs": json.loads(row["outputs"]),
+                                "input_hash": row["input_hash"]}) for row in rows]
+    assert leads_to_dataframe(stored).columns.tolist() == INPUTS + OUTPUTS + [INPUT_HASH]
@@ -0,0 +1,152 @@
+import asyncio
+import itertools
+import json
+
+import pytest
+from langchain_core.messages import AIMessage
+
+import utility.priority_score as priority_score
+from utility.priority_score import get_priority_scores_batch, get_priority_scores_cached
+from utility.rate_limiter import OPENAI
+from utility.retry import RetryPolicy
+
+# Every test scores for its own campaign, so none finds another's results in the memo or cache
+_campaigns = (f"campaign {n}" for n in itertools.count())
+
+
+def lead(title="director", company_size=120):
+    return {"job_title": title, "seniority": "director", "department": "sales", "industry": "software",
+            "company_size": company_size}
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """Stubbed get_priority_scores_batch, recording the leads of every call"""
+    calls = []
+
+    async def get_priority_scores_batch(leads, desc, openai_api_key, rules=None):
+        calls.append(leads)
+        await asyncio.sleep(0.01)
+        return [({"priority_score": 70, "reason": lead["job_title"]}, "") for lead in leads]
+
+    monkeypatch.setattr(priority_score, "get_priority_scores_batch", get_priority_scores_batch)
+    return calls
+
+
+def test_identical_profiles_are_scored_once(llm):
+    results, stats = asyncio.run(get_priority_scores_cached([lead()] * 200, desc=next(_campaigns), openai_api_key="key"))
+
+    assert len(llm) == 1 and len(llm[0]) == 1
+    assert results == [({"priority_score": 70, "reason": "director"}, "")] * 200
+    assert stats["scored"] == 1 and stats["duplicates"] == 199
+
+
+def test_concurrent_calls_share_profiles_and_batches(llm):
+    desc = next(_campaigns)
+    titles = [f"title {n}" for n in range(8)]
+
+    async def sub_batches():
+        # Like the concurrent CHECKPOINT_ROWS sub-batches of one chunk
+        return await asyncio.gather(*(
+            get_priority_scores_cached([lead(title) for title in titles[start:start + 4]] + [lead()] * 50,
+                                       desc=desc, openai_api_key="key")
+            for start in (0, 4)
+        ))
+
+    (first, first_stats), (second, second_stats) = asyncio.run(sub_batches())
+
+    assert len(llm) == 1
+    assert sorted(scored["job_title"] for scored in llm[0]) == sorted(titles + ["director"])
+    assert first_stats["scored"] + second_stats["scored"] == 9
+    assert second_stats["shared"] == 1
+    assert first[-1] == second[-1] == ({"priority_score": 70, "reason": "director"}, "")
+
+
+def test_batches_are_capped(llm, monkeypatch):
+    monkeypatch.setattr(priority_score, "PRIORITY_BATCH_SIZE", 4)
+    leads = [lead(f"title {n}") for n in range(10)]
+
+    results, _ = asyncio.run(get_priority_scores_cached(leads, desc=next(_campaigns), openai_api_key="key"))
+
+    assert [len(batch) for batch in llm] == [4, 4, 2]
+    assert [result["reason"] for result, _ in results] == [f"title {n}" for n in range(10)]
+
+
+def test_errors_are_not_kept(monkeypatch):
+    calls = []
+
+    async def failing_batch(leads, desc, openai_api_key, rules=None):
+        calls.append(leads)
+        return [({"priority_score": 0, "reason": ""}, "timeout") for _ in leads]
+
+    monkeypatch.setattr(priority_score, "get_priority_scores_batch", failing_batch)
+    desc = next(_campaigns)
+    for _ in range(2):
+        results, _ = asyncio.run(get_priority_scores_cached([lead()], desc=desc, openai_api_key="key"))
+        assert results[0][1] == "timeout"
+
+    assert len(calls) == 2
+    assert not priority_score._in_flight
+
+
+@pytest.fixture
+def chat(monkeypatch):
+    """Stubbed ChatOpenAI answering the batch prompt with `reply`, and a recorded per-lead fallback"""
+    state = {"reply": "", "prompts": [], "single": []}
+
+    def chat_open_ai(**kwargs):
+        def answer(prompt_value):
+            state["prompts"].append(prompt_value.to_string())
+            return AIMessage(content=state["reply"])
+        return answer
+
+    async def get_priority_score(job_title, desc, openai_api_key, rules=None, **profile):
+        state["single"].append(job_title)
+        return {"priority_score": 1, "reason": f"single {job_title}"}, ""
+
+    monkeypatch.setattr(priority_score, "ChatOpenAI", chat_open_ai)
+    monkeypatch.setattr(priority_score, "get_priority_score", get_priority_score)
+    monkeypatch.setattr(priority_score, "get_retry_policy", lambda vendor: RetryPolicy(OPENAI, 1, 0, 0))
+    return state
+
+
+def score_batch(titles):
+    return asyncio.run(get_priority_scores_batch([lead(title) for title in titles], desc="campaign",
+                                                 openai_api_key=next(_campaigns)))
+
+
+def reply(*scores):
+    return json.dumps({"scores": [{"index": index, "priority_score": score, "reason": f"batch {index}"}
+                                  for index, score in scores]})
+
+
+def test_batch_scores_map_to_their_leads_by_index(chat):
+    chat["reply"] = reply((2, 30), (0, 90), (1, 60))
+
+    results = score_batch(["ceo", "director", "intern"])
+
+    assert [result["priority_score"] for result, _ in results] == [90, 60, 30]
+    assert results[0] == ({"priority_score": 90, "reason": "batch 0"}, "")
+    assert "Lead 2:\nJob Title: intern" in chat["prompts"][0]
+    assert chat["single"] == []
+
+
+def test_leads_the_reply_does_not_cover_are_scored_one_by_one(chat):
+    # Index 1 is missing, 2 is given twice, 7 is out of range and the last item is not a score
+    chat["reply"] = json.dumps({"scores": json.loads(reply((0, 90), (2, 30), (2, 40), (7, 50)))["scores"]
+                                          + [{"index": 3, "priority_score": "high"}]})
+
+    results = score_batch(["ceo", "director", "intern", "vp"])
+
+    assert sorted(chat["single"]) == ["director", "intern", "vp"]
+    assert results[0] == ({"priority_score": 90, "reason": "batch 0"}, "")
+    assert [result["reason"] for result, _ in results[1:]] == ["single director", "single intern", "single vp"]
+
+
+def test_an_unparsable_reply_falls_back_to_single_scores(chat):
+    chat["reply"] = "Sorry, I can't score these leads."
+
+    results = score_batch(["ceo", "director"])
+
+    assert chat["single"] == ["ceo", "director"]
+    assert [result["reason"] for result, _ in results] == ["single ceo", "single director"]
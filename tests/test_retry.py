@@ -0,0 +1,119 @@
+import asyncio
+import itertools
+import types
+
+import pytest
+
+from utility.circuit_breaker import CircuitOpenError, get_circuit_breaker
+from utility.rate_limiter import OPENAI
+from utility.retry import RETRY_AFTER_MAX, RetryableError, RetryPolicy, is_retryable, status_code_of
+
+# Every test gets its own key, so none shares a breaker or rate limiter with another
+_keys = (f"test-key-{n}" for n in itertools.count())
+
+
+class VendorError(Exception):
+    def __init__(self, status_code=None, headers=None):
+        super().__init__(f"vendor replied {status_code}")
+        self.status_code = status_code
+        if headers is not None:
+            self.response = types.SimpleNamespace(status_code=status_code, headers=headers)
+
+
+def flaky(*outcomes):
+    """Coroutine function raising or returning the outcomes in turn, counting its calls"""
+    outcomes = list(outcomes)
+
+    async def call():
+        call.count += 1
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    call.count = 0
+    return call
+
+
+@pytest.fixture
+def policy():
+    return RetryPolicy(OPENAI, attempts=3, base_delay=0, max_delay=0)
+
+
+def test_status_codes_from_attributes_responses_and_messages():
+    assert status_code_of(VendorError(429)) == 429
+    assert status_code_of(types.SimpleNamespace(response=types.SimpleNamespace(status_code=503))) == 503
+    assert status_code_of(Exception("Request failed with status code: 404")) == 404
+    assert status_code_of(ValueError("bad json")) is None
+
+
+def test_only_throttling_timeouts_and_server_errors_are_retryable():
+    assert is_retryable(VendorError(429))
+    assert is_retryable(VendorError(503))
+    assert is_retryable(RetryableError("incomplete reply"))
+    assert not is_retryable(VendorError(400))
+    assert not is_retryable(VendorError(401))
+
+
+def test_delay_backs_off_within_the_cap():
+    policy = RetryPolicy(OPENAI, attempts=10, base_delay=1, max_delay=4)
+    for attempt in range(1, 10):
+        assert 0 <= policy.delay(attempt, VendorError(503)) <= min(4, 2 ** (attempt - 1))
+    assert policy.delay(10, VendorError(503)) is None
+    assert policy.delay(1, VendorError(400)) is None
+
+
+def test_delay_honours_retry_after():
+    policy = RetryPolicy(OPENAI, attempts=3, base_delay=1, max_delay=4)
+
+    assert 7 <= policy.delay(1, VendorError(429, headers={"retry-after": "7"})) <= 8
+    assert policy.delay(1, VendorError(429, headers={"retry-after": str(RETRY_AFTER_MAX + 1)})) is None
+
+
+def test_call_retries_until_success(policy):
+    function = flaky(VendorError(429), VendorError(502), "ok")
+
+    assert asyncio.run(policy.call(function, api_key=next(_keys))) == "ok"
+    assert function.count == 3
+
+
+def test_call_raises_the_last_error_once_attempts_run_out(policy):
+    function = flaky(VendorError(500), VendorError(500), VendorError(503))
+
+    with pytest.raises(VendorError) as error:
+        asyncio.run(policy.call(function, api_key=next(_keys)))
+    assert error.value.status_code == 503
+    assert function.count == 3
+
+
+def test_call_does_not_retry_a_rejected_request(policy):
+    function = flaky(VendorError(400), "never")
+
+    with pytest.raises(VendorError):
+        asyncio.run(policy.call(function, api_key=next(_keys)))
+    assert function.count == 1
+
+
+def test_call_fails_fast_while_the_breaker_is_open(policy):
+    api_key = next(_keys)
+    breaker = get_circuit_breaker(OPENAI, api_key)
+    for _ in range(breaker.min_calls):
+        breaker.record(failed=True)
+    function = flaky("never")
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(policy.call(function, api_key=api_key))
+    assert function.count == 0
+
+
+def test_call_sync_retries_like_call(policy):
+    outcomes = [VendorError(503), "ok"]
+
+    def function():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert policy.call_sync(function, api_key=next(_keys)) == "ok"
+    assert outcomes == []
@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+from utility.batching import SIZE_RULES
+from utility.role_classifier import TermClassifier, get_classifier, get_rule_classifiers
+
+
+def test_label_finds_every_contained_term():
+    classifier = TermClassifier(["vp", "vice president", "president", "head of"])
+
+    assert classifier.label("vice president of sales") == {"vice president", "president"}
+    assert classifier.label("head of growth, vp marketing") == {"head of", "vp"}
+    assert classifier.label("account executive") == frozenset()
+
+
+def test_label_matches_substrings_like_the_original_rules():
+    classifier = TermClassifier(["ceo", "founder", "co-founder"])
+
+    # A term inside a longer term at the same position still counts
+    assert classifier.label("co-founder & ceo") == {"co-founder", "founder", "ceo"}
+
+
+def test_label_column_and_matches():
+    classifier = TermClassifier(["director", "manager", "intern"])
+    titles = pd.Series(["Sales Director", None, "intern", "sales director", "Project Manager"])
+    labels = classifier.label_column(titles)
+
+    assert len(labels) == 5
+    assert labels.matches(["director"]).tolist() == [True, False, False, True, False]
+    assert labels.matches(["Manager", "intern"]).tolist() == [False, False, True, False, True]
+    assert not labels.matches([]).any()
+
+
+def test_matches_rejects_terms_outside_the_vocabulary():
+    labels = TermClassifier(["director"]).label_column(pd.Series(["director"]))
+
+    with pytest.raises(ValueError):
+        labels.matches(["manager"])
+
+
+def test_empty_vocabulary_labels_nothing():
+    classifier = TermClassifier([])
+
+    assert classifier.label("anything") == frozenset()
+    assert not classifier.label_column(pd.Series(["a", "b"])).matches([]).any()
+
+
+def test_classifiers_are_shared_per_vocabulary():
+    assert get_classifier(["VP", "director"]) is get_classifier(["director", "vp"])
+
+    roles, departments = get_rule_classifiers(SIZE_RULES)
+    assert "vice president" in roles.terms
+    assert "human resources" in departments.terms
+
+
+def test_agrees_with_a_plain_substring_search():
+    terms = ["ceo", "founder", "co-founder", "vp", "vice president", "director", "senior director", "head of"]
+    classifier = TermClassifier(terms)
+    titles = ["co-founder and ceo", "svp", "senior director, head of sales", "vice-president", "directorate", ""]
+
+    for title in titles:
+        assert classifier.label(title) == {term for term in terms if term in title}, title
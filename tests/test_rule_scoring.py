@@ -0,0 +1,67 @@
+import types
+
+import pandas as pd
+
+from utility.batching import get_project_rule_tables
+from utility.priority_score import scoring_rules
+from utility.rule_scoring import ABM_SCORE, EXCLUDED_SCORE, PRIMARY_ROLE_SCORE, pre_score_leads
+
+COLUMNS = dict(job_title_col="Title", department_col="Department", employee_count_col="Employees")
+
+
+def leads(rows):
+    return pd.DataFrame(rows, columns=["Title", "Seniority", "Department", "Employees"])
+
+
+def test_default_rules():
+    scores = pre_score_leads(leads([
+        ("CEO", "", "", 20),
+        ("Intern", "", "", 20),
+        ("Sales Director", "", "hr", 150),
+        ("Director", "", "sales", 150),
+        ("Account Executive", "", "", 20),
+        ("VP Sales", "", "", 5000),
+        ("CEO", "", "", None),
+    ]), **COLUMNS)
+
+    assert scores["score"].tolist()[:4] == [PRIMARY_ROLE_SCORE, EXCLUDED_SCORE, EXCLUDED_SCORE, PRIMARY_ROLE_SCORE]
+    assert scores["score"][5] == ABM_SCORE
+    assert "Company size 1000+ (5000 employees)" in scores["reason"][5]
+    assert scores["ambiguous"].tolist() == [False, False, False, False, True, False, True]
+
+
+def test_project_rules_are_the_batchers():
+    project = types.SimpleNamespace(id="scoring", company_size_large_max=5000, company_size_enterprise_min=5001,
+                                    seniority_tier_1=["director"], seniority_tier_2=[], seniority_tier_3=[],
+                                    seniority_excluded=["entry"])
+    tables = get_project_rule_tables(project)
+    scores = pre_score_leads(leads([
+        ("VP Sales", "vp", "sales", 5000),
+        ("Account Executive", "director", "sales", 20),
+        ("Account Executive", "entry", "sales", 20),
+        ("Account Executive", "senior", "sales", 20),
+        ("CEO", "c suite", "", 100000),
+    ]), seniority_col="Seniority", rule_tables=tables, **COLUMNS)
+
+    # 5000 employees is a large company for this project, not an ABM account
+    assert scores["score"][0] != ABM_SCORE
+    assert scores["score"][1] == PRIMARY_ROLE_SCORE
+    assert "Seniority 'director' is a primary seniority" in scores["reason"][1]
+    assert scores["score"][2] == EXCLUDED_SCORE
+    assert scores["ambiguous"][3]
+    # Enterprise companies are a segment of their own (with the largest default rule's roles), no lead is too large
+    assert scores["reason"][4] == "Job title 'ceo' is an excluded role for Enterprise Companies (5001+)"
+
+
+def test_large_leads_with_project_settings_follow_one_abm_policy():
+    project = types.SimpleNamespace(id="enterprise", company_size_large_max=1000, company_size_enterprise_min=1001)
+    tables = get_project_rule_tables(project)
+    scores = pre_score_leads(leads([("Sales Director", "", "sales", 5000)]), rule_tables=tables, **COLUMNS)
+
+    assert scores["score"][0] == PRIMARY_ROLE_SCORE
+    assert "Enterprise Companies (1001+)" in scores["reason"][0]
+    # The LLM is given the same segments: the enterprise one, and no ABM cut-off the rules don't apply
+    prompt = scoring_rules(tables)
+    assert "Company Size 1001+:" in prompt
+    assert "ABM" not in prompt
+    assert "Company Size 1000+:\n- Handle via ABM strategy" in scoring_rules()
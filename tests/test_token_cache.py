@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from jose import jwt
+
+import main
+import utility.token_cache as token_cache
+from utility.token_cache import VerifiedTokenCache
+
+SECRET = "test-secret"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time() of the token cache"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(token_cache.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def tokens(monkeypatch):
+    """verify_token with a known secret and an empty cache, counting the signature checks"""
+    cache = VerifiedTokenCache(max_size=10)
+    decoded = []
+    jwt_decode = jwt.decode
+
+    def decode(token, key, algorithms):
+        decoded.append(token)
+        return jwt_decode(token, key, algorithms=algorithms)
+
+    monkeypatch.setattr(main, "JWT_SECRET", SECRET)
+    monkeypatch.setattr(main, "verified_tokens", cache)
+    monkeypatch.setattr(main.jwt, "decode", decode)
+    return cache, decoded
+
+
+def token(secret=SECRET, **claims):
+    claims = {"sub": "ann@x.com", "uuid": "u-1", "exp": int(time.time()) + 3600, **claims}
+    return jwt.encode(claims, secret, algorithm=main.JWT_ALGORITHM)
+
+
+def verify(jwt_token):
+    return asyncio.run(main.verify_token(HTTPAuthorizationCredentials(scheme="Bearer", credentials=jwt_token)))
+
+
+def test_entries_expire_with_the_token(clock):
+    cache = VerifiedTokenCache(max_size=10)
+    cache.set("t", {"email": "ann@x.com"}, expires_at=clock[0] + 60)
+
+    clock[0] += 59
+    assert cache.get("t") == {"email": "ann@x.com"}
+    clock[0] += 1
+    assert cache.get("t") is None
+
+
+def test_least_recently_used_tokens_are_dropped(clock):
+    cache = VerifiedTokenCache(max_size=2)
+    cache.set("a", {"n": 1}, expires_at=clock[0] + 60)
+    cache.set("b", {"n": 2}, expires_at=clock[0] + 60)
+    # Reading "a" makes "b" the one dropped for "c"
+    cache.get("a")
+    cache.set("c", {"n": 3}, expires_at=clock[0] + 60)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"n": 1}
+    assert cache.get("c") == {"n": 3}
+
+
+def test_verified_tokens_skip_the_signature_check(tokens):
+    cache, decoded = tokens
+    valid = token()
+
+    assert verify(valid) == {"email": "ann@x.com", "uuid": "u-1"}
+    assert verify(valid) == {"email": "ann@x.com", "uuid": "u-1"}
+    assert decoded == [valid]
+
+
+def test_failed_verifications_are_not_cached(tokens):
+    cache, decoded = tokens
+    for rejected in (token(secret="other-secret"), token(uuid=None)):
+        for _ in range(2):
+            with pytest.raises(HTTPException) as error:
+                verify(rejected)
+            assert error.value.status_code == 401
+        assert cache.get(rejected) is None
+
+    assert len(decoded) == 4
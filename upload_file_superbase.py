@@ -1,66 +1,154 @@
 import asyncio
 
 import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment, PatternFill
-from openpyxl import load_workbook
+from openpyxl.utils import get_column_letter
 from io import BytesIO
 import uuid
-import httpx
 import os
 from dotenv import load_dotenv
+
+from utility.http_client import get_http_client
+
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SERVICE_ROLE")
 BUCKET_NAME = "exports"
+# Per-request timeout (seconds) of the storage upload, large exports take a while to send
+SUPABASE_UPLOAD_TIMEOUT = float(os.getenv("SUPABASE_UPLOAD_TIMEOUT", 300))
 
-async def upload_df_to_supabase_async(df: pd.DataFrame, file_prefix: str = "report") -> str:
-    # Step 1: Save dataframe to Excel in memory
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Sheet1")
-    output.seek(0)
+# Rows converted to cell values at a time while writing an XLSX file
+XLSX_WRITE_CHUNK_ROWS = 10000
+
+# Export formats and their content types
+XLSX = "xlsx"
+CSV_GZ = "csv.gz"
+PARQUET = "parquet"
+CONTENT_TYPES = {
+    XLSX: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    CSV_GZ: "application/gzip",
+    PARQUET: "application/vnd.apache.parquet",
+}
+
+def dataframe_to_xlsx(df: pd.DataFrame) -> bytes:
+    """
+    Write a DataFrame to a styled XLSX file in a single streaming pass
 
-    # Step 2: Beautify the Excel file
-    wb = load_workbook(output)
-    ws = wb.active
+    The workbook is in write-only mode, so rows go straight to the file instead of being kept
+    as cell objects. The header is styled as it is written and the column widths come from the
+    string lengths of each column.
+
+    Args:
+        df (pd.DataFrame): Sheet to export
+
+    Returns:
+        bytes: XLSX file
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+
+    # Column widths have to be set before any row is written
+    for i, column in enumerate(df.columns, start=1):
+        values = df[column]
+        lengths = values.where(values.notna(), "").astype(str).str.len()
+        max_length = max(len(str(column)), int(lengths.max()) if len(lengths) else 0)
+        ws.column_dimensions[get_column_letter(i)].width = max_length + 5
 
     header_fill = PatternFill(start_color="1E90FF", end_color="1E90FF", fill_type="solid")
     header_font = Font(color="FFFFFF", bold=True)
     center_align = Alignment(horizontal="center", vertical="center")
 
-    for col in ws.iter_cols(min_row=1, max_row=1):
-        for cell in col:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = center_align
+    header = []
+    for column in df.columns:
+        cell = WriteOnlyCell(ws, value=str(column))
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = center_align
+        header.append(cell)
+    ws.append(header)
+
+    # Missing values are left as empty cells
+    for start in range(0, len(df), XLSX_WRITE_CHUNK_ROWS):
+        rows = df.iloc[start:start + XLSX_WRITE_CHUNK_ROWS]
+        for row in rows.astype(object).where(rows.notna(), None).itertuples(index=False, name=None):
+            ws.append(row)
+
+    output = BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+def dataframe_to_csv_gz(df: pd.DataFrame) -> bytes:
+    """Write a DataFrame to a gzip-compressed CSV file"""
+    output = BytesIO()
+    # Level 3 is close to the default level's size at well under its cost; mtime=0 keeps identical data byte-identical
+    df.to_csv(output, index=False, encoding="utf-8", compression={"method": "gzip", "compresslevel": 3, "mtime": 0})
+    return output.getvalue()
+
+def dataframe_to_parquet(df: pd.DataFrame) -> bytes:
+    """
+    Write a DataFrame to a Parquet file
+
+    Columns mixing numbers and text (e.g. a score that is "-" for skipped rows) are stored as
+    numbers when every value converts, and as strings otherwise.
+    """
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        if values.dtype == object:
+            numbers = pd.to_numeric(values, errors="coerce")
+            values = numbers if numbers.notna().sum() == values.notna().sum() else values.astype("string")
+        columns[str(column)] = values
+    output = BytesIO()
+    pd.DataFrame(columns).to_parquet(output, engine="pyarrow", index=False, compression="zstd")
+    return output.getvalue()
+
+# Writer of each export format
+WRITERS = {
+    XLSX: dataframe_to_xlsx,
+    CSV_GZ: dataframe_to_csv_gz,
+    PARQUET: dataframe_to_parquet,
+}
+
+async def upload_df_to_supabase_async(df: pd.DataFrame, file_prefix: str = "report", file_format: str = XLSX) -> str:
+    """
+    Export a DataFrame and upload it to the Supabase exports bucket
+
+    Args:
+        df (pd.DataFrame): Sheet to export
+        file_prefix (str): Start of the file name
+        file_format (str): "xlsx", "csv.gz" or "parquet"
 
-    for column_cells in ws.columns:
-        max_length = max(len(str(cell.value or "")) for cell in column_cells)
-        ws.column_dimensions[column_cells[0].column_letter].width = max_length + 5
+    Returns:
+        str: Public URL of the file
+    """
+    if file_format not in WRITERS:
+        raise ValueError(f"Unsupported export format: {file_format}")
 
-    beautified = BytesIO()
-    wb.save(beautified)
-    beautified.seek(0)
+    # Step 1-2: Write the file in memory, off the event loop
+    content = await asyncio.get_running_loop().run_in_executor(None, WRITERS[file_format], df)
 
     # Step 3: Generate filename
-    filename = f"{file_prefix}_{uuid.uuid4()}.xlsx"
+    filename = f"{file_prefix}_{uuid.uuid4()}.{file_format}"
     file_path = f"{BUCKET_NAME}/{filename}"
 
-    # Step 4: Upload to Supabase Storage using HTTPX
+    # Step 4: Upload to Supabase Storage on the shared client
     headers = {
         "apikey": SUPABASE_KEY,
         "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        "Content-Type": CONTENT_TYPES[file_format]
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{SUPABASE_URL}/storage/v1/object/{file_path}",
-            headers=headers,
-            content=beautified.read()
-        )
-        response.raise_for_status()  # Raise error if upload fails
+    client = get_http_client(SUPABASE_URL)
+    response = await client.post(
+        f"/storage/v1/object/{file_path}",
+        headers=headers,
+        content=content,
+        timeout=SUPABASE_UPLOAD_TIMEOUT
+    )
+    response.raise_for_status()  # Raise error if upload fails
 
     # Step 5: Generate public URL
     public_url = f"{SUPABASE_URL}/storage/v1/object/public/{file_path}"
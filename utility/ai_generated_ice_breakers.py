@@ -3,6 +3,9 @@ from langchain.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, H
 from langchain.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
 
+from utility.rate_limiter import OPENAI
+from utility.retry import get_retry_policy, RetryableError
+
 # Define Pydantic Output Schema
 class ColdLiners(BaseModel):
     option1: str = Field(description="First variation focusing on scale/operations")
@@ -81,29 +84,25 @@ prompt = ChatPromptTemplate.from_messages([
 
 # Final chain function
 async def generate_ice_breakers_chain(website_summary, linkedin_summary, openai_api_key):
-    max_attempts = 3
-    for attempt in range(1, max_attempts + 1):
-        print(f"Generating cold liners...Attempt {attempt}...")
-        try:
-            llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0.7, openai_api_key=openai_api_key)
-            chain = prompt | llm | parser
-            result = chain.invoke({
-                "website_summary": website_summary,
-                "linkedin_summary": linkedin_summary,
-                "format_instructions": parser.get_format_instructions()
-            })
-            if result:
-                response=result.model_dump()
-                return (f"1.{response['option1']} \n 2.{response['option2']} \n 3.{response['option3']}",
-                        f"{response[response['selected']]}",
-                        f"{response['reason']}",
-                        "")
-            else:
-                print("Empty result received. Retrying...")
-
-        except Exception as e:
-            print(f"Attempt {attempt} failed: {e}")
-            if attempt == max_attempts:
-                return "","","",f"Unable to get ice breakers:{e}"
-
-    return "","","","Internal Server Error"
\ No newline at end of file
+    # Retries are left to the shared policy rather than the OpenAI client
+    llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0.7, openai_api_key=openai_api_key, max_retries=0)
+    chain = prompt | llm | parser
+
+    async def generate():
+        result = await chain.ainvoke({
+            "website_summary": website_summary,
+            "linkedin_summary": linkedin_summary,
+            "format_instructions": parser.get_format_instructions()
+        })
+        if not result:
+            raise RetryableError("Empty result received")
+        response=result.model_dump()
+        return (f"1.{response['option1']} \n 2.{response['option2']} \n 3.{response['option3']}",
+                f"{response[response['selected']]}",
+                f"{response['reason']}",
+                "")
+
+    try:
+        return await get_retry_policy(OPENAI).call(generate, "Generating cold liners", api_key=openai_api_key)
+    except Exception as e:
+        return "","","",f"Unable to get ice breakers:{e}"
\ No newline at end of file
@@ -3,6 +3,68 @@ import numpy as np
 from datetime import datetime, timedelta, date
 import re
 
+from utility.targeting_rules import RuleTables, get_project_rule_tables as _get_project_rule_tables
+
+# Columns written by cold_email_batcher_advanced
+BATCH_COLUMNS = ["Status", "Batch number", "Send Date", "Batch Name", "Reason"]
+
+# Company size-based targeting rules, shared with the rule-based priority pre-scoring
+SIZE_RULES = [
+    {
+        "name": "Small Companies (0-50)",
+        "min": 0, "max": 50, "limit": 4,
+        "primary_roles": ["ceo", "founder", "co-founder", "owner", "president"],
+        "secondary_roles": ["director", "head of", "vp", "vice president"],
+        "exclusion_roles": ["intern", "assistant", "coordinator", "analyst"],
+        "target_departments": None,  # Any department
+        "exclusion_departments": None
+    },
+    {
+        "name": "Small-Medium Companies (51-100)",
+        "min": 51, "max": 100, "limit": 6,
+        "primary_roles": ["ceo", "founder", "co-founder", "vp", "vice president"],
+        "secondary_roles": ["director", "head of", "senior manager", "manager"],
+        "exclusion_roles": ["intern", "assistant", "analyst", "coordinator"],
+        "target_departments": None,
+        "exclusion_departments": None
+    },
+    {
+        "name": "Medium Companies (101-200)",
+        "min": 101, "max": 200, "limit": 8,
+        "primary_roles": ["director", "vp", "vice president", "head of"],
+        "secondary_roles": ["senior manager", "manager", "senior director"],
+        "exclusion_roles": ["ceo", "founder", "analyst", "coordinator"],
+        "target_departments": ["sales", "marketing", "operations", "growth", "business development"],
+        "exclusion_departments": ["hr", "human resources", "legal", "finance", "accounting"]
+    },
+    {
+        "name": "Large Companies (201-500)",
+        "min": 201, "max": 500, "limit": 10,
+        "primary_roles": ["director", "head of", "senior director", "vp", "vice president"],
+        "secondary_roles": ["senior manager", "manager"],
+        "exclusion_roles": ["ceo", "president", "analyst", "coordinator"],
+        "target_departments": ["sales", "marketing", "operations", "growth", "business development"],
+        "exclusion_departments": ["hr", "human resources", "legal", "finance", "accounting"]
+    },
+    {
+        "name": "Very Large Companies (501-1000)",
+        "min": 501, "max": 1000, "limit": 13,
+        "primary_roles": ["senior manager", "director", "head of", "senior director"],
+        "secondary_roles": ["manager", "vp", "vice president"],
+        "exclusion_roles": ["ceo", "president", "analyst"],
+        "target_departments": ["sales", "marketing", "operations", "growth", "business development"],
+        "exclusion_departments": ["hr", "human resources", "legal", "finance", "accounting"]
+    }
+]
+
+# Tables used when the batcher is not given a project's
+DEFAULT_RULE_TABLES = RuleTables(SIZE_RULES)
+
+
+def get_project_rule_tables(project) -> RuleTables:
+    """Rule tables of a project, falling back to SIZE_RULES for the settings it leaves empty"""
+    return _get_project_rule_tables(project, default_rules=SIZE_RULES)
+
 
 def cold_email_batcher_advanced(
         df: pd.DataFrame,
@@ -15,7 +77,9 @@ def cold_email_batcher_advanced(
         mailboxes: int,
         emails_per_mailbox: int,
         batch_duration_days: int,
-        start_date: str = None
+        start_date: str = None,
+        rule_tables: RuleTables = None,
+        seniority_col: str = None
 ) -> pd.DataFrame:
     """
     Advanced cold email batching system with company size-based targeting rules.
@@ -28,10 +92,15 @@ def cold_email_batcher_advanced(
        - Large companies (201-1000): Focus on department heads in sales/marketing/operations
     3. Selects leads based on priority scoring within each company
     4. Distributes selected leads across batches based on mailbox capacity
+
+    The segments, limits and role/department lists come from `rule_tables` (a project's compiled
+    settings, see get_project_rule_tables), SIZE_RULES when it is not given. A project's seniority
+    tiers are matched against `seniority_col`, on top of the job-title roles.
     """
+    tables = DEFAULT_RULE_TABLES if rule_tables is None else rule_tables
 
-    # Create a copy to avoid modifying original dataframe
-    df = df.copy()
+    # Work on a copy with a positional index, so row positions can be used with numpy arrays
+    df = df.reset_index(drop=True)
 
     # Set start date
     start = datetime.strptime(start_date, "%Y-%m-%d") if start_date else datetime.today()
@@ -48,242 +117,161 @@ def cold_email_batcher_advanced(
     # Handle email providers
     df[email_provider_col] = df[email_provider_col].astype(str).str.lower().fillna("unknown")
     df["Reason"] = ""
-    df.loc[df[email_provider_col].isin(["no_provider", "unknown", "nan"]), "Status"] = "unbatchable"
-    df.loc[df[email_provider_col].isin(["no_provider", "unknown", "nan"]), "Reason"] = "No valid email provider"
-
-    # Company size-based targeting rules
-    size_rules = [
-        {
-            "name": "Small Companies (0-50)",
-            "min": 0, "max": 50, "limit": 4,
-            "primary_roles": ["ceo", "founder", "co-founder", "owner", "president"],
-            "secondary_roles": ["director", "head of", "vp", "vice president"],
-            "exclusion_roles": ["intern", "assistant", "coordinator", "analyst"],
-            "target_departments": None,  # Any department
-            "exclusion_departments": None
-        },
-        {
-            "name": "Small-Medium Companies (51-100)",
-            "min": 51, "max": 100, "limit": 6,
-            "primary_roles": ["ceo", "founder", "co-founder", "vp", "vice president"],
-            "secondary_roles": ["director", "head of", "senior manager", "manager"],
-            "exclusion_roles": ["intern", "assistant", "analyst", "coordinator"],
-            "target_departments": None,
-            "exclusion_departments": None
-        },
-        {
-            "name": "Medium Companies (101-200)",
-            "min": 101, "max": 200, "limit": 8,
-            "primary_roles": ["director", "vp", "vice president", "head of"],
-            "secondary_roles": ["senior manager", "manager", "senior director"],
-            "exclusion_roles": ["ceo", "founder", "analyst", "coordinator"],
-            "target_departments": ["sales", "marketing", "operations", "growth", "business development"],
-            "exclusion_departments": ["hr", "human resources", "legal", "finance", "accounting"]
-        },
-        {
-            "name": "Large Companies (201-500)",
-            "min": 201, "max": 500, "limit": 10,
-            "primary_roles": ["director", "head of", "senior director", "vp", "vice president"],
-            "secondary_roles": ["senior manager", "manager"],
-            "exclusion_roles": ["ceo", "president", "analyst", "coordinator"],
-            "target_departments": ["sales", "marketing", "operations", "growth", "business development"],
-            "exclusion_departments": ["hr", "human resources", "legal", "finance", "accounting"]
-        },
-        {
-            "name": "Very Large Companies (501-1000)",
-            "min": 501, "max": 1000, "limit": 13,
-            "primary_roles": ["senior manager", "director", "head of", "senior director"],
-            "secondary_roles": ["manager", "vp", "vice president"],
-            "exclusion_roles": ["ceo", "president", "analyst"],
-            "target_departments": ["sales", "marketing", "operations", "growth", "business development"],
-            "exclusion_departments": ["hr", "human resources", "legal", "finance", "accounting"]
-        }
-    ]
-
-    # Get company employee counts (use max in case of duplicates)
-    company_emp = df.groupby(company_col)[employee_count_col].max().reset_index()
-
-    def get_rule(emp_count):
-        """Get the appropriate rule based on employee count"""
-        if pd.isna(emp_count) or emp_count > 1000:
-            return None
-        for rule in size_rules:
-            if rule["min"] <= emp_count <= rule["max"]:
-                return rule
-        return None
-
-    # Apply rules to companies
-    company_emp["rule"] = company_emp[employee_count_col].apply(get_rule)
-    company_emp["limit"] = company_emp["rule"].apply(lambda r: r["limit"] if r else 0)
-
-    # Merge rules back to main dataframe
-    df = df.merge(company_emp[[company_col, "rule", "limit"]], on=company_col, how="left")
+    status = np.full(len(df), "ready", dtype=object)
+    reason = np.full(len(df), "", dtype=object)
+    no_provider = df[email_provider_col].isin(["no_provider", "unknown", "nan"]).to_numpy()
+    status[no_provider] = "unbatchable"
+    reason[no_provider] = "No valid email provider"
+
+    # Get company employee counts (use max in case of duplicates) and the rule of each row's company
+    company_emp = df.groupby(company_col)[employee_count_col].transform("max")
+    rule_id = tables.segment_of(company_emp.to_numpy())
+    has_rule = rule_id >= 0
+    limit = tables.limits[rule_id]
+    rule_name = tables.names[rule_id]
 
     # Mark unbatchable companies (no rule applies)
-    df.loc[df["rule"].isna(), "Status"] = "unbatchable"
-    df.loc[df["rule"].isna(), "Reason"] = "Company size not supported (>1000 employees or invalid employee count)"
+    status[~has_rule] = "unbatchable"
+    if np.isfinite(tables.max_supported):
+        reason[~has_rule] = f"Company size not supported (>{tables.max_supported:g} employees or invalid employee count)"
+    else:
+        reason[~has_rule] = "Company size not supported (invalid employee count)"
 
     # Normalize text columns for matching
     df[job_title_col] = df[job_title_col].astype(str).str.lower().fillna("")
     df[department_col] = df[department_col].astype(str).str.lower().fillna("")
-
-    # Filter to batchable leads
-    batchable = df[df["Status"] == "ready"].copy()
-
-    def matches_role(title, role_list):
-        """Check if job title matches any role in the list"""
-        if not role_list:
-            return False
-        title = str(title).lower()
-        for role in role_list:
-            if role.lower() in title:
-                return True
-        return False
-
-    def matches_department(dept, dept_list):
-        """Check if department matches any in the list"""
-        if not dept_list:
-            return True  # If no restriction, match all
-        dept = str(dept).lower()
-        for target_dept in dept_list:
-            if target_dept.lower() in dept:
-                return True
-        return False
-
-    def is_eligible(row):
-        """Check if a lead is eligible based on the company's rules"""
-        rule = row["rule"]
-        if not rule:
-            return False, "No targeting rule for company size"
-
-        title = row[job_title_col]
-        dept = row[department_col]
-
-        # Check exclusion roles first
-        if matches_role(title, rule["exclusion_roles"]):
-            return False, f"Job title '{title}' is in exclusion roles"
-
-        # Check department restrictions
-        if rule["target_departments"] and not matches_department(dept, rule["target_departments"]):
-            return False, f"Department '{dept}' not in target departments"
-
-        if rule["exclusion_departments"] and matches_department(dept, rule["exclusion_departments"]):
-            return False, f"Department '{dept}' is in exclusion departments"
-
-        # Must match primary or secondary roles
-        if matches_role(title, rule["primary_roles"]):
-            return True, f"Matches primary role criteria (title: {title})"
-        elif matches_role(title, rule["secondary_roles"]):
-            return True, f"Matches secondary role criteria (title: {title})"
-
-        return False, f"Job title '{title}' doesn't match target roles"
-
-    # Filter eligible leads and track reasons
-    eligible_leads = []
-    ineligible_leads = []
-
-    for idx, row in batchable.iterrows():
-        is_eligible_result, reason = is_eligible(row)
-        if is_eligible_result:
-            eligible_leads.append(idx)
-            df.loc[idx, "Reason"] = reason
-        else:
-            ineligible_leads.append(idx)
-            df.loc[idx, "Status"] = "unbatchable"
-            df.loc[idx, "Reason"] = reason
-
-    batchable = batchable.loc[eligible_leads].copy()
-
-    # Select leads for each company and track selection reasons
-    selected_leads = {}  # Store by email provider
-    company_selection_stats = {}
-
-    for company, group in batchable.groupby(company_col):
-        if group.empty:
-            continue
-
-        rule = group["rule"].iloc[0]
-        limit = rule["limit"]
-
-        # Prioritize primary roles over secondary roles
-        primary = group[group.apply(lambda x: matches_role(x[job_title_col], rule["primary_roles"]), axis=1)]
-        secondary = group[group.apply(lambda x: matches_role(x[job_title_col], rule["secondary_roles"]), axis=1)]
-
-        # Combine with primary roles first
-        combined = pd.concat([primary, secondary])
-
-        # Remove duplicates based on email (assuming email is unique identifier)
-        if "Email" in combined.columns:
-            combined = combined.drop_duplicates(subset=["Email"])
-
-        # Select top leads based on priority score
-        all_sorted = combined.sort_values(by=priority_col, ascending=False)
-        top_leads = all_sorted.head(limit)
-        remaining_leads = all_sorted.iloc[limit:]
-
-        # Track selection stats
-        company_selection_stats[company] = {
-            'selected': len(top_leads),
-            'available': len(all_sorted),
-            'limit': limit
-        }
-
-        # Update reasons for selected leads
-        for idx in top_leads.index:
-            provider = df.loc[idx, email_provider_col]
-            if provider not in selected_leads:
-                selected_leads[provider] = []
-            selected_leads[provider].append(idx)
-
-            rank = list(all_sorted.index).index(idx) + 1
-            df.loc[
-                idx, "Reason"] = f"Selected (rank {rank}/{len(all_sorted)} in company, priority: {df.loc[idx, priority_col]})"
-
-        # Update reasons for leads that weren't selected due to company limit
-        for idx in remaining_leads.index:
-            df.loc[idx, "Status"] = "future"
-            df.loc[idx, "Reason"] = f"Not selected - company limit reached ({limit} leads max for {rule['name']})"
+    titles = df[job_title_col]
+    departments = df[department_col]
+
+    # Label each distinct title and department once with the compiled role/department vocabularies
+    title_labels = tables.role_classifier.label_column(titles)
+    department_labels = tables.department_classifier.label_column(departments)
+    seniorities = df[seniority_col] if seniority_col else pd.Series("", index=df.index)
+    seniority_labels = tables.seniority_classifier.label_column(seniorities)
+
+    def per_rule(field, labels, empty_default):
+        """Evaluate each segment's term list on the rows of that segment only"""
+        result = np.zeros(len(df), dtype=bool)
+        for i, rule in enumerate(tables.rules):
+            in_rule = rule_id == i
+            if not in_rule.any():
+                continue
+            if not rule.get(field):
+                result[in_rule] = empty_default
+            else:
+                result[in_rule] = labels.matches(rule[field])[in_rule]
+        return result
+
+    excluded_role = per_rule("exclusion_roles", title_labels, False)
+    excluded_seniority = per_rule("exclusion_seniorities", seniority_labels, False)
+    in_target_dept = per_rule("target_departments", department_labels, True)
+    in_excluded_dept = per_rule("exclusion_departments", department_labels, False)
+    primary_title = per_rule("primary_roles", title_labels, False)
+    primary_seniority = per_rule("primary_seniorities", seniority_labels, False)
+    secondary_title = per_rule("secondary_roles", title_labels, False)
+    secondary_seniority = per_rule("secondary_seniorities", seniority_labels, False)
+    primary = primary_title | primary_seniority
+    secondary = secondary_title | secondary_seniority
+
+    # Check exclusion roles first, then department restrictions, then primary or secondary roles
+    batchable = status == "ready"
+    title_text = titles.to_numpy(dtype=object)
+    dept_text = departments.to_numpy(dtype=object)
+    seniority_text = seniorities.fillna("").astype(str).str.lower().to_numpy(dtype=object)
+    checks = [
+        (excluded_role, False, "Job title '", title_text, "' is in exclusion roles"),
+        (excluded_seniority, False, "Seniority '", seniority_text, "' is in excluded seniorities"),
+        (~in_target_dept, False, "Department '", dept_text, "' not in target departments"),
+        (in_excluded_dept, False, "Department '", dept_text, "' is in exclusion departments"),
+        (primary_title, True, "Matches primary role criteria (title: ", title_text, ")"),
+        (primary_seniority, True, "Matches primary seniority criteria (seniority: ", seniority_text, ")"),
+        (secondary_title, True, "Matches secondary role criteria (title: ", title_text, ")"),
+        (secondary_seniority, True, "Matches secondary seniority criteria (seniority: ", seniority_text, ")"),
+    ]
+    decided = ~batchable
+    eligible = np.zeros(len(df), dtype=bool)
+    for mask, is_eligible, prefix, text, suffix in checks:
+        hit = mask & ~decided
+        eligible |= hit & is_eligible
+        reason[hit] = prefix + text[hit] + suffix
+        decided |= hit
+    no_match = ~decided
+    reason[no_match] = "Job title '" + title_text[no_match] + "' doesn't match target roles"
+    status[batchable & ~eligible] = "unbatchable"
+
+    # Candidates per company: primary role matches first, then secondary ones
+    primary_rows = np.flatnonzero(eligible & primary)
+    secondary_rows = np.flatnonzero(eligible & secondary)
+    candidates = pd.DataFrame({
+        "row": np.concatenate([primary_rows, secondary_rows]),
+        "part": np.repeat([0, 1], [len(primary_rows), len(secondary_rows)]),
+    })
+    candidates["company"] = df[company_col].to_numpy()[candidates["row"]]
+    candidates["priority"] = df[priority_col].to_numpy()[candidates["row"]]
+    candidates = candidates.sort_values(["company", "part", "row"], kind="stable")
+
+    # A lead matching both role lists is only a candidate once
+    if "Email" in df.columns:
+        candidates["email"] = df["Email"].to_numpy()[candidates["row"]]
+        candidates = candidates.drop_duplicates(subset=["company", "email"])
+    candidates = candidates.drop_duplicates(subset=["row"])
+
+    # Select top leads based on priority score (ties keep the candidate order)
+    candidates["order"] = np.arange(len(candidates))
+    candidates = candidates.sort_values(["company", "priority", "order"], ascending=[True, False, True],
+                                        kind="stable")
+    rows = candidates["row"].to_numpy()
+    rank = candidates.groupby("company", sort=False).cumcount().to_numpy() + 1
+    available = candidates.groupby("company", sort=False)["row"].transform("size").to_numpy()
+    selected = rank <= limit[rows]
+
+    top_rows = rows[selected]
+    priority_text = df[priority_col].astype(str).to_numpy(dtype=object)
+    reason[top_rows] = ("Selected (rank " + rank[selected].astype(str).astype(object) + "/"
+                        + available[selected].astype(str).astype(object) + " in company, priority: "
+                        + priority_text[top_rows] + ")")
+
+    # Leads that weren't selected due to company limit
+    remaining_rows = rows[~selected]
+    status[remaining_rows] = "future"
+    reason[remaining_rows] = ("Not selected - company limit reached (" + limit[remaining_rows].astype(str).astype(object)
+                              + " leads max for " + rule_name[remaining_rows] + ")")
 
     # Create provider-specific batches
-    for provider, lead_indices in selected_leads.items():
-        if not lead_indices:
-            continue
-
-        # Get leads for this provider and sort by priority
-        provider_leads = df.loc[lead_indices].sort_values(by=priority_col, ascending=False)
-
-        # Calculate batches for this provider
-        total_batches = int(np.ceil(len(provider_leads) / total_emails_per_day))
-
-        for i in range(total_batches):
-            batch_start = i * total_emails_per_day
-            batch_end = min((i + 1) * total_emails_per_day, len(provider_leads))
+    batch_number = np.full(len(df), None, dtype=object)
+    send_date = np.full(len(df), None, dtype=object)
+    batch_name = np.full(len(df), None, dtype=object)
+    providers = df[email_provider_col].to_numpy(dtype=object)
+    batch_dates = [(start + timedelta(days=day)).strftime("%Y-%m-%d") for day in range(max(batch_duration_days, 1))]
 
-            batch_number = i + 1
-            batch_date = start + timedelta(days=(i % batch_duration_days))
+    for provider in pd.unique(providers[top_rows]):
+        lead_indices = top_rows[providers[top_rows] == provider]
 
-            # Get indices for this batch
-            batch_indices = provider_leads.iloc[batch_start:batch_end].index
+        # Sort this provider's leads by priority (same ordering as sorting the rows themselves)
+        provider_leads = df[priority_col].iloc[lead_indices].sort_values(ascending=False).index.to_numpy()
 
-            # Update batch information
-            df.loc[batch_indices, "Batch number"] = batch_number
-            df.loc[batch_indices, "Send Date"] = batch_date.strftime("%Y-%m-%d")
-            df.loc[batch_indices, "Batch Name"] = f"{provider} batch-{batch_number}"
+        # Consecutive chunks of the daily capacity form the batches
+        numbers = np.arange(len(provider_leads)) // total_emails_per_day + 1
+        batch_number[provider_leads] = numbers.tolist()
+        send_date[provider_leads] = [batch_dates[(n - 1) % batch_duration_days] for n in numbers]
+        names = np.array([f"{provider} batch-{n}" for n in range(1, numbers[-1] + 1)], dtype=object)[numbers - 1]
+        batch_name[provider_leads] = names
 
-            # Update reason to include batch info
-            for idx in batch_indices:
-                current_reason = df.loc[idx, "Reason"]
-                df.loc[idx, "Reason"] = f"{current_reason} → Assigned to {provider} batch-{batch_number}"
+        # Update reason to include batch info
+        reason[provider_leads] = reason[provider_leads] + " → Assigned to " + names
 
     # Update status for leads that weren't selected and don't have reasons yet
-    no_reason_mask = (df["Status"] == "ready") & (df["Reason"] == "")
-    df.loc[no_reason_mask, "Status"] = "future"
-    df.loc[no_reason_mask, "Reason"] = "Eligible but not selected in current batch cycle"
+    no_reason_mask = (status == "ready") & (reason == "")
+    status[no_reason_mask] = "future"
+    reason[no_reason_mask] = "Eligible but not selected in current batch cycle"
 
-    # Clean up temporary columns
-    df = df.drop(columns=["rule", "limit"], errors="ignore")
+    df["Status"] = status
+    df["Batch number"] = batch_number
+    df["Send Date"] = send_date
+    df["Batch Name"] = batch_name
+    df["Reason"] = reason
 
-    return df.reset_index(drop=True)
+    return df
 
 
 def print_batch_summary(df: pd.DataFrame):
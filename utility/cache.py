@@ -0,0 +1,138 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ENRICHMENT_CACHE_PATH = os.getenv("ENRICHMENT_CACHE_PATH", "enrichment_cache.sqlite3")
+ENRICHMENT_CACHE_MAX_ENTRIES = int(os.getenv("ENRICHMENT_CACHE_MAX_ENTRIES", 100000))
+
+MINUTE = 60
+DAY = 24 * 60 * MINUTE
+
+# Cache namespaces and their default time-to-live
+EXA_SUMMARY = "exa_summary"
+LINKEDIN_COMPANY = "linkedin_company"
+EMAIL_VERIFICATION = "email_verification"
+EMAIL_VERIFICATION_ERROR = "email_verification_error"
+PRIORITY_SCORE = "priority_score"
+
+DEFAULT_TTLS = {
+    EXA_SUMMARY: float(os.getenv("CACHE_TTL_EXA_SUMMARY_DAYS", 30)) * DAY,
+    LINKEDIN_COMPANY: float(os.getenv("CACHE_TTL_LINKEDIN_COMPANY_DAYS", 30)) * DAY,
+    EMAIL_VERIFICATION: float(os.getenv("CACHE_TTL_EMAIL_VALID_DAYS", 30)) * DAY,
+    EMAIL_VERIFICATION_ERROR: float(os.getenv("CACHE_TTL_EMAIL_ERROR_MINUTES", 60)) * MINUTE,
+    PRIORITY_SCORE: float(os.getenv("CACHE_TTL_PRIORITY_SCORE_DAYS", 30)) * DAY,
+}
+
+# Verification results other than "valid" are kept for their own TTLs (negative caching)
+EMAIL_TTL_INVALID = float(os.getenv("CACHE_TTL_EMAIL_INVALID_DAYS", 14)) * DAY
+EMAIL_TTL_ERROR = DEFAULT_TTLS[EMAIL_VERIFICATION_ERROR]
+
+
+class PersistentCache:
+    """
+    Key/value cache in a local SQLite file, shared by every request and process on the host.
+
+    Entries are JSON encoded, grouped by namespace, expire after the namespace TTL and the
+    least recently used ones are evicted once a namespace holds more than `max_entries`.
+    """
+
+    # Prune expired/overflowing rows every N writes instead of on every write
+    PRUNE_EVERY = 100
+
+    def __init__(self, path: str, ttls: dict, max_entries: int):
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self.hits = {}
+        self.misses = {}
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, accessed_at)")
+
+    def get(self, namespace: str, key: str):
+        """Return the cached value or None when it is missing or expired"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, now),
+            ).fetchone()
+            if row is None:
+                self.misses[namespace] = self.misses.get(namespace, 0) + 1
+                return None
+            self._conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, namespace, key),
+            )
+            self.hits[namespace] = self.hits.get(namespace, 0) + 1
+        return json.loads(row[0])
+
+    def set(self, namespace: str, key: str, value, ttl: float = None):
+        """Store a value; `ttl` (seconds) overrides the namespace default"""
+        now = time.time()
+        ttl = self.ttls[namespace] if ttl is None else ttl
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), now + ttl, now),
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune(namespace, now)
+
+    def _prune(self, namespace: str, now: float):
+        self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+        self._conn.execute(
+            """DELETE FROM cache WHERE namespace = ? AND key IN (
+                SELECT key FROM cache WHERE namespace = ? ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )""",
+            (namespace, namespace, self.max_entries),
+        )
+
+    def stats(self) -> dict:
+        """Hit/miss counters per namespace since the process started"""
+        return {
+            namespace: {"hits": self.hits.get(namespace, 0), "misses": self.misses.get(namespace, 0)}
+            for namespace in sorted(set(self.hits) | set(self.misses))
+        }
+
+
+def normalize_url(url) -> str:
+    """
+    Normalize a website or LinkedIn URL so that trivial variations share one cache entry
+
+    Args:
+        url (str): URL as typed in the sheet
+
+    Returns:
+        str: Lower-cased URL without scheme, "www." and trailing slash
+    """
+    url = str(url).strip().lower()
+    url = re.sub(r'^https?://', '', url)
+    url = re.sub(r'^www\.', '', url)
+    return url.rstrip('/')
+
+
+enrichment_cache = PersistentCache(
+    path=ENRICHMENT_CACHE_PATH,
+    ttls=DEFAULT_TTLS,
+    max_entries=ENRICHMENT_CACHE_MAX_ENTRIES,
+)
@@ -0,0 +1,66 @@
+import json
+
+import pandas as pd
+
+from crud.job_rows import save_job_rows, get_job_rows
+from database.config import AsyncSessionLocal
+
+# Ways of re-running a previous job
+RESUME = "resume"  # reuse every row the previous run finished
+REPAIR = "repair"  # reuse only the finished rows that logged no error
+
+
+class JobCheckpoint:
+    """
+    Row-level checkpoints of a job, in the job_rows table.
+
+    Rows are saved in small batches as soon as they are enriched. When the job re-runs an earlier
+    (interrupted or partly failed) job, the rows that job finished are reused instead of
+    being enriched again, as long as the sheet still has the same email on that row.
+    """
+
+    def __init__(self, job_id, previous_job_id=None, mode: str = RESUME):
+        self.job_id = job_id
+        self.previous_job_id = previous_job_id
+        self.mode = mode
+
+    async def load(self, chunk: pd.DataFrame, first_row: int, email_col: str, error_col: str) -> dict:
+        """
+        Outputs of the previous run that can be reused for the rows of a chunk
+
+        Args:
+            chunk (pd.DataFrame): Rows first_row onwards of the sheet
+            first_row (int): Position of the chunk's first row in the sheet
+            email_col (str): Email column, which has to match the checkpointed row
+            error_col (str): Error log output, rows with an error are re-run in repair mode
+
+        Returns:
+            dict: Position in the chunk -> {output column: value}
+        """
+        if self.previous_job_id is None:
+            return {}
+        async with AsyncSessionLocal() as session:
+            rows = await get_job_rows(session, self.previous_job_id, first_row, first_row + len(chunk))
+
+        emails = chunk[email_col].astype(str).tolist()
+        reusable = {}
+        for row in rows:
+            position = row.row_index - first_row
+            if row.email != emails[position]:
+                continue
+            if self.mode == REPAIR and str(row.outputs.get(error_col, "")).strip():
+                continue
+            reusable[position] = row.outputs
+        return reusable
+
+    async def save(self, rows: pd.DataFrame, first_row: int, email_col: str, output_columns: list):
+        """Checkpoint the outputs of enriched rows, indexed by their position in the chunk starting at first_row"""
+        outputs = json.loads(rows[output_columns].to_json(orient="records"))
+        rows = [
+            {"row_index": first_row + int(position), "email": email, "outputs": row_outputs}
+            for position, email, row_outputs in zip(rows.index, rows[email_col].astype(str), outputs)
+        ]
+        if not rows:
+            return
+        async with AsyncSessionLocal() as session:
+            await save_job_rows(session, self.job_id, rows)
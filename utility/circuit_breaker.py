@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+from collections import deque
+from dotenv import load_dotenv
+
+import httpx
+import openai
+import requests
+
+from utility.rate_limiter import api_key_id, EMAIL_VERIFIER, LINKEDIN, EXA, OPENAI
+
+load_dotenv()
+
+# Breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Default breaker settings (failure rate, minimum calls, window of calls, seconds open) per vendor and API key.
+# Override with CIRCUIT_<VENDOR>_FAILURE_RATE / _MIN_CALLS / _WINDOW / _OPEN_SECONDS in .env
+DEFAULT_BREAKERS = {
+    EMAIL_VERIFIER: (0.5, 10, 20, 30.0),
+    LINKEDIN: (0.5, 10, 20, 30.0),
+    EXA: (0.5, 10, 20, 30.0),
+    OPENAI: (0.5, 10, 20, 30.0),
+}
+
+# Calls let through at once to probe a vendor whose breaker is half-open
+HALF_OPEN_PROBES = int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", 1))
+
+# Errors meaning the vendor could not be reached at all
+_UNREACHABLE = (httpx.TransportError, requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                openai.APIConnectionError)
+
+
+class CircuitOpenError(Exception):
+    """A call refused without reaching the vendor, because its breaker is open"""
+
+
+def is_vendor_failure(error, status_code=None) -> bool:
+    """
+    Whether an error says the vendor is unavailable, rather than something about one request
+
+    Unreachable hosts, timeouts, throttling and server errors count. A rejected key (401, 403),
+    a 4xx about the request itself or an unusable reply means the vendor is up.
+    """
+    if isinstance(error, _UNREACHABLE):
+        return True
+    return status_code is not None and (status_code in (408, 429) or status_code >= 500)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of one vendor and API key, over the outcome of its last `window` calls.
+
+    Once at least `min_calls` were made and `failure_rate` of them failed, the breaker opens and
+    every call fails fast for `open_seconds`. It then goes half-open and lets HALF_OPEN_PROBES
+    calls through: a success closes it again, a failure re-opens it.
+    """
+
+    def __init__(self, vendor: str, failure_rate: float, min_calls: int, window: int, open_seconds: float):
+        self.vendor = vendor
+        self.failure_rate = failure_rate
+        self.min_calls = max(1, min_calls)
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._outcomes = deque(maxlen=max(self.min_calls, window))
+        self._probes = 0
+        self._probe_started = None
+        # Calls come from the event loop and from worker threads (the Exa SDK)
+        self._lock = threading.Lock()
+
+    def check(self):
+        """Raise CircuitOpenError when the call has to fail fast, otherwise let it through"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self._probes = 0
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and self._probes and now - self._probe_started >= self.open_seconds:
+                # The probes never reported back (cancelled), send new ones
+                self._probes = 0
+            if self.state == HALF_OPEN and self._probes < HALF_OPEN_PROBES:
+                self._probes += 1
+                self._probe_started = now
+                return
+            self.rejected += 1
+        raise self._open_error()
+
+    def raise_if_open(self):
+        """Raise CircuitOpenError while the breaker is open, without taking a half-open probe"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at < self.open_seconds:
+                self.rejected += 1
+                raise self._open_error()
+
+    def _open_error(self):
+        if self.state == HALF_OPEN:
+            return CircuitOpenError(f"{self.vendor} is failing, waiting for a recovery probe")
+        retry_in = max(0.0, self.open_seconds - (time.monotonic() - self.opened_at))
+        return CircuitOpenError(f"{self.vendor} is failing, calls are paused for another {retry_in:.0f}s")
+
+    def record(self, failed: bool):
+        """Record the outcome of a call that was let through"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if failed:
+                    self._open()
+                else:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                return
+            if self.state == OPEN:
+                # A call let through before the breaker opened
+                return
+            self._outcomes.append(failed)
+            failures = sum(self._outcomes)
+            if len(self._outcomes) >= self.min_calls and failures >= self.failure_rate * len(self._outcomes):
+                self._open()
+
+    def _open(self):
+        print(f"Circuit breaker of {self.vendor} opened for {self.open_seconds:g}s")
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        self._outcomes.clear()
+
+    def snapshot(self) -> dict:
+        """State and counters of the breaker, for the admin endpoint"""
+        with self._lock:
+            open_for = None
+            if self.state == OPEN:
+                open_for = max(0.0, self.open_seconds - (time.monotonic() - self.opened_at))
+            return {
+                "state": self.state,
+                "recent_calls": len(self._outcomes),
+                "recent_failures": sum(self._outcomes),
+                "failure_rate_threshold": self.failure_rate,
+                "times_opened": self.times_opened,
+                "rejected_calls": self.rejected,
+                "seconds_until_half_open": open_for,
+            }
+
+
+_breakers = {}
+
+
+def get_circuit_breaker(vendor: str, api_key=None) -> CircuitBreaker:
+    """
+    Get the circuit breaker of a vendor and API key, creating it from the environment on first use
+
+    The keys come with each request, so throttling on one tenant's key only trips that key's breaker.
+
+    Args:
+        vendor (str): One of EMAIL_VERIFIER, LINKEDIN, EXA, OPENAI
+        api_key (str): Key the calls are made with
+
+    Returns:
+        CircuitBreaker: The breaker every call to that vendor with that key goes through
+    """
+    breaker_key = (vendor, api_key_id(api_key))
+    if breaker_key not in _breakers:
+        default_rate, default_min_calls, default_window, default_open = DEFAULT_BREAKERS[vendor]
+        prefix = f"CIRCUIT_{vendor.upper()}"
+        _breakers[breaker_key] = CircuitBreaker(
+            vendor=vendor,
+            failure_rate=float(os.getenv(f"{prefix}_FAILURE_RATE", default_rate)),
+            min_calls=int(os.getenv(f"{prefix}_MIN_CALLS", default_min_calls)),
+            window=int(os.getenv(f"{prefix}_WINDOW", default_window)),
+            open_seconds=float(os.getenv(f"{prefix}_OPEN_SECONDS", default_open)),
+        )
+    return _breakers[breaker_key]
+
+
+def circuit_breaker_states() -> dict:
+    """Snapshot of every breaker created so far, by vendor and API key hash"""
+    states = {vendor: {} for vendor in DEFAULT_BREAKERS}
+    for (vendor, key_id), breaker in list(_breakers.items()):
+        states[vendor][key_id] = breaker.snapshot()
+    return states
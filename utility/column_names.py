@@ -4,6 +4,9 @@ from langchain.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
 from typing import Optional
 
+from utility.rate_limiter import OPENAI
+from utility.retry import get_retry_policy
+
 # Define expected input schema
 class InputColumns(BaseModel):
     first_name: Optional[str] = Field(description="First name")
@@ -49,20 +52,20 @@ prompt = ChatPromptTemplate.from_messages([
 
 # Retry-able column name mapping function
 async def get_column_names(user_column_names: list, openai_api_key: str) -> dict:
-    llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0.0, openai_api_key=openai_api_key)
+    # Retries are left to the shared policy rather than the OpenAI client
+    llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0.0, openai_api_key=openai_api_key, max_retries=0)
     chain = prompt | llm | parser
-    max_attempts = 3
-    for attempt in range(1,max_attempts+1):
-        print(f'Getting column names.Attempt #{attempt}')
-        try:
-            result = chain.invoke({
-                "user_columns": ", ".join(user_column_names),
-                "format_instructions": format_instructions
-            })
-            return result.model_dump()
-        except Exception as e:
-            print(f"Attempt {attempt} failed: {e}")
 
-    # If all retries fail, return default structure with None values
-    return {field: None for field in InputColumns.model_fields.keys()}
+    async def map_columns():
+        result = await chain.ainvoke({
+            "user_columns": ", ".join(user_column_names),
+            "format_instructions": format_instructions
+        })
+        return result.model_dump()
+
+    try:
+        return await get_retry_policy(OPENAI).call(map_columns, "Getting column names", api_key=openai_api_key)
+    except Exception:
+        # If all retries fail, return default structure with None values
+        return {field: None for field in InputColumns.model_fields.keys()}
 
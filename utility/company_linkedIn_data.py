@@ -1,34 +1,32 @@
-import requests
+from utility.http_client import get_http_client, RAPIDAPI_BASE_URL, RAPIDAPI_HOST
+from utility.rate_limiter import LINKEDIN
+from utility.retry import get_retry_policy, RetryableError
 
 # noinspection PyTypeChecker
-def get_company_linkedin_data(linkedin_url, ss_masters_api_key):
+async def get_company_linkedin_data(linkedin_url, ss_masters_api_key):
 
-    url = "https://commande-center.p.rapidapi.com/linkedin-company-info"
+    client = get_http_client(RAPIDAPI_BASE_URL)
     payload = {"url": linkedin_url}
     headers = {
         "x-rapidapi-key": ss_masters_api_key,
-        "x-rapidapi-host": "commande-center.p.rapidapi.com",
+        "x-rapidapi-host": RAPIDAPI_HOST,
         "Content-Type": "application/json"
     }
 
-    max_attempts = 2
+    async def fetch():
+        response = await client.post("/linkedin-company-info", json=payload, headers=headers)
+        response.raise_for_status()
+        result = response.json()[0]
 
-    for attempt in range(1, max_attempts + 1):
-        print(f"Fetching LinkedIn data for: {linkedin_url}.Attempt {attempt}...")
-        try:
-            response = requests.post(url, json=payload, headers=headers)
-            response.raise_for_status()
-            result = response.json()[0]
+        description = result.get("Company Info", {}).get("Company Description", "")
+        employees = result.get("Company Info", {}).get("Number of Employees", "")
 
-            description = result.get("Company Info", {}).get("Company Description", "")
-            employees = result.get("Company Info", {}).get("Number of Employees", "")
+        if not (description and employees):
+            raise RetryableError("Incomplete data received")
+        return description, employees, ""
 
-            if description and employees:
-                return description, employees, ""
-            else:
-                print("Incomplete data received. Retrying...")
-
-        except Exception as e:
-            print(f"Attempt {attempt} failed: {e}")
-
-    return "-", "-", f"Unable to get LinkedIn data after {max_attempts} attempts."
+    try:
+        return await get_retry_policy(LINKEDIN).call(fetch, f"Fetching LinkedIn data for: {linkedin_url}",
+                                                      api_key=ss_masters_api_key)
+    except Exception as e:
+        return "-", "-", f"Unable to get LinkedIn data: {e}"
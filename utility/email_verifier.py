@@ -1,25 +1,81 @@
-import requests
+import asyncio
+
+from utility.cache import enrichment_cache, EMAIL_VERIFICATION, EMAIL_VERIFICATION_ERROR, EMAIL_TTL_INVALID, EMAIL_TTL_ERROR
+from utility.http_client import get_http_client, RAPIDAPI_BASE_URL, RAPIDAPI_HOST
+from utility.circuit_breaker import CircuitOpenError
+from utility.rate_limiter import api_key_id, EMAIL_VERIFIER
+from utility.retry import get_retry_policy
+
+# Verifications currently running by (address, key hash), so a repeated address waits for the first call
+_in_flight = {}
 
 async def lead_email_verifier(email, api_key):
-    url = "https://commande-center.p.rapidapi.com/email-verifier"
+    client = get_http_client(RAPIDAPI_BASE_URL)
     querystring = {"email": email}
     headers = {
         "x-rapidapi-key": api_key,  # use the parameter passed instead of hardcoding
-        "x-rapidapi-host": "commande-center.p.rapidapi.com"
+        "x-rapidapi-host": RAPIDAPI_HOST
     }
-    max_attempts=3
-    # noinspection PyTypeChecker
-    for attempt in range(1,max_attempts+1):  # Max 3 attempts
-        print(f"Verifying email: {email} (Attempt {attempt})")
-        try:
-            response = requests.get(url, headers=headers, params=querystring)
-            response.raise_for_status()
-            result = response.json()[0]
-            return result['status'], result['email_provider'], ""
-        except Exception as e:
-            print(f"Attempt {attempt} failed: {e}")
-            if attempt == 3:
-                return "-", "-", f"Unable to verify email after 3 attempts: {e}"
-    return "-","-","Internal Error"
 
+    async def verify():
+        response = await client.get("/email-verifier", headers=headers, params=querystring)
+        response.raise_for_status()
+        result = response.json()[0]
+        return result['status'], result['email_provider'], ""
+
+    try:
+        return await get_retry_policy(EMAIL_VERIFIER).call(verify, f"Verifying email: {email}", api_key=api_key)
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        return "-", "-", f"Unable to verify email: {e}"
+
+
+def _error_key(email_key, api_key):
+    """Cache key of a failed verification: the failure may come from the tenant's key, so it is only theirs"""
+    return f"{email_key}:{api_key_id(api_key)}"
+
+
+async def _verify_and_cache(email_key, api_key):
+    try:
+        status, email_provider, error = await lead_email_verifier(email=email_key, api_key=api_key)
+    except CircuitOpenError as e:
+        # The breaker closes again on its own, nothing to remember
+        return "-", "-", f"Unable to verify email: {e}"
+
+    if error:
+        enrichment_cache.set(EMAIL_VERIFICATION_ERROR, _error_key(email_key, api_key), [status, email_provider, error],
+                             ttl=EMAIL_TTL_ERROR)
+        return status, email_provider, error
+
+    ttl = None if status == 'valid' else EMAIL_TTL_INVALID
+    enrichment_cache.set(EMAIL_VERIFICATION, email_key, [status, email_provider, error], ttl=ttl)
+    return status, email_provider, error
+
+
+async def verify_email_cached(email, api_key):
+    """
+    Cached front of lead_email_verifier
+
+    Valid and invalid results are reused across rows, runs and tenants, each with its own TTL.
+    Errors are reused for a short TTL by the same API key only.
+
+    Args:
+        email (str): Email address
+        api_key (str): RapidAPI key
+
+    Returns:
+        tuple: (status, email_provider, error) like lead_email_verifier
+    """
+    email_key = str(email).strip().lower()
+    cached = enrichment_cache.get(EMAIL_VERIFICATION, email_key)
+    if cached is None:
+        cached = enrichment_cache.get(EMAIL_VERIFICATION_ERROR, _error_key(email_key, api_key))
+    if cached is not None:
+        return tuple(cached)
 
+    flight_key = (email_key, api_key_id(api_key))
+    if flight_key not in _in_flight:
+        _in_flight[flight_key] = asyncio.ensure_future(_verify_and_cache(email_key, api_key))
+        _in_flight[flight_key].add_done_callback(lambda _: _in_flight.pop(flight_key, None))
+    return await _in_flight[flight_key]
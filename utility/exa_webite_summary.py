@@ -1,17 +1,26 @@
+import asyncio
+import os
+import threading
+from dotenv import load_dotenv
+
 from exa_py import Exa
 
-# noinspection PyTypeChecker
-def get_website_summary(website_url, exa_api_key):
-    max_attempts = 3
-    for attempt in range(1, max_attempts + 1):
-        print(f"Getting website summary for: {website_url}.Attempt {attempt}...")
-        try:
-            exa = Exa(api_key=exa_api_key)
-            response = exa.get_contents(
-                [website_url],
-                text=True,
-                summary={
-                    "query": """You are an expert business analyst. 
+from utility.cache import normalize_url
+from utility.circuit_breaker import get_circuit_breaker
+from utility.rate_limiter import get_rate_limiter, EXA
+from utility.retry import get_retry_policy, RetryableError, status_code_of
+
+load_dotenv()
+
+# Websites summarized per get_contents call
+EXA_BATCH_SIZE = int(os.getenv("EXA_BATCH_SIZE", 10))
+# Seconds a partial batch waits for more websites before it is sent
+EXA_BATCH_WAIT = float(os.getenv("EXA_BATCH_WAIT", 0.05))
+
+# Statuses rejecting the request itself, where one malformed URL can fail the whole batch
+REJECTED_REQUEST_STATUS = {400, 413, 414, 422}
+
+SUMMARY_QUERY = """You are an expert business analyst. 
                                 Given any company name and a brief description or website data, generate a clear, structured company summary with the following format and tone. 
                                 Keep it concise, factual, and tailored for professional outreach.  
                                 FORMAT TO FOLLOW:  
@@ -30,15 +39,128 @@ def get_website_summary(website_url, exa_api_key):
                                 Advantage: [A unique strength you/your firm offers that fits their goals].  
                                 Make sure all information is fact-based, and infer only when context clearly allows. 
                                 Use a confident, advisory tone, suitable for B2B strategy or consulting outreach."""
-                                                }
-                                            )
-            summary = response.results[0].summary
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_exa_client(exa_api_key) -> Exa:
+    """Shared Exa client of an API key, created on first use (get_contents runs in worker threads)"""
+    with _clients_lock:
+        if exa_api_key not in _clients:
+            _clients[exa_api_key] = Exa(api_key=exa_api_key)
+        return _clients[exa_api_key]
+
+
+def _summaries_by_url(response) -> dict:
+    """Summaries of a get_contents response, by normalized requested and final URL"""
+    summaries = {}
+    for result in response.results:
+        for url in (result.id, result.url):
+            if url:
+                summaries.setdefault(normalize_url(url), result.summary or "")
+    return summaries
+
+
+def get_website_summaries(websites, exa_api_key) -> dict:
+    """
+    Summarize many websites with as few get_contents calls as possible
+
+    Only the summary is requested, not the page text. Every summary is checked for the
+    COMPANY format on its own and the retries only ask again for the websites still missing.
+    Websites Exa reports it could not read are not retried.
+
+    Args:
+        websites (list): Website URLs
+        exa_api_key (str): Exa AI API key
+
+    Returns:
+        dict: Website -> (summary, error), like get_website_summary
+    """
+    exa = get_exa_client(exa_api_key)
+    results = {}
+    pending = list(dict.fromkeys(websites))
+
+    def summarize():
+        response = exa.get_contents([str(website) for website in pending], summary={"query": SUMMARY_QUERY})
+        summaries = _summaries_by_url(response)
+        unreadable = {normalize_url(status.id) for status in (response.statuses or []) if status.status == "error"}
+        still_pending = []
+        for website in pending:
+            key = normalize_url(website)
+            summary = summaries.get(key, "")
             if "COMPANY" in summary:
-                return summary, ""
+                results[website] = (summary, "")
+            elif key in unreadable:
+                results[website] = ("", "Exa could not read the website")
             else:
-                print("Summary not in the required format'. Retrying...")
-        except Exception as e:
-            print(f"Attempt {attempt} failed: {e}")
+                still_pending.append(website)
+        pending[:] = still_pending
+        if pending:
+            raise RetryableError(f"{len(pending)} summaries not in the required format")
+
+    try:
+        get_retry_policy(EXA).call_sync(summarize, f"Getting website summaries for {len(pending)} websites",
+                                        api_key=exa_api_key)
+    except Exception as e:
+        if len(pending) > 1 and status_code_of(e) in REJECTED_REQUEST_STATUS:
+            # A request rejected as a whole (one malformed URL), find the culprit one website at a time
+            # Auth and quota errors (401, 402, 403, 429) would fail every website the same way, so they do not split
+            for website in pending:
+                results.update(get_website_summaries([website], exa_api_key))
+        else:
+            for website in pending:
+                results[website] = ("", f"Failed to get a valid summary: {e}")
+    return results
+
+
+def get_website_summary(website_url, exa_api_key):
+    return get_website_summaries([website_url], exa_api_key)[website_url]
+
+
+class WebsiteSummaryBatcher:
+    """
+    Groups the website summaries requested concurrently into get_contents calls of up to
+    `batch_size` websites. A call is sent once the batch is full or `wait` seconds after its
+    first website, and takes one Exa rate limiter token.
+    """
+
+    def __init__(self, exa_api_key, batch_size: int = EXA_BATCH_SIZE, wait: float = EXA_BATCH_WAIT):
+        self.exa_api_key = exa_api_key
+        self.batch_size = max(1, batch_size)
+        self.wait = wait
+        self._batch = {}
+        self._timer = None
 
-    return "", f"Failed to get a valid summary after {max_attempts} attempts."
+    async def summarize(self, website):
+        """(summary, error) of one website, sent with the websites requested around the same time"""
+        future = self._batch.get(website)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._batch[website] = loop.create_future()
+            if len(self._batch) >= self.batch_size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.wait, self._flush)
+        return await future
 
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._batch = self._batch, {}
+        if batch:
+            asyncio.ensure_future(self._send(batch))
+
+    async def _send(self, batch):
+        try:
+            # Fail fast instead of waiting for a rate limit token while the Exa breaker is open
+            get_circuit_breaker(EXA, self.exa_api_key).raise_if_open()
+            await get_rate_limiter(EXA, self.exa_api_key).acquire()
+            results = await asyncio.get_running_loop().run_in_executor(None, get_website_summaries, list(batch),
+                                                                       self.exa_api_key)
+        except Exception as e:
+            results = {website: ("", str(e)) for website in batch}
+        for website, future in batch.items():
+            if not future.done():
+                future.set_result(results.get(website, ("", "Internal Error")))
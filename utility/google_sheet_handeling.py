@@ -1,5 +1,23 @@
+import asyncio
+import os
+from io import StringIO
+
 import pandas as pd
 import re
+from dotenv import load_dotenv
+
+from utility.http_client import get_http_client
+
+load_dotenv()
+
+GOOGLE_DOCS_URL = "https://docs.google.com"
+
+# Rows parsed and handed to the pipeline at a time
+SHEET_CHUNK_ROWS = int(os.getenv("SHEET_CHUNK_ROWS", 1000))
+
+# Parsed chunks the download may get ahead of the pipeline by, before it waits
+SHEET_CHUNKS_AHEAD = int(os.getenv("SHEET_CHUNKS_AHEAD", 2))
+
 
 async def get_google_sheet_as_dataframe(sheet_url):
     """
@@ -11,6 +29,34 @@ async def get_google_sheet_as_dataframe(sheet_url):
     Returns:
         pandas.DataFrame: DataFrame containing the sheet data
     """
+    chunks = iter_google_sheet_chunks(sheet_url)
+    try:
+        chunks = [chunk async for chunk in chunks]
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+    except Exception as e:
+        print(f"Error reading Google Sheet: {e}")
+        print("Make sure the Google Sheet is publicly accessible or shared with viewing permissions.")
+        return None
+
+
+def iter_google_sheet_chunks(sheet_url, chunk_rows=SHEET_CHUNK_ROWS, on_downloaded=None):
+    """
+    Stream a Google Sheet and yield it as DataFrames of at most `chunk_rows` rows
+
+    The CSV export is downloaded in the background on the shared async HTTP client, so the
+    download keeps going while the caller works on the chunks already yielded, up to
+    SHEET_CHUNKS_AHEAD chunks ahead. Close the iterator (aclose) when stopping early, so the
+    download stops too.
+
+    Args:
+        sheet_url (str): Google Sheets URL (either sharing link or direct link)
+        chunk_rows (int): Rows per chunk
+        on_downloaded (callable): Called with the number of rows once the whole sheet is downloaded
+
+    Returns:
+        AsyncIterator[pandas.DataFrame]: Consecutive rows of the sheet, all with the sheet's header
+    """
 
     # Extract the sheet ID from the URL
     sheet_id = extract_sheet_id(sheet_url)
@@ -19,17 +65,92 @@ async def get_google_sheet_as_dataframe(sheet_url):
         raise ValueError("Could not extract sheet ID from URL. Please check the URL format.")
 
     # Convert to CSV export URL
-    csv_url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv"
+    csv_url = f"{GOOGLE_DOCS_URL}/spreadsheets/d/{sheet_id}/export?format=csv"
+    return _stream_chunks(csv_url, chunk_rows, on_downloaded)
 
+
+async def _stream_chunks(csv_url, chunk_rows, on_downloaded):
+    queue = asyncio.Queue(maxsize=max(1, SHEET_CHUNKS_AHEAD))
+    producer = asyncio.ensure_future(_download_chunks(csv_url, chunk_rows, queue, on_downloaded))
     try:
-        # Read the CSV data directly into pandas
-        df = pd.read_csv(csv_url)
-        return df
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            yield chunk
+        # Re-raise a failed download
+        await producer
+    finally:
+        # Stops the download when the caller stopped early
+        producer.cancel()
 
-    except Exception as e:
-        print(f"Error reading Google Sheet: {e}")
-        print("Make sure the Google Sheet is publicly accessible or shared with viewing permissions.")
-        return None
+
+class ChainedChunks:
+    """Iterate an already read first chunk followed by the rest of the chunks; closing it closes the rest"""
+
+    def __init__(self, first_chunk, chunks):
+        self._first_chunk = first_chunk
+        self._chunks = chunks
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._first_chunk is not None:
+            chunk, self._first_chunk = self._first_chunk, None
+            return chunk
+        return await anext(self._chunks)
+
+    async def aclose(self):
+        self._first_chunk = None
+        await self._chunks.aclose()
+
+
+async def _download_chunks(csv_url, chunk_rows, queue, on_downloaded):
+    """Download the CSV export, putting a DataFrame on the queue every `chunk_rows` records, then None"""
+    try:
+        client = get_http_client(GOOGLE_DOCS_URL)
+        async with client.stream("GET", csv_url, follow_redirects=True) as response:
+            response.raise_for_status()
+            header, records, rows = None, [], 0
+            async for record in _iter_csv_records(response.aiter_lines()):
+                if header is None:
+                    header = record
+                    continue
+                records.append(record)
+                rows += 1
+                if len(records) == chunk_rows:
+                    await queue.put(_parse_records(header, records))
+                    records = []
+            if records:
+                await queue.put(_parse_records(header, records))
+        if on_downloaded is not None:
+            on_downloaded(rows)
+    except Exception:
+        # Wake the consumer, which re-raises the error; a cancelled download has no consumer left
+        await queue.put(None)
+        raise
+    await queue.put(None)
+
+
+async def _iter_csv_records(lines):
+    """Join the lines of a quoted field spanning several lines back into one CSV record"""
+    record, open_quote = [], False
+    async for line in lines:
+        line = line.rstrip("\r\n")
+        record.append(line)
+        # An odd number of quotes toggles whether the record continues on the next line
+        if line.count('"') % 2:
+            open_quote = not open_quote
+        if not open_quote:
+            yield "\n".join(record)
+            record = []
+    if record:
+        yield "\n".join(record)
+
+
+def _parse_records(header, records):
+    return pd.read_csv(StringIO("\n".join([header] + records)))
 
 
 def extract_sheet_id(url):
@@ -54,4 +175,4 @@ def extract_sheet_id(url):
         if match:
             return match.group(1)
 
-    return None
\ No newline at end of file
+    return None
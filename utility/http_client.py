@@ -0,0 +1,54 @@
+import importlib.util
+import os
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RAPIDAPI_HOST = "commande-center.p.rapidapi.com"
+RAPIDAPI_BASE_URL = f"https://{RAPIDAPI_HOST}"
+
+# Pool settings, override in .env
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 30))
+
+# HTTP/2 is negotiated per host through ALPN with the `h2` package that httpx[http2] installs,
+# environments installed without it keep to HTTP/1.1
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_clients = {}
+
+
+def get_http_client(base_url: str) -> httpx.AsyncClient:
+    """
+    Get the shared keep-alive client of a host, creating it on first use
+
+    Args:
+        base_url (str): Scheme and host, e.g. https://commande-center.p.rapidapi.com
+
+    Returns:
+        httpx.AsyncClient: Pooled client, requests on it may use paths relative to base_url
+    """
+    client = _clients.get(base_url)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            base_url=base_url,
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(HTTP_TIMEOUT),
+        )
+        _clients[base_url] = client
+    return client
+
+
+async def close_http_clients():
+    """Close every pooled client, called on application shutdown"""
+    while _clients:
+        _, client = _clients.popitem()
+        await client.aclose()
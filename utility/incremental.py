@@ -0,0 +1,91 @@
+import hashlib
+
+import pandas as pd
+
+# Output column holding the hash of the inputs a row was enriched from
+INPUT_HASH = "Input Hash"
+
+# Values the pipeline writes when it has nothing for a cell
+EMPTY_VALUES = ("", "-", "nan", "None")
+
+
+def _normalize(values: pd.Series) -> pd.Series:
+    """Text form of a column that does not depend on the dtype pandas inferred for it"""
+    if pd.api.types.is_float_dtype(values):
+        # 20 and 20.0 are the same employee count; a chunk with a blank cell reads the column as float
+        values = values.map(lambda value: "" if pd.isna(value) else
+                            str(int(value)) if float(value).is_integer() else str(value))
+    values = values.fillna("").astype(str).str.strip().str.lower()
+    # A sheet the pipeline wrote has lower-cased job titles and departments, and "-" for blank inputs
+    return values.where(~values.isin(EMPTY_VALUES), "")
+
+
+def input_hashes(df: pd.DataFrame, columns: list) -> pd.Series:
+    """
+    Hash of the input fields of every row, changing whenever one of them is edited
+
+    Args:
+        df (pd.DataFrame): Leads
+        columns (list): Input columns the enrichment reads
+
+    Returns:
+        pd.Series: 16 hex characters per row, same index as df
+    """
+    text = pd.concat([_normalize(df[column]) for column in columns], axis=1)
+    joined = text.apply(lambda row: "\x1f".join(row), axis=1) if len(df) else pd.Series([], dtype=object)
+    return joined.map(lambda row: hashlib.sha1(row.encode("utf-8")).hexdigest()[:16])
+
+
+def email_keys(emails: pd.Series) -> pd.Series:
+    """Emails as compared across runs"""
+    return emails.fillna("").astype(str).str.strip().str.lower()
+
+
+def filled(values: pd.Series) -> pd.Series:
+    """Cells holding a value from an earlier run"""
+    return values.notna() & ~values.astype(str).str.strip().isin(EMPTY_VALUES)
+
+
+def previous_outputs(df: pd.DataFrame, email_col: str, hashes: pd.Series, output_columns: list,
+                     proceed_on_invalid_email: bool) -> dict:
+    """
+    Outputs an earlier run already wrote into the sheet, keyed on (email, input hash)
+
+    A row counts as enriched when its email was verified and, if that email is enriched at
+    all, it has a priority score. Rows without an input hash (sheets from before the column
+    existed) are keyed on the hash of their current inputs. Output columns the sheet does not
+    have are carried forward as "-".
+
+    Args:
+        df (pd.DataFrame): Rows of the input sheet
+        email_col (str): Email column
+        hashes (pd.Series): input_hashes of the rows
+        output_columns (list): Columns written by the enrichment
+        proceed_on_invalid_email (bool): Whether invalid emails are enriched this time
+
+    Returns:
+        dict: (email, input hash) -> {output column: value}
+    """
+    if "Email Valid" not in df.columns or "Priority Score" not in df.columns:
+        return {}
+
+    enriched = filled(df["Email Valid"]) & (
+        filled(df["Priority Score"]) | ~(proceed_on_invalid_email | (df["Email Valid"] == "valid"))
+    )
+    if not enriched.any():
+        return {}
+
+    rows = df[enriched]
+    previous_hashes = hashes[enriched]
+    if INPUT_HASH in df.columns:
+        previous_hashes = rows[INPUT_HASH].where(filled(rows[INPUT_HASH]), previous_hashes)
+
+    outputs = rows.reindex(columns=output_columns).astype(object).where(lambda frame: frame.notna(), "-")
+    # Blank new rows make pandas read whole output columns as float, give the scores and counts back as ints
+    for column in rows.columns.intersection(output_columns):
+        if pd.api.types.is_float_dtype(rows[column]):
+            outputs[column] = outputs[column].map(lambda value: int(value) if isinstance(value, float)
+                                                  and value.is_integer() else value)
+    outputs["Error Log"] = rows["Error Log"].where(filled(rows["Error Log"]), "") if "Error Log" in rows else ""
+    keys = zip(email_keys(rows[email_col]), previous_hashes)
+    return dict(zip(keys, outputs.to_dict("records")))
@@ -0,0 +1,59 @@
+import asyncio
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Jobs running at the same time; each one already enriches its rows concurrently
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+
+
+class JobQueue:
+    """
+    In-process worker pool for long-running jobs.
+
+    Jobs are coroutine functions taking no arguments. They run in submission order, at most
+    `workers` at a time, and are responsible for recording their own outcome.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._queue = asyncio.Queue()
+        self._tasks = []
+
+    def start(self):
+        """Start the workers, called on application startup"""
+        self._tasks = [asyncio.ensure_future(self._work(worker)) for worker in range(self.workers)]
+
+    async def stop(self):
+        """Cancel the workers and the jobs they are running, called on application shutdown"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job) -> int:
+        """
+        Queue a job
+
+        Args:
+            job: Coroutine function taking no arguments
+
+        Returns:
+            int: Number of jobs waiting for a worker, this one included
+        """
+        self._queue.put_nowait(job)
+        return self._queue.qsize()
+
+    async def _work(self, worker):
+        while True:
+            job = await self._queue.get()
+            try:
+                await job()
+            except Exception as e:
+                print(f"Job failed on worker {worker}: {e}")
+            finally:
+                self._queue.task_done()
+
+
+job_queue = JobQueue(JOB_WORKERS)
@@ -0,0 +1,73 @@
+import json
+
+import pandas as pd
+
+from crud.leads import copy_leads, get_leads
+from database.config import AsyncSessionLocal
+from utility.incremental import email_keys, input_hashes, INPUT_HASH
+
+
+def dataframe_to_leads(df: pd.DataFrame, email_col: str, company_col: str, input_columns: list,
+                       output_columns: list = None, hash_columns: list = None, status_col: str = "Status") -> list:
+    """
+    Rows of a sheet as rows of the leads table
+
+    Args:
+        df (pd.DataFrame): Leads, raw or enriched
+        email_col (str): Email column, rows without an email are left out
+        company_col (str): Company name column
+        input_columns (list): Columns stored as the lead's inputs
+        output_columns (list): Columns stored as the lead's outputs, None for a sheet that was not enriched
+        hash_columns (list): Inputs the enrichment reads, hashed (unless the sheet has its input hash column)
+            to tell when stored outputs went stale
+        status_col (str): Batch status column of an enriched sheet
+
+    Returns:
+        list: One dict per lead, for crud.leads.copy_leads
+    """
+    emails = email_keys(df[email_col])
+    hashes = df[INPUT_HASH] if INPUT_HASH in df else input_hashes(df, hash_columns or input_columns)
+    companies = df[company_col].where(df[company_col].notna(), None) if company_col in df else pd.Series(None, index=df.index)
+    inputs = json.loads(df[input_columns].to_json(orient="records"))
+    if output_columns is not None:
+        outputs = json.loads(df[output_columns].to_json(orient="records"))
+        statuses = df[status_col].tolist() if status_col in df else [None] * len(df)
+    else:
+        outputs = statuses = [None] * len(df)
+
+    return [
+        {"email": email, "company": None if company is None else str(company), "status": status,
+         "input_hash": input_hash, "inputs": row_inputs, "outputs": row_outputs}
+        for email, company, status, input_hash, row_inputs, row_outputs
+        in zip(emails, companies, statuses, hashes, inputs, outputs)
+        if email
+    ]
+
+
+def leads_to_dataframe(leads: list) -> pd.DataFrame:
+    """
+    Stored leads back as the rows of an enriched sheet
+
+    Args:
+        leads (list): Lead rows, as returned by crud.leads.get_leads
+
+    Returns:
+        pd.DataFrame: The inputs of every lead, then its outputs and input hash; a lead that was
+            never enriched has empty outputs
+    """
+    rows = [{**lead.inputs, **(lead.outputs or {}), INPUT_HASH: lead.input_hash} for lead in leads]
+    return pd.DataFrame(rows)
+
+
+async def store_leads(project_id, df: pd.DataFrame, job_id=None, **columns) -> int:
+    """Bulk upsert the rows of a sheet into the leads table, returns the number of leads written"""
+    leads = dataframe_to_leads(df, **columns)
+    async with AsyncSessionLocal() as session:
+        return await copy_leads(session, project_id, leads, job_id=job_id)
+
+
+async def load_leads(project_id) -> pd.DataFrame:
+    """The stored leads of a project as a sheet, empty when it has none"""
+    async with AsyncSessionLocal() as session:
+        leads = await get_leads(session, project_id)
+    return leads_to_dataframe(leads)
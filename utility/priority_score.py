@@ -1,7 +1,29 @@
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
 from langchain.output_parsers import PydanticOutputParser
-from pydantic import BaseModel, Field
+from langchain_core.output_parsers import JsonOutputParser
+from pydantic import BaseModel, Field, ValidationError
+from typing import List
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+
+from utility.batching import DEFAULT_RULE_TABLES
+from utility.cache import enrichment_cache, PRIORITY_SCORE
+from utility.rate_limiter import OPENAI
+from utility.retry import get_retry_policy
+from utility.targeting_rules import RuleTables
+
+# Number of leads scored per LLM call by get_priority_scores_batch
+PRIORITY_BATCH_SIZE = int(os.getenv("PRIORITY_BATCH_SIZE", 25))
+# Profiles kept in the in-process LRU memo, in front of the persistent cache
+PRIORITY_MEMO_SIZE = int(os.getenv("PRIORITY_MEMO_SIZE", 10000))
+# Seconds a partial batch waits for profiles from concurrent calls before it is sent
+PRIORITY_BATCH_WAIT = float(os.getenv("PRIORITY_BATCH_WAIT", 0.05))
 
 
 class PriorityScore(BaseModel):
@@ -9,54 +31,61 @@ class PriorityScore(BaseModel):
     reason: str = Field(description="Explanation of the score based on the input context")
 
 
+class LeadPriorityScore(PriorityScore):
+    index: int = Field(description="Index of the lead in the given list")
+
+
+class PriorityScoreBatch(BaseModel):
+    scores: List[LeadPriorityScore] = Field(description="One score per lead, in the same order as the leads")
+
+
 parser = PydanticOutputParser(pydantic_object=PriorityScore)
 format_instructions = parser.get_format_instructions()
 
+# The batch reply is parsed as plain JSON and every item is validated on its own,
+# so one malformed item does not throw away the whole batch
+batch_parser = JsonOutputParser()
+batch_format_instructions = PydanticOutputParser(pydantic_object=PriorityScoreBatch).get_format_instructions()
+
+def scoring_rules(rule_tables: RuleTables = None) -> str:
+    """
+    Scoring logic of the prompts, written from the targeting rules the batcher and the rule-based
+    pre-scoring use (a project's, see utility.batching.get_project_rule_tables, SIZE_RULES when not given)
+
+    Companies above the largest segment are ABM accounts, as in utility.rule_scoring.pre_score_leads.
+    """
+    tables = DEFAULT_RULE_TABLES if rule_tables is None else rule_tables
+
+    def terms(values):
+        return ", ".join(values or []) or "None"
+
+    lines = ["", "Use this logic:"]
+    for rule in tables.rules:
+        size = f"{rule['min']:g}+" if math.isinf(rule["max"]) else f"{rule['min']:g}-{rule['max']:g}"
+        lines += ["", f"Company Size {size}:",
+                  f"- Primary Roles: {terms(rule['primary_roles'])}",
+                  f"- Secondary Roles: {terms(rule['secondary_roles'])}",
+                  f"- Exclude: {terms(rule['exclusion_roles'])}"]
+        if rule.get("primary_seniorities") or rule.get("secondary_seniorities") or rule.get("exclusion_seniorities"):
+            lines += [f"- Primary Seniorities: {terms(rule.get('primary_seniorities'))}",
+                      f"- Secondary Seniorities: {terms(rule.get('secondary_seniorities'))}",
+                      f"- Exclude Seniorities: {terms(rule.get('exclusion_seniorities'))}"]
+        lines.append(f"- Target Depts: {terms(rule['target_departments']) if rule['target_departments'] else 'All'}")
+        if rule["exclusion_departments"]:
+            lines.append(f"- Exclude Depts: {terms(rule['exclusion_departments'])}")
+    if math.isfinite(tables.max_supported):
+        lines += ["", f"Company Size {tables.max_supported:g}+:",
+                  "- Handle via ABM strategy; return low score (0–10) and note that ABM is more appropriate"]
+    return "\n".join(lines) + "\n"
+
+
 # Scoring Rules Prompt (system)
 system_template = """
 You are an expert assistant for prioritizing B2B leads for campaign.
 Campaign description :{desc}
 
 Your task is to assign a priority score (0-100) and explain your reasoning based on the lead's job title, department, and company size.
-
-Use this logic:
-
-Company Size 1-50:
-- Primary Roles: CEO, Founder, Co-Founder, Owner
-- Secondary Roles: Director, Head of, VP
-- Exclude: Intern, Assistant
-- Target Depts: All
-
-Company Size 51-100:
-- Primary Roles: CEO, Founder, Co-Founder, VP
-- Secondary Roles: Director, Head of, Senior Manager
-- Exclude: Analyst, Coordinator
-- Target Depts: All
-
-Company Size 101-200:
-- Primary Roles: Director, VP, Head of
-- Secondary Roles: Senior Manager, Manager
-- Exclude: CEO, Founder, Analyst
-- Target Depts: Sales, Marketing, Operations, Growth
-- Exclude Depts: HR, Legal, Finance, Accounting
-
-Company Size 201-500:
-- Primary Roles: Director, Head of, Senior Director
-- Secondary Roles: VP, Senior Manager
-- Exclude: CEO, President, Analyst
-- Target Depts: Sales, Marketing, Operations, Growth
-- Exclude Depts: HR, Legal, Finance, Accounting
-
-Company Size 501-1000:
-- Primary Roles: Senior Manager, Director, Head of
-- Secondary Roles: Manager, Senior Director
-- Exclude: VP, CEO, President
-- Target Depts: Sales, Marketing, Operations, Growth
-- Exclude Depts: HR, Legal, Finance, Accounting
-
-Company Size 1000+:
-- Handle via ABM strategy; return low score (0–10) and note that ABM is more appropriate
-
+{scoring_rules}
 Use this format:
 {format_instructions}
 """
@@ -76,27 +105,256 @@ prompt = ChatPromptTemplate.from_messages([
     HumanMessagePromptTemplate.from_template(human_template)
 ])
 
+batch_system_template = """
+You are an expert assistant for prioritizing B2B leads for campaign.
+Campaign description :{desc}
 
-async def get_priority_score(job_title: str, seniority:str ,department: str, company_size: str, industry: str, desc:str,openai_api_key: str):
-    llm =ChatOpenAI(model_name="gpt-4o-mini", temperature=0.3, openai_api_key=openai_api_key)
+Your task is to assign a priority score (0-100) to every lead in the list and explain your reasoning based on each lead's job title, department, and company size.
+Score every lead independently and return exactly one entry per lead, keeping its index.
+{scoring_rules}
+Use this format:
+{format_instructions}
+"""
+
+batch_human_template = """
+Evaluate the following leads:
+{leads}
+"""
+
+batch_prompt = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(batch_system_template),
+    HumanMessagePromptTemplate.from_template(batch_human_template)
+])
+
+
+async def get_priority_score(job_title: str, seniority:str ,department: str, company_size: str, industry: str, desc:str,openai_api_key: str,
+                             rules: str = None):
+    # Retries are left to the shared policy rather than the OpenAI client
+    llm =ChatOpenAI(model_name="gpt-4o-mini", temperature=0.3, openai_api_key=openai_api_key, max_retries=0)
     chain = prompt | llm | parser
-    max_attempts = 3
-    for attempt in range(1, max_attempts + 1):
-        print(f"Calculating priority score.Attempt {attempt}...")
-        try:
-            result = chain.invoke({
-                "job_title": job_title,
-                "seniority": seniority,
-                "department": department,
-                "company_size": company_size,
-                "desc":desc,
-                "industry": industry,
-                "format_instructions": format_instructions
-            })
-            return result.model_dump(),""
-        except Exception as e:
-            print(f"[Attempt {attempt}] LLM Error: {e}")
-
-    # Return fallback result if all attempts fail
-    return {"priority_score": 0, "reason": ""},"Unable to get priority score after {} attempts.".format(max_attempts)
 
+    async def score():
+        result = await chain.ainvoke({
+            "job_title": job_title,
+            "seniority": seniority,
+            "department": department,
+            "company_size": company_size,
+            "desc":desc,
+            "industry": industry,
+            "scoring_rules": rules or scoring_rules(),
+            "format_instructions": format_instructions
+        })
+        return result.model_dump(),""
+
+    try:
+        return await get_retry_policy(OPENAI).call(score, "Calculating priority score", api_key=openai_api_key)
+    except Exception as e:
+        # Return fallback result if all attempts fail
+        return {"priority_score": 0, "reason": ""},f"Unable to get priority score: {e}"
+
+
+def format_leads(leads: list) -> str:
+    return "\n".join(
+        f"""
+Lead {index}:
+Job Title: {lead['job_title']}
+Seniority : {lead['seniority']}
+Department: {lead['department']}
+Industry: {lead['industry']}
+Company Size: {lead['company_size']}"""
+        for index, lead in enumerate(leads)
+    )
+
+
+async def get_priority_scores_batch(leads: list, desc: str, openai_api_key: str, rules: str = None) -> list:
+    """
+    Score many leads with one LLM call
+
+    Args:
+        leads (list): Dicts with the job_title, seniority, department, industry and company_size of each lead
+        desc (str): Campaign description
+        openai_api_key (str): OpenAI API key
+        rules (str): Scoring logic of the prompt, from scoring_rules; the default rules when not given
+
+    Returns:
+        list: One (result, error) tuple per lead, by position, as returned by get_priority_score.
+              Leads missing from the reply, failing validation or given more than once are scored one by one.
+    """
+    llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0.3, openai_api_key=openai_api_key, max_retries=0)
+    chain = batch_prompt | llm | batch_parser
+    results = [None] * len(leads)
+
+    async def score_batch():
+        return await chain.ainvoke({
+            "leads": format_leads(leads),
+            "desc": desc,
+            "scoring_rules": rules or scoring_rules(),
+            "format_instructions": batch_format_instructions
+        })
+
+    try:
+        response = await get_retry_policy(OPENAI).call(score_batch, f"Calculating priority scores for {len(leads)} leads",
+                                                       api_key=openai_api_key)
+        duplicated = set()
+        for item in response.get("scores", []):
+            try:
+                score = LeadPriorityScore.model_validate(item)
+            except ValidationError as e:
+                print(f"Invalid priority score item skipped: {e}")
+                continue
+            if 0 <= score.index < len(leads):
+                if results[score.index] is not None:
+                    duplicated.add(score.index)
+                results[score.index] = (score.model_dump(exclude={"index"}), "")
+        # No telling which of two scores given to one index was meant for that lead
+        for index in duplicated:
+            results[index] = None
+    except Exception as e:
+        print(f"LLM Error: {e}")
+
+    # Per-lead fallback for whatever the batch did not cover
+    missing = [index for index, result in enumerate(results) if result is None]
+    if missing:
+        print(f"Scoring {len(missing)} leads individually")
+
+    async def score_single(index):
+        results[index] = await get_priority_score(desc=desc, openai_api_key=openai_api_key, rules=rules, **leads[index])
+
+    await asyncio.gather(*(score_single(index) for index in missing))
+    return results
+
+
+# Fields of a lead that the score depends on, together with the campaign description
+PROFILE_FIELDS = ["job_title", "seniority", "department", "industry", "company_size"]
+
+_memo = OrderedDict()
+# Profiles being scored by profile key, so concurrent calls wait for the same result
+_in_flight = {}
+# Profiles waiting to be sent, by (campaign description, scoring rules, OpenAI key): ({profile key: lead}, send timer)
+_waiting = {}
+
+
+def _normalize(value) -> str:
+    value = re.sub(r'\s+', ' ', str(value).strip().lower())
+    # "120", "120.0" and " 120 " are the same company size
+    try:
+        number = float(value)
+        if number.is_integer():
+            value = str(int(number))
+    except ValueError:
+        pass
+    return "" if value in ("nan", "none", "-") else value
+
+
+def profile_key(lead: dict, desc: str, rules: str = "") -> str:
+    """Hash of the normalized lead profile, scoped to the campaign description and scoring rules"""
+    profile = [_normalize(desc), rules] + [_normalize(lead[field]) for field in PROFILE_FIELDS]
+    return hashlib.sha256(json.dumps(profile).encode()).hexdigest()
+
+
+def _memo_get(key):
+    if key in _memo:
+        _memo.move_to_end(key)
+        return _memo[key], "memory"
+    cached = enrichment_cache.get(PRIORITY_SCORE, key)
+    if cached is not None:
+        _memo_put(key, cached)
+        return cached, "persistent"
+    return None, None
+
+
+def _memo_put(key, result):
+    _memo[key] = result
+    _memo.move_to_end(key)
+    while len(_memo) > PRIORITY_MEMO_SIZE:
+        _memo.popitem(last=False)
+
+
+def _enqueue(key, lead, desc, rules, openai_api_key):
+    """Future of a profile's (result, error), sent with the profiles queued around the same time"""
+    loop = asyncio.get_running_loop()
+    future = _in_flight[key] = loop.create_future()
+    batch_key = (desc, rules, openai_api_key)
+    batch, timer = _waiting.get(batch_key, ({}, None))
+    batch[key] = lead
+    if timer is None:
+        timer = loop.call_later(PRIORITY_BATCH_WAIT, _flush, batch_key)
+    _waiting[batch_key] = (batch, timer)
+    if len(batch) >= PRIORITY_BATCH_SIZE:
+        _flush(batch_key)
+    return future
+
+
+def _flush(batch_key):
+    batch, timer = _waiting.pop(batch_key, ({}, None))
+    if timer is not None:
+        timer.cancel()
+    if batch:
+        asyncio.ensure_future(_score_batch(batch, *batch_key))
+
+
+async def _score_batch(batch, desc, rules, openai_api_key):
+    try:
+        results = await get_priority_scores_batch(leads=list(batch.values()), desc=desc, openai_api_key=openai_api_key,
+                                                  rules=rules)
+    except Exception as e:
+        results = [({"priority_score": 0, "reason": ""}, f"Unable to get priority score: {e}")] * len(batch)
+    for key, (result, error) in zip(batch, results):
+        if not error:
+            _memo_put(key, result)
+            enrichment_cache.set(PRIORITY_SCORE, key, result)
+        # Errors are not kept, the next call asks again
+        future = _in_flight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result((result, error))
+
+
+async def get_priority_scores_cached(leads: list, desc: str, openai_api_key: str, rule_tables: RuleTables = None):
+    """
+    Score leads, asking the LLM only once per distinct profile
+
+    Identical profiles in the list are scored together, and profiles scored before for the same
+    campaign description come from the LRU memo or the persistent cache. A profile another call
+    is already scoring waits for that result. The rest are queued and sent to
+    get_priority_scores_batch in batches of PRIORITY_BATCH_SIZE, together with the profiles of
+    concurrent calls queued within PRIORITY_BATCH_WAIT seconds.
+
+    Args:
+        leads (list): Dicts with the job_title, seniority, department, industry and company_size of each lead
+        desc (str): Campaign description
+        openai_api_key (str): OpenAI API key
+        rule_tables (RuleTables): Targeting rules the prompt scores by, the default rules when not given
+
+    Returns:
+        tuple: (results, stats) where results holds one (result, error) tuple per lead by position
+               and stats counts the memory hits, persistent hits, duplicates, profiles shared with
+               concurrent calls and LLM-scored profiles of this call
+    """
+    stats = {"leads": len(leads), "memory_hits": 0, "persistent_hits": 0, "duplicates": 0, "shared": 0, "scored": 0}
+    results = [None] * len(leads)
+    pending = {}  # profile key -> (future, positions waiting for it)
+    rules = scoring_rules(rule_tables)
+
+    for index, lead in enumerate(leads):
+        key = profile_key(lead, desc, rules)
+        if key in pending:
+            pending[key][1].append(index)
+            stats["duplicates"] += 1
+            continue
+        cached, source = _memo_get(key)
+        if cached is not None:
+            results[index] = (cached, "")
+            stats[f"{source}_hits"] += 1
+        elif key in _in_flight:
+            pending[key] = (_in_flight[key], [index])
+            stats["shared"] += 1
+        else:
+            pending[key] = (_enqueue(key, lead, desc, rules, openai_api_key), [index])
+            stats["scored"] += 1
+
+    for future, positions in pending.values():
+        # Shielded, a cancelled caller does not cancel the result other calls are waiting for
+        result = await asyncio.shield(future)
+        for index in positions:
+            results[index] = result
+    return results, stats
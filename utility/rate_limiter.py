@@ -0,0 +1,85 @@
+import asyncio
+import hashlib
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Vendor names used across the enrichment pipeline
+EMAIL_VERIFIER = "rapidapi_verifier"
+LINKEDIN = "rapidapi_linkedin"
+EXA = "exa"
+OPENAI = "openai"
+
+# Default quotas (requests per minute, burst size) per vendor and API key.
+# Override with RATE_LIMIT_<VENDOR>_PER_MINUTE / RATE_LIMIT_<VENDOR>_BURST in .env
+DEFAULT_LIMITS = {
+    EMAIL_VERIFIER: (60, 10),
+    LINKEDIN: (60, 10),
+    EXA: (60, 10),
+    OPENAI: (500, 50),
+}
+
+
+class TokenBucket:
+    """
+    Async token bucket. Tokens refill continuously at `rate_per_minute` up to `burst`,
+    and every vendor call takes one token before it is sent.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: int = 1):
+        # The lock keeps waiters in FIFO order, so no caller is starved
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+_buckets = {}
+
+
+def api_key_id(api_key) -> str:
+    """Short hash identifying a tenant's API key, safe to keep in memory and show on admin endpoints"""
+    if not api_key:
+        return ""
+    return hashlib.sha256(str(api_key).encode()).hexdigest()[:12]
+
+
+def get_rate_limiter(vendor: str, api_key=None) -> TokenBucket:
+    """
+    Get the shared token bucket of a vendor and API key, creating it from the environment on first use
+
+    Vendor quotas apply per key and the keys come with each request, so every key has its own
+    bucket and one tenant's job does not hold back the others.
+
+    Args:
+        vendor (str): One of EMAIL_VERIFIER, LINKEDIN, EXA, OPENAI
+        api_key (str): Key the calls are made with
+
+    Returns:
+        TokenBucket: The bucket every call to that vendor with that key has to go through
+    """
+    bucket_key = (vendor, api_key_id(api_key))
+    if bucket_key not in _buckets:
+        default_rate, default_burst = DEFAULT_LIMITS[vendor]
+        prefix = f"RATE_LIMIT_{vendor.upper()}"
+        rate = float(os.getenv(f"{prefix}_PER_MINUTE", default_rate))
+        burst = int(os.getenv(f"{prefix}_BURST", default_burst))
+        _buckets[bucket_key] = TokenBucket(rate_per_minute=rate, burst=burst)
+    return _buckets[bucket_key]
@@ -0,0 +1,196 @@
+import asyncio
+import os
+import random
+import re
+import time
+from email.utils import parsedate_to_datetime
+from dotenv import load_dotenv
+
+from utility.circuit_breaker import get_circuit_breaker, is_vendor_failure
+from utility.rate_limiter import get_rate_limiter, EMAIL_VERIFIER, LINKEDIN, EXA, OPENAI
+
+load_dotenv()
+
+# Default retry policy (attempts, base delay, max delay in seconds) per vendor.
+# Override with RETRY_<VENDOR>_ATTEMPTS / RETRY_<VENDOR>_BASE_DELAY / RETRY_<VENDOR>_MAX_DELAY in .env
+DEFAULT_POLICIES = {
+    EMAIL_VERIFIER: (3, 1.0, 20.0),
+    LINKEDIN: (2, 2.0, 30.0),
+    EXA: (3, 1.0, 30.0),
+    OPENAI: (3, 1.0, 30.0),
+}
+
+# Longest Retry-After (seconds) honoured; a vendor asking for more fails the call instead
+RETRY_AFTER_MAX = float(os.getenv("RETRY_AFTER_MAX", 120))
+
+# Status codes worth another attempt, every other 4xx means the request itself is wrong
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# Vendor SDKs that raise a plain exception only report the status code in the message
+_STATUS_IN_MESSAGE = re.compile(r"status code:? (\d{3})")
+
+
+class RetryableError(Exception):
+    """A reply that came back but is not usable yet (incomplete data, wrong format), worth asking again"""
+
+
+def _response(error):
+    """HTTP response attached to a vendor error, or None"""
+    try:
+        return getattr(error, "response", None)
+    except RuntimeError:
+        # httpx raises instead of returning None when the error has no response
+        return None
+
+
+def status_code_of(error):
+    """HTTP status code behind a vendor error, or None"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(_response(error), "status_code", None)
+    if status is None:
+        match = _STATUS_IN_MESSAGE.search(str(error))
+        status = int(match.group(1)) if match else None
+    return status if isinstance(status, int) else None
+
+
+def _retry_after(error):
+    """Seconds the vendor asked to wait through its Retry-After header, or None"""
+    headers = getattr(_response(error), "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error) -> bool:
+    """
+    Whether a failed vendor call is worth another attempt
+
+    Throttling (429), timeouts and server errors are; any other 4xx (bad key, bad request,
+    unknown resource) is fatal. Errors without a status code (connection errors, unparsable
+    replies, RetryableError) are retried.
+    """
+    status = status_code_of(error)
+    return status is None or status in RETRYABLE_STATUS or status >= 500
+
+
+class RetryPolicy:
+    """
+    Retry schedule of one vendor: exponential backoff with full jitter, or the vendor's
+    Retry-After when it sent one.
+    """
+
+    def __init__(self, vendor: str, attempts: int, base_delay: float, max_delay: float):
+        self.vendor = vendor
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, error) -> float:
+        """
+        Seconds to wait after a failed attempt
+
+        Args:
+            attempt (int): Number of the attempt that failed, from 1
+            error (Exception): Its error
+
+        Returns:
+            float: Delay before the next attempt, None when the call should not be retried
+        """
+        if attempt >= self.attempts or not is_retryable(error):
+            return None
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            if retry_after > RETRY_AFTER_MAX:
+                return None
+            # A little jitter so the callers told the same time do not all come back at once
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    async def call(self, function, description: str = "", api_key=None):
+        """
+        Await `function()` until it succeeds, retrying per the policy
+
+        Every attempt goes through the vendor's circuit breaker, then takes a token from its
+        rate limiter.
+
+        Args:
+            function (callable): Coroutine function making one attempt
+            description (str): What is being done, for the logs
+            api_key (str): Vendor key the call is made with, selecting its breaker and rate limiter
+
+        Returns:
+            The result of the first successful attempt; the last error is raised once the
+            attempts run out or the error is fatal, CircuitOpenError while the breaker is open
+        """
+        breaker = get_circuit_breaker(self.vendor, api_key)
+        for attempt in range(1, self.attempts + 1):
+            breaker.check()
+            await get_rate_limiter(self.vendor, api_key).acquire()
+            print(f"{description} (Attempt {attempt})")
+            try:
+                result = await function()
+            except Exception as e:
+                breaker.record(failed=is_vendor_failure(e, status_code_of(e)))
+                delay = self.delay(attempt, e)
+                if delay is None:
+                    print(f"Attempt {attempt} failed: {e}")
+                    raise
+                print(f"Attempt {attempt} failed: {e}. Retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            breaker.record(failed=False)
+            return result
+
+    def call_sync(self, function, description: str = "", api_key=None):
+        """Blocking form of call(), for vendor SDKs run in a worker thread; does not take rate limiter tokens"""
+        breaker = get_circuit_breaker(self.vendor, api_key)
+        for attempt in range(1, self.attempts + 1):
+            breaker.check()
+            print(f"{description} (Attempt {attempt})")
+            try:
+                result = function()
+            except Exception as e:
+                breaker.record(failed=is_vendor_failure(e, status_code_of(e)))
+                delay = self.delay(attempt, e)
+                if delay is None:
+                    print(f"Attempt {attempt} failed: {e}")
+                    raise
+                print(f"Attempt {attempt} failed: {e}. Retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            breaker.record(failed=False)
+            return result
+
+
+_policies = {}
+
+
+def get_retry_policy(vendor: str) -> RetryPolicy:
+    """
+    Get the retry policy of a vendor, creating it from the environment on first use
+
+    Args:
+        vendor (str): One of EMAIL_VERIFIER, LINKEDIN, EXA, OPENAI
+
+    Returns:
+        RetryPolicy: The policy every call to that vendor is retried with
+    """
+    if vendor not in _policies:
+        default_attempts, default_base, default_max = DEFAULT_POLICIES[vendor]
+        prefix = f"RETRY_{vendor.upper()}"
+        _policies[vendor] = RetryPolicy(
+            vendor=vendor,
+            attempts=int(os.getenv(f"{prefix}_ATTEMPTS", default_attempts)),
+            base_delay=float(os.getenv(f"{prefix}_BASE_DELAY", default_base)),
+            max_delay=float(os.getenv(f"{prefix}_MAX_DELAY", default_max)),
+        )
+    return _policies[vendor]
@@ -0,0 +1,114 @@
+import re
+import numpy as np
+import pandas as pd
+
+# Labelled strings kept per classifier; job titles and departments repeat heavily
+LABEL_CACHE_SIZE = 200000
+
+# Fields of a targeting rule holding role and department terms
+ROLE_FIELDS = ("primary_roles", "secondary_roles", "exclusion_roles")
+DEPARTMENT_FIELDS = ("target_departments", "exclusion_departments")
+# Fields holding terms of the Seniority column, only set by a project's seniority tiers
+SENIORITY_FIELDS = ("primary_seniorities", "secondary_seniorities", "exclusion_seniorities")
+
+
+class TermClassifier:
+    """
+    Substring classifier over a fixed vocabulary of terms (roles or departments).
+
+    The vocabulary is compiled once into a single regex. Each distinct string is labelled a
+    single time with every vocabulary term it contains, and the label is cached, so matching a
+    column against any list of terms only touches its unique values.
+    """
+
+    def __init__(self, vocabulary):
+        self.terms = sorted({term.lower() for term in vocabulary if term}, key=lambda term: (-len(term), term))
+        self._labels = {}
+        if not self.terms:
+            self._pattern = None
+            return
+        # A lookahead finds a term at every start position; longer terms win ties at one position
+        self._pattern = re.compile("(?=(" + "|".join(re.escape(term) for term in self.terms) + "))")
+        # Terms hidden by a longer one starting at the same position are contained in it
+        self._contained = {term: frozenset(other for other in self.terms if other in term) for term in self.terms}
+
+    def label(self, text: str) -> frozenset:
+        """Every vocabulary term contained in the (lower-cased) text"""
+        labels = self._labels.get(text)
+        if labels is None:
+            if self._pattern is None:
+                labels = frozenset()
+            else:
+                found = {match.group(1) for match in self._pattern.finditer(text)}
+                labels = frozenset().union(*(self._contained[term] for term in found))
+            if len(self._labels) >= LABEL_CACHE_SIZE:
+                self._labels.clear()
+            self._labels[text] = labels
+        return labels
+
+    def label_column(self, values: pd.Series) -> "ColumnLabels":
+        """Label a column through its unique values"""
+        codes, uniques = pd.factorize(values.fillna("").astype(str).str.lower())
+        return ColumnLabels(self, codes, [self.label(text) for text in uniques])
+
+
+class ColumnLabels:
+    """Labels of a column, answering "contains any of these terms" per row"""
+
+    def __init__(self, classifier: TermClassifier, codes: np.ndarray, unique_labels: list):
+        self.classifier = classifier
+        self.codes = codes
+        self.unique_labels = unique_labels
+
+    def __len__(self):
+        return len(self.codes)
+
+    def matches(self, terms) -> np.ndarray:
+        """
+        Rows whose text contains any of the terms
+
+        Args:
+            terms (list): Terms of the classifier's vocabulary, an empty list matches nothing
+
+        Returns:
+            np.ndarray: Boolean mask, one entry per row
+        """
+        if not terms:
+            return np.zeros(len(self.codes), dtype=bool)
+        term_set = frozenset(term.lower() for term in terms)
+        unknown = term_set.difference(self.classifier.terms)
+        if unknown:
+            raise ValueError(f"Terms not in the classifier vocabulary: {sorted(unknown)}")
+        unique_hits = np.array([not term_set.isdisjoint(labels) for labels in self.unique_labels], dtype=bool)
+        return unique_hits[self.codes]
+
+
+_classifiers = {}
+
+
+def get_classifier(vocabulary) -> TermClassifier:
+    """Compiled classifier of a vocabulary, built once and reused (with its label cache) afterwards"""
+    key = frozenset(term.lower() for term in vocabulary if term)
+    if key not in _classifiers:
+        _classifiers[key] = TermClassifier(key)
+    return _classifiers[key]
+
+
+def get_rule_classifiers(rules: list) -> tuple:
+    """
+    Role and department classifiers covering every term of a list of targeting rules
+
+    Args:
+        rules (list): Rules shaped like utility.batching.SIZE_RULES
+
+    Returns:
+        tuple: (role classifier, department classifier)
+    """
+    roles = get_classifier(term for rule in rules for field in ROLE_FIELDS for term in (rule[field] or []))
+    departments = get_classifier(term for rule in rules for field in DEPARTMENT_FIELDS for term in (rule[field] or []))
+    return roles, departments
+
+
+def get_seniority_classifier(rules: list) -> TermClassifier:
+    """Classifier covering every seniority term of a list of targeting rules (none for SIZE_RULES)"""
+    return get_classifier(term for rule in rules for field in SENIORITY_FIELDS for term in (rule.get(field) or []))
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+from utility.batching import DEFAULT_RULE_TABLES
+from utility.targeting_rules import RuleTables
+
+# Scores given without asking the LLM
+ABM_SCORE = 5
+EXCLUDED_SCORE = 5
+PRIMARY_ROLE_SCORE = 90
+
+# Values of the "Priority Score Source" column
+SOURCE_RULES = "rules"
+SOURCE_LLM = "llm"
+
+
+def pre_score_leads(df: pd.DataFrame, job_title_col: str, department_col: str, employee_count_col: str,
+                    seniority_col: str = None, rule_tables: RuleTables = None) -> pd.DataFrame:
+    """
+    Score the clear-cut leads straight from the targeting rules, in the same terms as the LLM scoring prompt.
+
+    The rules are the batcher's: `rule_tables` (a project's, see utility.batching.get_project_rule_tables),
+    SIZE_RULES when it is not given. Clear-cut leads are:
+    - companies above the largest segment (ABM accounts, low score)
+    - job titles in the exclusion roles of the company's size segment, or seniorities in its
+      excluded seniorities (low score)
+    - departments in the exclusion departments of the segment (low score)
+    - primary roles or primary seniorities in a targeted (or unrestricted) department (high score)
+
+    Everything else, including leads without a usable employee count, is marked ambiguous
+    and has to be scored by the LLM.
+
+    Returns:
+        pd.DataFrame: Same index as df with "score", "reason" and "ambiguous" columns
+    """
+    tables = DEFAULT_RULE_TABLES if rule_tables is None else rule_tables
+    titles = df[job_title_col].fillna("").astype(str).str.lower()
+    departments = df[department_col].fillna("").astype(str).str.lower()
+    seniorities = df[seniority_col].fillna("").astype(str).str.lower() if seniority_col else pd.Series("", index=df.index)
+    employees = pd.to_numeric(df[employee_count_col], errors="coerce")
+
+    title_labels = tables.role_classifier.label_column(titles)
+    department_labels = tables.department_classifier.label_column(departments)
+    seniority_labels = tables.seniority_classifier.label_column(seniorities)
+
+    score = pd.Series(np.nan, index=df.index)
+    reason = pd.Series("", index=df.index, dtype=object)
+
+    abm = employees > tables.max_supported
+    score[abm] = ABM_SCORE
+    reason[abm] = (f"Company size {tables.max_supported:g}+ (" + employees[abm].astype(int).astype(str)
+                   + " employees): ABM strategy is more appropriate")
+
+    segment = tables.segment_of(employees.to_numpy())
+    for i, rule in enumerate(tables.rules):
+        in_segment = segment == i
+        if not in_segment.any():
+            continue
+
+        excluded_role = in_segment & title_labels.matches(rule["exclusion_roles"])
+        excluded_seniority = (in_segment & ~excluded_role
+                              & seniority_labels.matches(rule.get("exclusion_seniorities")))
+        excluded_dept = (in_segment & ~excluded_role & ~excluded_seniority
+                         & department_labels.matches(rule["exclusion_departments"]))
+        if rule["target_departments"]:
+            in_target_dept = department_labels.matches(rule["target_departments"])
+        else:
+            in_target_dept = np.ones(len(df), dtype=bool)
+        candidate = in_segment & ~excluded_role & ~excluded_seniority & ~excluded_dept & in_target_dept
+        primary_title = candidate & title_labels.matches(rule["primary_roles"])
+        primary_seniority = candidate & ~primary_title & seniority_labels.matches(rule.get("primary_seniorities"))
+
+        score[excluded_role] = EXCLUDED_SCORE
+        reason[excluded_role] = "Job title '" + titles[excluded_role] + f"' is an excluded role for {rule['name']}"
+        score[excluded_seniority] = EXCLUDED_SCORE
+        reason[excluded_seniority] = ("Seniority '" + seniorities[excluded_seniority]
+                                      + f"' is an excluded seniority for {rule['name']}")
+        score[excluded_dept] = EXCLUDED_SCORE
+        reason[excluded_dept] = "Department '" + departments[excluded_dept] + f"' is excluded for {rule['name']}"
+        score[primary_title] = PRIMARY_ROLE_SCORE
+        reason[primary_title] = "Job title '" + titles[primary_title] + f"' is a primary role for {rule['name']}"
+        score[primary_seniority] = PRIMARY_ROLE_SCORE
+        reason[primary_seniority] = ("Seniority '" + seniorities[primary_seniority]
+                                     + f"' is a primary seniority for {rule['name']}")
+
+    return pd.DataFrame({
+        "score": score,
+        "reason": reason,
+        "ambiguous": score.isna(),
+    })
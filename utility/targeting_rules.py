@@ -0,0 +1,169 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from utility.role_classifier import get_rule_classifiers, get_seniority_classifier
+
+# Compiled projects kept at once
+RULE_TABLES_CACHE_SIZE = 256
+
+# Project settings read by project_rules, a change to any of them recompiles the tables
+PROJECT_RULE_FIELDS = (
+    "company_size_very_small_max", "company_size_small_max", "company_size_medium_max",
+    "company_size_large_max", "company_size_enterprise_min",
+    "contact_limit_very_small", "contact_limit_small_company", "contact_limit_medium_company",
+    "contact_limit_large_company", "contact_limit_enterprise",
+    "target_departments", "excluded_departments",
+    "seniority_tier_1", "seniority_tier_2", "seniority_tier_3", "seniority_excluded",
+)
+
+# Used for settings a project leaves empty, same as schema.projects.ProjectCreate
+PROJECT_DEFAULTS = {
+    "company_size_very_small_max": 10,
+    "company_size_small_max": 50,
+    "company_size_medium_max": 200,
+    "company_size_large_max": 1000,
+    "company_size_enterprise_min": 1001,
+    "contact_limit_very_small": 2,
+    "contact_limit_small_company": 3,
+    "contact_limit_medium_company": 4,
+    "contact_limit_large_company": 5,
+    "contact_limit_enterprise": 6,
+}
+
+
+class RuleTables:
+    """
+    Targeting rules compiled into lookup tables for the batcher.
+
+    Size segments become sorted upper edges for np.searchsorted plus per-segment minimums,
+    limits and names; the role, department and seniority terms of every segment share one
+    compiled classifier each.
+    """
+
+    def __init__(self, rules: list):
+        rules = sorted(rules, key=lambda rule: rule["max"])
+        self.rules = rules
+        self.edges = np.array([rule["max"] for rule in rules], dtype=float)
+        self.mins = np.array([rule["min"] for rule in rules], dtype=float)
+        # One extra slot for rows outside every segment
+        self.limits = np.array([rule["limit"] for rule in rules] + [0])
+        self.names = np.array([rule["name"] for rule in rules] + [""], dtype=object)
+        self.role_classifier, self.department_classifier = get_rule_classifiers(rules)
+        self.seniority_classifier = get_seniority_classifier(rules)
+
+    def __len__(self):
+        return len(self.rules)
+
+    @property
+    def max_supported(self) -> float:
+        """Largest employee count any segment covers"""
+        return self.edges[-1] if len(self.edges) else -math.inf
+
+    def segment_of(self, employees: np.ndarray) -> np.ndarray:
+        """
+        Segment index of every employee count
+
+        Args:
+            employees (np.ndarray): Employee counts, NaN when unknown
+
+        Returns:
+            np.ndarray: Index into self.rules, -1 when no segment covers the count
+        """
+        employees = np.asarray(employees, dtype=float)
+        segment = np.searchsorted(self.edges, employees, side="left")
+        inside = segment < len(self.rules)
+        inside[inside] &= employees[inside] >= self.mins[segment[inside]]
+        return np.where(inside, segment, -1)
+
+
+def project_rules(project, default_rules: list) -> list:
+    """
+    Targeting rules of a project, shaped like utility.batching.SIZE_RULES
+
+    The project's size thresholds and contact limits define five segments (very small, small,
+    medium, large and enterprise). Each segment takes the job-title roles and the departments of
+    the default rule covering its smallest company, or of the largest default rule past them.
+    The project's departments replace the department lists whenever they are set. Its seniority
+    tiers are matched against the Seniority column rather than job titles, so they become the
+    rules' seniority lists (tier 1 primary, tiers 2 and 3 secondary, excluded seniorities
+    excluded), next to the title roles.
+
+    Args:
+        project: Project row
+        default_rules (list): Rules used for whatever the project leaves empty
+
+    Returns:
+        list: One rule per segment
+    """
+    def setting(field):
+        value = getattr(project, field, None)
+        return PROJECT_DEFAULTS[field] if value is None else value
+
+    very_small_max = setting("company_size_very_small_max")
+    small_max = setting("company_size_small_max")
+    medium_max = setting("company_size_medium_max")
+    large_max = setting("company_size_large_max")
+    enterprise_min = setting("company_size_enterprise_min")
+    segments = [
+        ("Very Small Companies", 0, very_small_max, setting("contact_limit_very_small")),
+        ("Small Companies", very_small_max + 1, small_max, setting("contact_limit_small_company")),
+        ("Medium Companies", small_max + 1, medium_max, setting("contact_limit_medium_company")),
+        ("Large Companies", medium_max + 1, large_max, setting("contact_limit_large_company")),
+        ("Enterprise Companies", enterprise_min, math.inf, setting("contact_limit_enterprise")),
+    ]
+
+    primary_seniorities = list(getattr(project, "seniority_tier_1", None) or [])
+    secondary_seniorities = list(getattr(project, "seniority_tier_2", None) or []) + list(getattr(project, "seniority_tier_3", None) or [])
+    exclusion_seniorities = list(getattr(project, "seniority_excluded", None) or [])
+    target_departments = list(getattr(project, "target_departments", None) or [])
+    exclusion_departments = list(getattr(project, "excluded_departments", None) or [])
+
+    rules = []
+    for name, low, high, limit in segments:
+        default = next((rule for rule in default_rules if rule["min"] <= low <= rule["max"]),
+                       max(default_rules, key=lambda rule: rule["max"]))
+        label = f"{name} ({low}+)" if high == math.inf else f"{name} ({low}-{high})"
+        rules.append({
+            "name": label,
+            "min": low, "max": high, "limit": limit,
+            "primary_roles": default["primary_roles"],
+            "secondary_roles": default["secondary_roles"],
+            "exclusion_roles": default["exclusion_roles"],
+            "target_departments": target_departments or default["target_departments"],
+            "exclusion_departments": exclusion_departments or default["exclusion_departments"],
+            "primary_seniorities": primary_seniorities,
+            "secondary_seniorities": secondary_seniorities,
+            "exclusion_seniorities": exclusion_seniorities,
+        })
+    return rules
+
+
+_project_tables = OrderedDict()
+
+
+def get_project_rule_tables(project, default_rules: list) -> RuleTables:
+    """
+    Compiled rule tables of a project, reused until one of its targeting settings changes
+
+    Args:
+        project: Project row
+        default_rules (list): Rules used for whatever the project leaves empty
+
+    Returns:
+        RuleTables: Tables for cold_email_batcher_advanced
+    """
+    settings = tuple(
+        tuple(value) if isinstance(value, list) else value
+        for value in (getattr(project, field, None) for field in PROJECT_RULE_FIELDS)
+    )
+    key = (getattr(project, "id", None), settings)
+    tables = _project_tables.get(key)
+    if tables is None:
+        tables = RuleTables(project_rules(project, default_rules))
+        _project_tables[key] = tables
+        while len(_project_tables) > RULE_TABLES_CACHE_SIZE:
+            _project_tables.popitem(last=False)
+    _project_tables.move_to_end(key)
+    return tables
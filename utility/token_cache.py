@@ -0,0 +1,44 @@
+import os
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Verified tokens remembered at once, the least recently used ones are dropped first
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+
+
+class VerifiedTokenCache:
+    """
+    Claims of JWTs that already passed signature and expiry checks.
+
+    Entries are dropped when the token expires, so a cached token is never accepted past its
+    `exp`, and the cache never holds more than `max_size` tokens.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, token: str):
+        """Claims of a verified, unexpired token, or None"""
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        claims, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return claims
+
+    def set(self, token: str, claims: dict, expires_at: float):
+        """Remember the claims of a token until `expires_at` (Unix time)"""
+        self._entries[token] = (claims, expires_at)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+verified_tokens = VerifiedTokenCache(TOKEN_CACHE_SIZE)